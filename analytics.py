@@ -0,0 +1,257 @@
+"""판매 분석 (리포트)
+
+기간의 일별 집계(sales_daily)를 NumPy 열 배열(날짜 순번, 상품 id, 플랫폼 코드, 건수, 수량, 매출, 이익)로 한 번 읽고
+일별 추이/이동 평균, 플랫폼별·상품별 집계, 매출 순위, 마진, ABC 분류를 행 단위 반복 없이 벡터 연산으로 계산한다.
+
+결과는 (기간, 데이터 버전)을 키로 캐시한다. 판매/상품명 쓰기가 data_versions를 올리므로
+데이터가 바뀌면 다음 조회에서 다시 계산하고, 바뀌지 않았으면 워커 안에서 TTL 동안 재사용한다.
+"""
+import os
+from datetime import date
+from itertools import islice
+from typing import Dict, List
+import numpy as np
+import repository
+from cache import TTLCache, cached
+from metrics import timed
+from sales import PLATFORMS
+
+analytics_cache = TTLCache(
+    'analytics',
+    maxsize=int(os.getenv('ANALYTICS_CACHE_MAX_ENTRIES', '64')),
+    ttl=float(os.getenv('ANALYTICS_CACHE_TTL', '3600'))
+)
+
+PLATFORM_LABELS = PLATFORMS + ['기타']
+ROLLING_WINDOW = 7
+TOP_PRODUCTS = 20
+LOW_MARGIN_PRODUCTS = 5
+# 매출 상위부터 누적 비중이 80%에 닿을 때까지 A, 95%까지 B, 나머지 C
+ABC_THRESHOLDS = (0.8, 0.95)
+MAX_PERIOD_DAYS = int(os.getenv('ANALYTICS_MAX_DAYS', '3700'))
+LOAD_BATCH_SIZE = 10000
+# SalesColumns 열 순서: day, product, platform, count, quantity, revenue, profit
+COLUMN_DTYPES = (np.int32, np.int64, np.int8, np.int64, np.int64, np.float64, np.float64)
+
+
+class SalesColumns:
+    """기간 일별 집계의 열 배열 - day는 시작일부터의 일수"""
+
+    def __init__(self, start: date, days: int, day, product, platform, count, quantity, revenue, profit):
+        self.start = start
+        self.days = days
+        self.day = day
+        self.product = product
+        self.platform = platform
+        self.count = count
+        self.quantity = quantity
+        self.revenue = revenue
+        self.profit = profit
+
+    def __len__(self):
+        return len(self.day)
+
+
+def _period(start_date, end_date):
+    try:
+        start = date.fromisoformat(str(start_date)[:10])
+        end = date.fromisoformat(str(end_date)[:10])
+    except ValueError:
+        raise ValueError("Dates must be YYYY-MM-DD")
+    if start > end:
+        raise ValueError("start_date must be on or before end_date")
+    if (end - start).days + 1 > MAX_PERIOD_DAYS:
+        raise ValueError(f"Period must be at most {MAX_PERIOD_DAYS} days")
+    return start, end
+
+def _batch_columns(rows, start: date, platform_codes: Dict[str, int]):
+    dates, products, platforms, counts, quantities, revenues, profits = zip(*rows)
+    # SQLite는 'YYYY-MM-DD' 문자열, PostgreSQL은 date - 둘 다 앞 10자가 ISO 날짜
+    day = (np.array([str(d)[:10] for d in dates], dtype='datetime64[D]') - np.datetime64(start, 'D')).astype(np.int32)
+    platform = np.fromiter((platform_codes.get(p, len(PLATFORMS)) for p in platforms), dtype=np.int8, count=len(rows))
+    return (day, np.array(products, dtype=np.int64), platform, np.array(counts, dtype=np.int64),
+            np.array(quantities, dtype=np.int64), np.array(revenues, dtype=np.float64),
+            np.array(profits, dtype=np.float64))
+
+def load_columns(db, start: date, end: date) -> SalesColumns:
+    """기간의 sales_daily 행을 열 배열로 읽는다 - LOAD_BATCH_SIZE 행씩 변환해 파이썬 튜플을 한꺼번에 들고 있지 않는다"""
+    platform_codes = {name: code for code, name in enumerate(PLATFORMS)}
+    rows = db.stream('''
+        SELECT sale_date, product_id, platform, sales_count, quantity, revenue, profit
+        FROM sales_daily
+        WHERE sale_date BETWEEN ? AND ?
+    ''', (start.isoformat(), end.isoformat()), batch_size=LOAD_BATCH_SIZE)
+
+    batches = []
+    while True:
+        chunk = list(islice(rows, LOAD_BATCH_SIZE))
+        if not chunk:
+            break
+        batches.append(_batch_columns(chunk, start, platform_codes))
+
+    days = (end - start).days + 1
+    if not batches:
+        return SalesColumns(start, days, *(np.empty(0, dtype=dtype) for dtype in COLUMN_DTYPES))
+    return SalesColumns(start, days, *(np.concatenate(parts) for parts in zip(*batches)))
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """끝나는 날 기준 window일 이동 평균 (앞쪽 window-1일은 있는 날수로 평균)"""
+    cumulative = np.concatenate(([0.0], np.cumsum(values)))
+    index = np.arange(len(values))
+    lower = np.maximum(index + 1 - window, 0)
+    return (cumulative[index + 1] - cumulative[lower]) / (index + 1 - lower)
+
+def abc_classes(revenue: np.ndarray, thresholds=ABC_THRESHOLDS) -> np.ndarray:
+    """매출 내림차순으로 정렬된 배열의 ABC 등급 - 자기 앞까지의 누적 비중으로 판정해 경계 상품은 윗 등급"""
+    total = revenue.sum()
+    if total <= 0:
+        return np.full(len(revenue), 'C')
+    before = (np.cumsum(revenue) - revenue) / total
+    return np.where(before < thresholds[0], 'A', np.where(before < thresholds[1], 'B', 'C'))
+
+
+def _money(value) -> float:
+    return round(float(value), 2)
+
+def _margin(profit, revenue) -> float:
+    return round(float(profit) / float(revenue) * 100, 2) if revenue > 0 else 0.0
+
+
+class SalesAnalytics:
+    @timed
+    def get_sales_report(self, start_date, end_date) -> Dict:
+        """
+        기간 판매 분석 - 일별 추이(7일 이동 평균), 플랫폼별 비중, 상품별 매출 순위/마진, ABC 분류
+        날짜 형식이 틀리거나 기간이 잘못되면 ValueError
+        """
+        start, end = _period(start_date, end_date)
+        with repository.session() as db:
+            versions = repository.data_versions(db)
+        return self._report(start.isoformat(), end.isoformat(), versions.get('sales', 0), versions.get('products', 0))
+
+    def report_key(self, start_date, end_date) -> str:
+        """기간 + 현재 데이터 버전 문자열 - 같으면 get_sales_report 결과도 같다 (백그라운드 작업 중복 확인용)"""
+        start, end = _period(start_date, end_date)
+        with repository.session() as db:
+            versions = repository.data_versions(db)
+        return f"sales_report:{start}:{end}:{versions.get('sales', 0)}:{versions.get('products', 0)}"
+
+    @cached(analytics_cache)
+    def _report(self, start_date: str, end_date: str, sales_version: int, products_version: int) -> Dict:
+        start, end = date.fromisoformat(start_date), date.fromisoformat(end_date)
+        with repository.session() as db:
+            columns = load_columns(db, start, end)
+            products = self._product_stats(columns)
+            names = self._product_names(db, [p['product_id'] for p in products['top'] + products['low_margin']])
+
+        for product in products['top'] + products['low_margin']:
+            product['name'], product['options'] = names.get(product['product_id'], ('(삭제된 상품)', ''))
+
+        return {
+            'start_date': start_date,
+            'end_date': end_date,
+            'daily': self._daily(columns),
+            'platforms': self._platforms(columns),
+            'top_products': products['top'],
+            'low_margin_products': products['low_margin'],
+            'abc': products['abc'],
+            'product_count': products['count']
+        }
+
+    def _daily(self, columns: SalesColumns) -> List[Dict]:
+        days = columns.days
+        revenue = np.bincount(columns.day, weights=columns.revenue, minlength=days)
+        profit = np.bincount(columns.day, weights=columns.profit, minlength=days)
+        quantity = np.bincount(columns.day, weights=columns.quantity, minlength=days)
+        count = np.bincount(columns.day, weights=columns.count, minlength=days)
+        revenue_avg = rolling_mean(revenue, ROLLING_WINDOW)
+        dates = np.datetime64(columns.start, 'D') + np.arange(days)
+
+        return [
+            {
+                'date': str(dates[i]),
+                'sales_count': int(count[i]),
+                'quantity': int(quantity[i]),
+                'revenue': _money(revenue[i]),
+                'profit': _money(profit[i]),
+                'revenue_avg': _money(revenue_avg[i])
+            }
+            for i in range(days)
+        ]
+
+    def _platforms(self, columns: SalesColumns) -> List[Dict]:
+        size = len(PLATFORM_LABELS)
+        revenue = np.bincount(columns.platform, weights=columns.revenue, minlength=size)
+        profit = np.bincount(columns.platform, weights=columns.profit, minlength=size)
+        quantity = np.bincount(columns.platform, weights=columns.quantity, minlength=size)
+        count = np.bincount(columns.platform, weights=columns.count, minlength=size)
+        total = revenue.sum()
+
+        return [
+            {
+                'platform': PLATFORM_LABELS[code],
+                'sales_count': int(count[code]),
+                'quantity': int(quantity[code]),
+                'revenue': _money(revenue[code]),
+                'profit': _money(profit[code]),
+                'margin': _margin(profit[code], revenue[code]),
+                'revenue_share': round(float(revenue[code] / total) * 100, 2) if total > 0 else 0.0
+            }
+            for code in range(size) if count[code] > 0
+        ]
+
+    def _product_stats(self, columns: SalesColumns) -> Dict:
+        product_ids, index = np.unique(columns.product, return_inverse=True)
+        size = len(product_ids)
+        revenue = np.bincount(index, weights=columns.revenue, minlength=size)
+        profit = np.bincount(index, weights=columns.profit, minlength=size)
+        quantity = np.bincount(index, weights=columns.quantity, minlength=size)
+        total = revenue.sum()
+
+        # 매출 내림차순 (같으면 id 오름차순 - np.unique가 정렬해 두었으므로 안정 정렬로 유지)
+        order = np.argsort(-revenue, kind='stable')
+        classes = abc_classes(revenue[order])
+        cumulative = np.cumsum(revenue[order]) / total if total > 0 else np.zeros(size)
+
+        def product(i, rank=None):
+            entry = {
+                'product_id': int(product_ids[i]),
+                'quantity': int(quantity[i]),
+                'revenue': _money(revenue[i]),
+                'profit': _money(profit[i]),
+                'margin': _margin(profit[i], revenue[i]),
+                'revenue_share': round(float(revenue[i] / total) * 100, 2) if total > 0 else 0.0
+            }
+            if rank is not None:
+                entry['rank'] = rank + 1
+                entry['abc'] = str(classes[rank])
+                entry['cumulative_share'] = round(float(cumulative[rank]) * 100, 2)
+            return entry
+
+        top = [product(i, rank) for rank, i in enumerate(order[:TOP_PRODUCTS])]
+
+        selling = np.flatnonzero(revenue > 0)
+        margins = profit[selling] / revenue[selling]
+        low_margin = [product(i) for i in selling[np.argsort(margins, kind='stable')[:LOW_MARGIN_PRODUCTS]]]
+
+        abc = []
+        for grade in ('A', 'B', 'C'):
+            members = order[classes == grade]
+            grade_revenue = revenue[members].sum()
+            abc.append({
+                'class': grade,
+                'products': int(len(members)),
+                'revenue': _money(grade_revenue),
+                'revenue_share': round(float(grade_revenue / total) * 100, 2) if total > 0 else 0.0
+            })
+
+        return {'top': top, 'low_margin': low_margin, 'abc': abc, 'count': int(size)}
+
+    def _product_names(self, db, product_ids: List[int]) -> Dict[int, tuple]:
+        if not product_ids:
+            return {}
+        ids = sorted(set(product_ids))
+        placeholders = ', '.join('?' for _ in ids)
+        rows = db.fetchall(f"SELECT id, name, options FROM products WHERE id IN ({placeholders})", ids)
+        return {row[0]: (row[1], row[2] or '') for row in rows}
@@ -1,11 +1,22 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify, flash
+from flask import Flask, render_template, request, redirect, url_for, jsonify, flash, Response, stream_with_context
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from datetime import datetime, date, timedelta
 import inventory
 import sales
+import analytics
+import forecast
+import stock_ledger
 import database_cloud as database
-from auth import User
+import cache
+import events
+import export
+import metrics
+import httpcache
+import jobs
+from auth import User, LoginBusy
+import ratelimit
 import os
+import hmac
 from dotenv import load_dotenv
 import json
 
@@ -19,8 +30,31 @@ login_manager.init_app(app)
 login_manager.login_view = 'login'
 login_manager.login_message = '로그인이 필요합니다.'
 
+# 요청/쿼리 계측 (경로별 응답 시간, 느린 쿼리 로그, Server-Timing 헤더)
+metrics.init_app(app)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# 큰 JSON/HTML 응답 gzip/br 압축 (조건부 GET은 뷰별 httpcache.conditional)
+httpcache.init_app(app)
+
 manager = inventory.InventoryManager()
 sales_manager = sales.SalesManager()
+sales_analytics = analytics.SalesAnalytics()
+forecast_manager = forecast.ForecastManager()
+ledger = stock_ledger.StockLedger()
+job_queue = jobs.JobQueue()
+
+# 화면 목록 페이지 크기 (API는 limit 파라미터로 지정)
+INVENTORY_PAGE_SIZE = int(os.getenv('INVENTORY_PAGE_SIZE', '200'))
+SALES_PAGE_SIZE = int(os.getenv('SALES_PAGE_SIZE', '100'))
+
+# 로그인 시도 제한 - IP별 전체 시도, 사용자명별 실패 횟수
+login_ip_limiter = ratelimit.RateLimiter(
+    'login-ip', limit=int(os.getenv('LOGIN_RATE_LIMIT_IP', '30')), window=60
+)
+login_user_limiter = ratelimit.RateLimiter(
+    'login-user', limit=int(os.getenv('LOGIN_RATE_LIMIT_USER', '5')), window=300
+)
 
 @login_manager.user_loader
 def load_user(user_id):
@@ -31,14 +65,26 @@ def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
+        ip = request.remote_addr or ''
+        
+        if login_user_limiter.is_limited(username) or not login_ip_limiter.hit(ip):
+            retry_after = max(login_user_limiter.retry_after(username), login_ip_limiter.retry_after(ip), 1)
+            flash(f'로그인 시도가 너무 많습니다. {retry_after}초 후 다시 시도하세요.', 'error')
+            return render_template('login.html'), 429, {'Retry-After': str(retry_after)}
+        
+        try:
+            user = User.authenticate(username, password)
+        except LoginBusy:
+            flash('로그인 요청이 많습니다. 잠시 후 다시 시도하세요.', 'error')
+            return render_template('login.html'), 503, {'Retry-After': '1'}
         
-        if User.verify_password(username, password):
-            user = User.get_by_username(username)
-            if user:
-                login_user(user)
-                next_page = request.args.get('next')
-                return redirect(next_page or url_for('index'))
+        if user:
+            login_user_limiter.reset(username)
+            login_user(user)
+            next_page = request.args.get('next')
+            return redirect(next_page or url_for('index'))
         
+        login_user_limiter.hit(username)
         flash('아이디 또는 비밀번호가 올바르지 않습니다.', 'error')
     
     return render_template('login.html')
@@ -51,50 +97,37 @@ def logout():
 
 @app.route('/')
 @login_required
+@httpcache.conditional('inventory', 'forecasts', daily=True)
 def index():
     products = manager.get_all_products()
     summary = manager.get_inventory_summary()
     
-    # 플랫폼별 평균 마진율 계산 (0 제외)
-    conn = database.get_connection()
-    cursor = conn.cursor()
-    
-    # 각 플랫폼별로 0이 아닌 마진율만 계산
-    if hasattr(conn, 'server_version'):  # PostgreSQL
-        cursor.execute('''
-            SELECT 
-                (SELECT AVG(margin_naver) FROM products WHERE margin_naver > 0) as avg_margin_naver,
-                (SELECT AVG(margin_coupang) FROM products WHERE margin_coupang > 0) as avg_margin_coupang,
-                (SELECT AVG(margin_self) FROM products WHERE margin_self > 0) as avg_margin_self
-        ''')
-    else:  # SQLite
-        cursor.execute('''
-            SELECT 
-                (SELECT AVG(margin_naver) FROM products WHERE margin_naver > 0) as avg_margin_naver,
-                (SELECT AVG(margin_coupang) FROM products WHERE margin_coupang > 0) as avg_margin_coupang,
-                (SELECT AVG(margin_self) FROM products WHERE margin_self > 0) as avg_margin_self
-        ''')
-    
-    avg_margins = cursor.fetchone()
-    conn.close()
+    # 플랫폼별 평균 마진율 (0 제외)
+    avg_margins_dict = manager.get_average_margins()
     
-    # 결과를 템플릿에 전달할 형태로 변환
-    avg_margins_dict = {
-        'naver': round(avg_margins[0], 1) if avg_margins and avg_margins[0] else 0,
-        'coupang': round(avg_margins[1], 1) if avg_margins and avg_margins[1] else 0,
-        'self': round(avg_margins[2], 1) if avg_margins and avg_margins[2] else 0
-    }
+    # 재고 소진 예측 (manage.py forecast 배치 결과)
+    stockout = forecast_manager.get_stockout_risks()
     
-    return render_template('dashboard.html', products=products, summary=summary, avg_margins=avg_margins_dict)
+    return render_template('dashboard.html', products=products, summary=summary, avg_margins=avg_margins_dict,
+                           stockout=stockout)
 
 @app.route('/inventory')
 @login_required
+@httpcache.conditional('inventory')
 def inventory_page():
     search = request.args.get('search', '')
     sort_by = request.args.get('sort', 'name')
-    products = manager.get_all_products(search=search, sort_by=sort_by)
+    cursor = request.args.get('cursor')
+    try:
+        page = manager.get_products_page(search=search, sort_by=sort_by,
+                                         limit=INVENTORY_PAGE_SIZE, cursor=cursor)
+    except ValueError:
+        # 정렬 기준이 바뀌었거나 손상된 커서 - 첫 페이지로
+        page = manager.get_products_page(search=search, sort_by=sort_by, limit=INVENTORY_PAGE_SIZE)
+        cursor = None
     # 인라인 편집 가능한 버전의 템플릿 사용
-    return render_template('inventory_editable.html', products=products, search=search, sort_by=sort_by)
+    return render_template('inventory_editable.html', products=page['items'], search=search, sort_by=sort_by,
+                         cursor=cursor, next_cursor=page['next_cursor'])
 
 @app.route('/product/add', methods=['GET', 'POST'])
 @login_required
@@ -150,7 +183,8 @@ def edit_product(product_id):
                 updates['margin_coupang'] = float(request.form['margin_coupang'])
             if request.form.get('margin_self'):
                 updates['margin_self'] = float(request.form['margin_self'])
-            if request.form.get('quantity'):
+            # 옵션이 있는 상품의 재고는 옵션별로 관리 (상품 재고 = 옵션 재고 합계)
+            if request.form.get('quantity') and not product['variants']:
                 updates['quantity'] = int(request.form['quantity'])
             
             manager.update_product(product_id, **updates)
@@ -160,29 +194,227 @@ def edit_product(product_id):
     
     return render_template('edit_product.html', product=product)
 
+def _variant_form():
+    # 가격/마진을 비워 두면 None - 상품 값으로 판매
+    fields = {
+        'options': request.form.get('options', ''),
+        'sku': request.form.get('sku', ''),
+        'quantity': int(request.form.get('quantity') or 0)
+    }
+    for field in inventory.VARIANT_OVERRIDE_FIELDS:
+        fields[field] = float(request.form[field]) if request.form.get(field) else None
+    return fields
+
+def _variant_error(product_id, error):
+    product = manager.get_product(product_id)
+    if not product:
+        return redirect(url_for('inventory_page'))
+    return render_template('edit_product.html', product=product, error=error)
+
+@app.route('/product/<int:product_id>/variants', methods=['POST'])
+@login_required
+def add_variant(product_id):
+    try:
+        if manager.add_variant(product_id, **_variant_form()) is None:
+            return redirect(url_for('inventory_page'))
+    except ValueError as e:
+        return _variant_error(product_id, str(e))
+    return redirect(url_for('edit_product', product_id=product_id))
+
+@app.route('/product/<int:product_id>/variants/<int:variant_id>/edit', methods=['POST'])
+@login_required
+def edit_variant(product_id, variant_id):
+    try:
+        manager.update_variant(variant_id, **_variant_form())
+    except ValueError as e:
+        return _variant_error(product_id, str(e))
+    return redirect(url_for('edit_product', product_id=product_id))
+
+@app.route('/product/<int:product_id>/variants/<int:variant_id>/delete', methods=['POST'])
+@login_required
+def delete_variant(product_id, variant_id):
+    try:
+        manager.delete_variant(variant_id)
+    except ValueError as e:
+        return _variant_error(product_id, str(e))
+    return redirect(url_for('edit_product', product_id=product_id))
+
 @app.route('/product/delete/<int:product_id>', methods=['POST'])
 @login_required
 def delete_product(product_id):
-    manager.delete_product(product_id)
+    try:
+        manager.delete_product(product_id)
+    except ValueError as e:
+        return _variant_error(product_id, str(e))
     return redirect(url_for('inventory_page'))
 
 @app.route('/api/inventory/summary')
 @login_required
+@httpcache.conditional('inventory')
 def api_inventory_summary():
     summary = manager.get_inventory_summary()
+    # 상품별 재고 목록은 요청할 때만 (details=1, limit/cursor 키셋 페이지)
+    if request.args.get('details'):
+        try:
+            page = manager.get_inventory_details_page(limit=request.args.get('limit'), cursor=request.args.get('cursor'))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        summary = dict(summary, product_details=page['items'], next_cursor=page['next_cursor'])
     return jsonify(summary)
 
 @app.route('/api/products')
 @login_required
+@httpcache.conditional('inventory')
 def api_products():
-    products = manager.get_all_products()
+    # limit 또는 cursor가 있으면 키셋 페이지 {'items', 'next_cursor'}, 없으면 기존처럼 전체 목록
+    if 'limit' not in request.args and 'cursor' not in request.args:
+        return jsonify(manager.get_all_products())
+    try:
+        page = manager.get_products_page(
+            search=request.args.get('search', ''),
+            sort_by=request.args.get('sort', 'name'),
+            limit=request.args.get('limit'),
+            cursor=request.args.get('cursor')
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify(page)
+
+@app.route('/api/products/search')
+@login_required
+@httpcache.conditional('inventory')
+def api_search_products():
+    query = request.args.get('q', '').strip()
+    try:
+        products = manager.search_products(query, limit=request.args.get('limit', 20))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     return jsonify(products)
 
+@app.route('/api/products/<int:product_id>/stock')
+@login_required
+def api_product_stock(product_id):
+    # at=YYYY-MM-DD (그날 마감 기준) 또는 YYYY-MM-DD HH:MM:SS, 생략하면 현재
+    try:
+        stock = ledger.get_stock_at(product_id, request.args.get('at') or datetime.now())
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if stock is None:
+        return jsonify({'success': False, 'error': 'Product not found'}), 404
+    return jsonify(stock)
+
+@app.route('/api/products/<int:product_id>/movements')
+@login_required
+def api_product_movements(product_id):
+    try:
+        page = ledger.get_movements_page(product_id, limit=request.args.get('limit'), cursor=request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify(page)
+
+@app.route('/api/products/<int:product_id>/receipts', methods=['POST'])
+@login_required
+def api_receive_stock(product_id):
+    data = request.get_json(silent=True) or {}
+    try:
+        variant_id = int(data['variant_id']) if data.get('variant_id') is not None else None
+        received = manager.receive_stock(product_id, int(data.get('quantity')), data.get('note'), variant_id)
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if not received:
+        return jsonify({'success': False, 'error': 'Product not found'}), 404
+    return jsonify({'success': True})
+
+def _variant_fields(data):
+    if not isinstance(data, dict):
+        raise ValueError("Request body must be a JSON object")
+    return {field: data[field] for field in ['options', 'sku', 'quantity'] + inventory.VARIANT_OVERRIDE_FIELDS
+            if field in data}
+
+@app.route('/api/products/<int:product_id>/variants', methods=['POST'])
+@login_required
+def api_add_variant(product_id):
+    # {"options": "빨강 / L", "quantity": 10, "sku": "...", "price": 12000} - 가격/마진을 생략하면 상품 값
+    try:
+        variant_id = manager.add_variant(product_id, **_variant_fields(request.get_json(silent=True) or {}))
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if variant_id is None:
+        return jsonify({'success': False, 'error': 'Product not found'}), 404
+    return jsonify({'success': True, 'id': variant_id}), 201
+
+@app.route('/api/variants/<int:variant_id>', methods=['PATCH', 'DELETE'])
+@login_required
+def api_variant(variant_id):
+    try:
+        if request.method == 'DELETE':
+            found = manager.delete_variant(variant_id)
+        else:
+            # 가격/마진에 null을 주면 상품 값으로 되돌린다
+            fields = _variant_fields(request.get_json(silent=True) or {})
+            if not fields:
+                raise ValueError("No variant fields to update")
+            found = manager.update_variant(variant_id, **fields)
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if not found:
+        return jsonify({'success': False, 'error': 'Variant not found'}), 404
+    return jsonify({'success': True})
+
+@app.route('/api/events')
+@login_required
+def api_events():
+    # SSE 스트림 - 연결마다 스레드 하나를 점유하므로 워커당 연결 수를 제한 (브라우저는 retry 후 재연결)
+    subscription = events.subscribe()
+    if subscription is None:
+        return jsonify({'success': False, 'error': 'Too many event streams'}), 503
+    return Response(
+        stream_with_context(events.stream(subscription)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/cache/stats')
+@login_required
+def api_cache_stats():
+    return jsonify(cache.all_stats())
+
+@app.route('/metrics')
+def metrics_endpoint():
+    # Prometheus 스크레이프용 - METRICS_TOKEN이 설정되어 있으면 Bearer 토큰 필요
+    if METRICS_TOKEN and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {METRICS_TOKEN}'):
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+def _run_in_background(rows) -> bool:
+    # ?async=1이면 항상, JOBS_ENABLED(워커 실행 중)이면 큰 일괄 요청을 작업 큐로 보낸다
+    return request.args.get('async') == '1' or (jobs.JOBS_ENABLED and len(rows) > jobs.JOBS_INLINE_MAX_ROWS)
+
+def _job_response(kind, payload, dedupe_key=None):
+    # 202 + 작업 상태 - 클라이언트는 Location(/api/jobs/<id>)을 폴링한다
+    job_id = job_queue.enqueue(kind, payload, created_by=current_user.id, dedupe_key=dedupe_key)
+    response = jsonify({'success': True, 'job': job_queue.get_job(job_id)})
+    response.status_code = 202
+    response.headers['Location'] = url_for('api_job', job_id=job_id)
+    return response
+
+@app.route('/api/jobs/<int:job_id>')
+@login_required
+def api_job(job_id):
+    job = job_queue.get_job(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify(job)
+
 @app.route('/api/products/bulk-update', methods=['POST'])
 @login_required
 def api_bulk_update_products():
     try:
         updates = request.json
+        if not isinstance(updates, list):
+            raise ValueError("Request body must be a JSON array")
+        if _run_in_background(updates):
+            return _job_response('bulk_update_products', {'updates': updates})
         result = manager.bulk_update_products(updates)
         return jsonify({'success': True, 'result': result})
     except Exception as e:
@@ -195,14 +427,77 @@ def sales_page():
     start_date = request.args.get('start_date', today.strftime('%Y-%m-%d'))
     end_date = request.args.get('end_date', today.strftime('%Y-%m-%d'))
     
-    sales_list = sales_manager.get_sales_by_date(start_date, end_date)
+    cursor = request.args.get('cursor')
+    try:
+        page = sales_manager.get_sales_page(start_date, end_date, limit=SALES_PAGE_SIZE, cursor=cursor)
+    except ValueError:
+        page = sales_manager.get_sales_page(start_date, end_date, limit=SALES_PAGE_SIZE)
+        cursor = None
     summary = sales_manager.get_sales_summary(start_date, end_date)
     
     return render_template('sales.html', 
-                         sales=sales_list, 
+                         sales=page['items'], 
                          summary=summary,
                          start_date=start_date,
-                         end_date=end_date)
+                         end_date=end_date,
+                         cursor=cursor,
+                         next_cursor=page['next_cursor'])
+
+@app.route('/api/sales')
+@login_required
+@httpcache.conditional('sales', 'inventory', daily=True)
+def api_sales():
+    today = date.today().strftime('%Y-%m-%d')
+    try:
+        page = sales_manager.get_sales_page(
+            request.args.get('start_date', today),
+            request.args.get('end_date', today),
+            limit=request.args.get('limit'),
+            cursor=request.args.get('cursor')
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify(page)
+
+def _export_response(rows, fields, fmt, name):
+    if fmt not in export.FORMATS:
+        return jsonify({'success': False, 'error': f"Unsupported export format: {fmt}"}), 400
+    content_type, extension = export.FORMATS[fmt]
+    # stream_with_context: 제너레이터가 응답을 보내는 동안 요청 컨텍스트와 DB 세션을 유지
+    return Response(
+        stream_with_context(export.encode(rows, fields, fmt)),
+        content_type=content_type,
+        headers={'Content-Disposition': f'attachment; filename={name}.{extension}'}
+    )
+
+@app.route('/api/export/products')
+@login_required
+def api_export_products():
+    fmt = request.args.get('format', 'csv')
+    return _export_response(manager.iter_products(), export.PRODUCT_FIELDS, fmt, 'products')
+
+@app.route('/api/export/sales')
+@login_required
+def api_export_sales():
+    fmt = request.args.get('format', 'csv')
+    start_date = request.args.get('start_date') or None
+    end_date = request.args.get('end_date') or None
+    name = f"sales_{start_date or 'all'}_{end_date or 'all'}"
+    return _export_response(sales_manager.iter_sales(start_date, end_date), export.SALES_FIELDS, fmt, name)
+
+@app.route('/api/sales/bulk', methods=['POST'])
+@login_required
+def api_bulk_record_sales():
+    try:
+        lines = request.json
+        if not isinstance(lines, list):
+            raise ValueError("Request body must be a JSON array")
+        if _run_in_background(lines):
+            return _job_response('import_sales', {'lines': lines})
+        result = sales_manager.record_sales_bulk(lines)
+        return jsonify({'success': True, 'result': result})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
 
 @app.route('/sales/add', methods=['GET', 'POST'])
 @login_required
@@ -213,8 +508,9 @@ def add_sale():
             sale_date = request.form['sale_date']
             quantity = int(request.form['quantity'])
             platform = request.form['platform']
+            variant_id = int(request.form['variant_id']) if request.form.get('variant_id') else None
             
-            sales_manager.record_sale(product_id, sale_date, quantity, platform)
+            sales_manager.record_sale(product_id, sale_date, quantity, platform, variant_id)
             return redirect(url_for('sales_page'))
         except Exception as e:
             products = manager.get_all_products()
@@ -237,8 +533,9 @@ def edit_sale(sale_id):
             sale_date = request.form['sale_date']
             quantity = int(request.form['quantity'])
             platform = request.form['platform']
+            variant_id = int(request.form['variant_id']) if request.form.get('variant_id') else None
             
-            sales_manager.update_sale(sale_id, product_id, sale_date, quantity, platform)
+            sales_manager.update_sale(sale_id, product_id, sale_date, quantity, platform, variant_id)
             return redirect(url_for('sales_page'))
         except Exception as e:
             products = manager.get_all_products()
@@ -276,13 +573,56 @@ def reports_page():
     sales_summary = sales_manager.get_sales_summary(start_date, end_date)
     inventory_summary = manager.get_inventory_summary()
     
+    sales_report = None
+    report_job = None
+    try:
+        if jobs.JOBS_ENABLED:
+            # 분석은 워커가 계산 - 같은 기간/데이터 버전의 작업이 있으면 그 결과를 쓰고, 없으면 추가 후 화면이 폴링
+            job_id = job_queue.enqueue('sales_report',
+                                       {'start_date': str(start_date), 'end_date': str(end_date)},
+                                       created_by=current_user.id,
+                                       dedupe_key=sales_analytics.report_key(start_date, end_date))
+            report_job = job_queue.get_job(job_id)
+            if report_job['status'] == 'succeeded':
+                sales_report, report_job = report_job['result'], None
+        else:
+            sales_report = sales_analytics.get_sales_report(start_date, end_date)
+    except ValueError as e:
+        flash(str(e), 'error')
+    
     return render_template('reports.html',
                          sales_summary=sales_summary,
                          inventory_summary=inventory_summary,
+                         sales_report=sales_report,
+                         report_job=report_job,
                          start_date=start_date,
                          end_date=end_date,
                          period=period)
 
+@app.route('/api/forecasts')
+@login_required
+@httpcache.conditional('inventory', 'forecasts', daily=True)
+def api_forecasts():
+    try:
+        return jsonify(forecast_manager.get_stockout_risks(limit=request.args.get('limit', 50)))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+@app.route('/api/reports/analytics')
+@login_required
+def api_reports_analytics():
+    today = date.today()
+    start_date = request.args.get('start_date', (today - timedelta(days=30)).isoformat())
+    end_date = request.args.get('end_date', today.isoformat())
+    try:
+        if request.args.get('async') == '1':
+            return _job_response('sales_report', {'start_date': start_date, 'end_date': end_date},
+                                 dedupe_key=sales_analytics.report_key(start_date, end_date))
+        report = sales_analytics.get_sales_report(start_date, end_date)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify(report)
+
 if __name__ == '__main__':
     # 데이터베이스 초기화
     database.init_database()
@@ -0,0 +1,253 @@
+"""비동기(ASGI) 실행 모드
+
+읽기 위주 API(/api/products, /api/products/search, /api/inventory/summary, /api/sales)는
+비동기 드라이버(asyncpg) 연결 풀로 처리해 DB 응답을 기다리는 동안 워커를 점유하지 않고,
+나머지 경로(화면, 쓰기 API, 로그인)는 기존 Flask 앱으로 전달한다.
+로그인은 Flask 세션 쿠키를 그대로 읽어 확인하므로 두 모드를 섞어 써도 된다.
+ETag/304와 응답 압축도 Flask 앱과 같은 규칙(httpcache)을 따른다.
+변경 알림 스트림(/api/events)도 이벤트 루프에서 처리하므로 연결 수가 스레드 수에 묶이지 않는다.
+
+    pip install -r requirements-async.txt
+    uvicorn asgi:app --host 0.0.0.0 --port $PORT --workers 2
+"""
+from contextlib import asynccontextmanager
+from datetime import date
+from email.utils import format_datetime
+from urllib.parse import quote
+from itsdangerous import BadSignature
+from werkzeug.http import parse_accept_header, parse_date, parse_etags
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import RedirectResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from a2wsgi import WSGIMiddleware
+import async_db
+import cache
+import events
+import httpcache
+import repository
+import search_index
+from app import app as flask_app, manager, sales_manager
+from auth import User
+from cache import cached
+from inventory import (
+    product_cache, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, PRODUCT_SORT_KEYS,
+    INVENTORY_TOTALS_QUERY
+)
+
+
+class AsyncInventoryReader:
+    """InventoryManager / SalesManager 읽기 메서드의 비동기 버전
+
+    쿼리 생성과 결과 변환은 동기 매니저의 메서드를 그대로 쓰고, 실행만 AsyncSession으로 한다.
+    메서드 이름과 인자가 같아 동기 매니저와 상품 캐시(product_cache) 항목을 공유한다.
+    """
+
+    @cached(product_cache)
+    async def get_all_products(self, search="", sort_by="name"):
+        async with async_db.session() as db:
+            query, params = manager._all_products_query(db, search, sort_by)
+            rows = await db.fetchall(query, params)
+        return [manager._product_from_row(row) for row in rows]
+
+    async def get_products_page(self, search="", sort_by="name", limit=DEFAULT_PAGE_SIZE, cursor=None):
+        if sort_by not in PRODUCT_SORT_KEYS:
+            sort_by = 'name'
+        limit = repository.page_size(limit, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+        async with async_db.session() as db:
+            query, params = manager._products_page_query(db, search, sort_by, limit, cursor)
+            rows = await db.fetchall(query, params)
+        return manager._products_page(rows, sort_by, limit)
+
+    @cached(product_cache)
+    async def search_products(self, query, limit=20):
+        words = search_index.terms(query)
+        if not words:
+            return []
+        limit = repository.page_size(limit, 20, 100)
+        async with async_db.session() as db:
+            sql, params = manager._search_query(db, query, limit)
+            rows = await db.fetchall(sql, params)
+        return [manager._product_from_row(row) for row in rows]
+
+    @cached(product_cache)
+    async def get_inventory_summary(self):
+        async with async_db.session() as db:
+            row = await db.fetchone(INVENTORY_TOTALS_QUERY)
+        return manager._inventory_summary(row)
+
+    async def get_inventory_details_page(self, limit=DEFAULT_PAGE_SIZE, cursor=None):
+        limit = repository.page_size(limit, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+        query, params = manager._inventory_details_query(limit, cursor)
+        total_quantity = (await self.get_inventory_summary())['total_quantity']
+        async with async_db.session() as db:
+            rows = await db.fetchall(query, params)
+        return manager._inventory_details_page(rows, total_quantity, limit)
+
+    async def get_sales_page(self, start_date, end_date, limit=DEFAULT_PAGE_SIZE, cursor=None):
+        limit = repository.page_size(limit, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+        query, params = sales_manager._sales_page_query(start_date, end_date, limit, cursor)
+        async with async_db.session() as db:
+            rows = await db.fetchall(query, params)
+        return sales_manager._sales_page(rows, limit)
+
+
+reader = AsyncInventoryReader()
+
+
+def _json(data, status_code=200):
+    # Flask jsonify와 같은 직렬화 (Decimal -> 문자열, 날짜 -> HTTP 날짜, 키 정렬)
+    return Response(flask_app.json.dumps(data), status_code=status_code, media_type='application/json')
+
+async def _current_user(request):
+    """Flask 세션 쿠키에서 로그인 사용자 확인 (Flask-Login의 _user_id)"""
+    cookie = request.cookies.get(flask_app.config.get('SESSION_COOKIE_NAME', 'session'))
+    if not cookie:
+        return None
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    try:
+        data = serializer.loads(cookie, max_age=int(flask_app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        return None
+    user_id = data.get('_user_id')
+    if user_id is None:
+        return None
+    # 대부분 user_cache에서 바로 반환되지만 캐시 미스 시 동기 DB 조회이므로 스레드에서 실행
+    return await run_in_threadpool(User.get_by_id, int(user_id))
+
+def login_required(handler):
+    async def wrapper(request):
+        user = await _current_user(request)
+        if user is None:
+            # Flask-Login과 같이 로그인 화면으로 이동
+            return RedirectResponse(f"/login?next={quote(request.url.path)}", status_code=302)
+        request.state.user = user
+        return await handler(request)
+    return wrapper
+
+def _compressed(request, response):
+    encoding = httpcache.choose_encoding(parse_accept_header(request.headers.get('accept-encoding')))
+    response.headers['Vary'] = 'Accept-Encoding'
+    if encoding and len(response.body) >= httpcache.COMPRESS_MIN_SIZE:
+        response.body = httpcache.compress(response.body, encoding)
+        response.headers['Content-Encoding'] = encoding
+        response.headers['Content-Length'] = str(len(response.body))
+    return response
+
+def conditional(*sources, daily=False):
+    """httpcache.conditional의 비동기 버전 (login_required 안쪽에 붙인다) - 200 응답은 압축까지 처리"""
+    def decorator(handler):
+        async def wrapper(request):
+            async with async_db.session() as db:
+                versions = httpcache.versions_from_rows(await db.fetchall(httpcache.VERSIONS_QUERY))
+            cache.sync_all(versions)
+            etag = httpcache.make_etag(versions, sources, request.state.user.get_id(),
+                                       date.today() if daily else '')
+            modified = httpcache.last_modified(versions, sources)
+
+            if_none_match = request.headers.get('if-none-match')
+            if httpcache.not_modified(etag, modified, parse_etags(if_none_match) if if_none_match else None,
+                                      parse_date(request.headers.get('if-modified-since'))):
+                response = Response(status_code=304)
+            else:
+                response = await handler(request)
+                if response.status_code != 200:
+                    return response
+                response = _compressed(request, response)
+            response.headers['ETag'] = f'W/"{etag}"'
+            if modified:
+                response.headers['Last-Modified'] = format_datetime(modified, usegmt=True)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
+
+
+@login_required
+@conditional('inventory')
+async def api_products(request):
+    args = request.query_params
+    if 'limit' not in args and 'cursor' not in args:
+        return _json(await reader.get_all_products())
+    try:
+        page = await reader.get_products_page(
+            search=args.get('search', ''),
+            sort_by=args.get('sort', 'name'),
+            limit=args.get('limit'),
+            cursor=args.get('cursor')
+        )
+    except ValueError as e:
+        return _json({'success': False, 'error': str(e)}, 400)
+    return _json(page)
+
+@login_required
+@conditional('inventory')
+async def api_search_products(request):
+    query = request.query_params.get('q', '').strip()
+    try:
+        products = await reader.search_products(query, limit=request.query_params.get('limit', 20))
+    except ValueError as e:
+        return _json({'success': False, 'error': str(e)}, 400)
+    return _json(products)
+
+@login_required
+@conditional('inventory')
+async def api_inventory_summary(request):
+    summary = await reader.get_inventory_summary()
+    args = request.query_params
+    if args.get('details'):
+        try:
+            page = await reader.get_inventory_details_page(limit=args.get('limit'), cursor=args.get('cursor'))
+        except ValueError as e:
+            return _json({'success': False, 'error': str(e)}, 400)
+        summary = dict(summary, product_details=page['items'], next_cursor=page['next_cursor'])
+    return _json(summary)
+
+@login_required
+@conditional('sales', 'inventory', daily=True)
+async def api_sales(request):
+    args = request.query_params
+    today = date.today().strftime('%Y-%m-%d')
+    try:
+        page = await reader.get_sales_page(
+            args.get('start_date', today),
+            args.get('end_date', today),
+            limit=args.get('limit'),
+            cursor=args.get('cursor')
+        )
+    except ValueError as e:
+        return _json({'success': False, 'error': str(e)}, 400)
+    return _json(page)
+
+@login_required
+async def api_events(request):
+    subscription = events.subscribe_async()
+    if subscription is None:
+        return _json({'success': False, 'error': 'Too many event streams'}, 503)
+    return StreamingResponse(events.stream_async(subscription), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def _warm_search_index():
+    # search_index.has_index는 동기 조회로 결과를 기억하므로 비동기 요청 전에 미리 확인해 둔다
+    with repository.session() as db:
+        search_index.has_index(db)
+
+@asynccontextmanager
+async def lifespan(app):
+    await run_in_threadpool(_warm_search_index)
+    yield
+    await async_db.close_pool()
+
+
+app = Starlette(
+    routes=[
+        Route('/api/products', api_products),
+        Route('/api/products/search', api_search_products),
+        Route('/api/inventory/summary', api_inventory_summary),
+        Route('/api/sales', api_sales),
+        Route('/api/events', api_events),
+        Mount('/', app=WSGIMiddleware(flask_app)),
+    ],
+    lifespan=lifespan,
+)
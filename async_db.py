@@ -0,0 +1,83 @@
+"""비동기 데이터 계층 (ASGI 실행 모드 전용, asgi.py 참고)
+
+PostgreSQL은 asyncpg 연결 풀, SQLite(로컬 개발)는 aiosqlite로 요청마다 연결을 연다.
+쿼리는 동기 계층(repository.Session)과 같이 '?' 플레이스홀더로 작성하며,
+AsyncSession.dialect 가 repository의 방언과 같은 속성을 가지므로 매니저의 쿼리 생성 메서드를 그대로 쓸 수 있다.
+"""
+import asyncio
+import os
+import re
+from contextlib import asynccontextmanager
+from datetime import date
+import database_cloud as database
+import repository
+
+_pool = None
+_pool_lock = asyncio.Lock()
+
+
+def _numbered(query):
+    # '?' -> $1, $2, ... (asyncpg 플레이스홀더)
+    counter = iter(range(1, query.count('?') + 1))
+    return re.sub(r'\?', lambda _: f'${next(counter)}', query)
+
+
+class AsyncSession:
+    """비동기 연결 하나에 대한 읽기 전용 쿼리 실행기"""
+
+    def __init__(self, conn, dialect):
+        self.conn = conn
+        self.dialect = dialect
+
+    async def fetchall(self, query, params=()):
+        if self.dialect.is_postgres:
+            return await self.conn.fetch(_numbered(query), *params)
+        async with self.conn.execute(query, tuple(params)) as cursor:
+            return await cursor.fetchall()
+
+    async def fetchone(self, query, params=()):
+        if self.dialect.is_postgres:
+            return await self.conn.fetchrow(_numbered(query), *params)
+        async with self.conn.execute(query, tuple(params)) as cursor:
+            return await cursor.fetchone()
+
+
+async def _init_connection(conn):
+    # DATE 값을 텍스트로 주고받는다 - 동기 계층처럼 'YYYY-MM-DD' 문자열 파라미터를 그대로 쓸 수 있도록
+    await conn.set_type_codec('date', schema='pg_catalog', format='text',
+                              encoder=str, decoder=date.fromisoformat)
+
+async def get_pool():
+    """프로세스(이벤트 루프) 공용 asyncpg 풀 - 최초 사용 시 생성"""
+    global _pool
+    if _pool is None:
+        async with _pool_lock:
+            if _pool is None:
+                import asyncpg
+                _pool = await asyncpg.create_pool(
+                    database._postgres_dsn(),
+                    min_size=int(os.getenv('ASYNC_DB_POOL_MIN_SIZE', '1')),
+                    max_size=int(os.getenv('ASYNC_DB_POOL_MAX_SIZE', '20')),
+                    max_inactive_connection_lifetime=float(os.getenv('DB_POOL_IDLE_TIMEOUT', '300')),
+                    command_timeout=float(os.getenv('DB_POOL_TIMEOUT', '30')),
+                    init=_init_connection,
+                )
+    return _pool
+
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+@asynccontextmanager
+async def session():
+    """async with 블록 동안 비동기 연결 하나를 AsyncSession으로 빌린다"""
+    if database.USE_POSTGRESQL:
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            yield AsyncSession(conn, repository.POSTGRESQL)
+    else:
+        import aiosqlite
+        async with aiosqlite.connect(database.SQLITE_PATH, timeout=30) as conn:
+            yield AsyncSession(conn, repository.SQLITE)
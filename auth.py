@@ -1,10 +1,67 @@
+from concurrent.futures import ThreadPoolExecutor
 from flask_login import UserMixin
 from flask_bcrypt import Bcrypt
-import database_cloud as database
+import repository
 import os
+import threading
+from cache import TTLCache
 
 bcrypt = Bcrypt()
 
+# bcrypt 작업 비용 (2^N회) - 바꾸면 기존 사용자는 다음 로그인 때 새 비용으로 다시 해시된다
+BCRYPT_LOG_ROUNDS = int(os.getenv('BCRYPT_LOG_ROUNDS', '12'))
+# 동시에 실행할 해시 검사 수 / 대기까지 포함한 최대 수 (넘으면 LoginBusy)
+BCRYPT_THREADS = int(os.getenv('BCRYPT_THREADS', str(min(4, os.cpu_count() or 1))))
+BCRYPT_MAX_PENDING = int(os.getenv('BCRYPT_MAX_PENDING', str(BCRYPT_THREADS * 4)))
+
+_hash_pool = None
+_hash_pool_lock = threading.Lock()
+_hash_slots = threading.BoundedSemaphore(BCRYPT_MAX_PENDING)
+
+# load_user용 사용자 캐시 - 인증된 요청마다 users 테이블을 조회하지 않도록 (사용자 생성/수정 시 무효화)
+user_cache = TTLCache(
+    'users',
+    maxsize=int(os.getenv('USER_CACHE_MAX_ENTRIES', '1024')),
+    ttl=float(os.getenv('USER_CACHE_TTL', '300'))
+)
+
+
+class LoginBusy(Exception):
+    """해시 검사 대기열이 가득 참 - 로그인 폭주 중에도 다른 요청을 처리할 워커를 남겨두기 위해 거절"""
+
+
+def _reset_hash_pool():
+    # fork된 자식에는 부모의 스레드가 없으므로 풀을 새로 만든다
+    global _hash_pool
+    _hash_pool = None
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_hash_pool)
+
+def _run_hash(fn, *args):
+    """bcrypt 계산을 크기가 제한된 스레드 풀에서 실행 (bcrypt는 계산 중 GIL을 놓는다)"""
+    global _hash_pool
+    if not _hash_slots.acquire(blocking=False):
+        raise LoginBusy("Too many concurrent logins")
+    try:
+        with _hash_pool_lock:
+            if _hash_pool is None:
+                _hash_pool = ThreadPoolExecutor(max_workers=BCRYPT_THREADS, thread_name_prefix='bcrypt')
+        return _hash_pool.submit(fn, *args).result()
+    finally:
+        _hash_slots.release()
+
+def hash_password(password):
+    return bcrypt.generate_password_hash(password, rounds=BCRYPT_LOG_ROUNDS).decode('utf-8')
+
+def _hash_rounds(password_hash):
+    # $2b$12$... -> 12
+    try:
+        return int(password_hash.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+
 class User(UserMixin):
     def __init__(self, id, username, email, is_admin=False):
         self.id = id
@@ -15,47 +72,23 @@ class User(UserMixin):
     @staticmethod
     def create_user(username, email, password, is_admin=False):
         """새 사용자 생성"""
-        conn = database.get_connection()
-        cursor = conn.cursor()
-        
         # 비밀번호 해시화
-        password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        password_hash = _run_hash(hash_password, password)
         
-        try:
-            if hasattr(conn, 'server_version'):  # PostgreSQL
-                cursor.execute('''
-                    INSERT INTO users (username, email, password_hash, is_admin)
-                    VALUES (%s, %s, %s, %s)
-                    RETURNING id
-                ''', (username, email, password_hash, is_admin))
-                user_id = cursor.fetchone()[0]
-            else:  # SQLite
-                cursor.execute('''
-                    INSERT INTO users (username, email, password_hash, is_admin)
-                    VALUES (?, ?, ?, ?)
-                ''', (username, email, password_hash, is_admin))
-                user_id = cursor.lastrowid
-            
-            conn.commit()
-            conn.close()
-            return user_id
-        except Exception as e:
-            conn.close()
-            raise e
+        with repository.session() as db:
+            user_id = db.insert('''
+                INSERT INTO users (username, email, password_hash, is_admin)
+                VALUES (?, ?, ?, ?)
+            ''', (username, email, password_hash, is_admin))
+            db.commit()
+        user_cache.clear()
+        return user_id
     
     @staticmethod
     def get_by_username(username):
         """사용자명으로 사용자 조회"""
-        conn = database.get_connection()
-        cursor = conn.cursor()
-        
-        if hasattr(conn, 'server_version'):  # PostgreSQL
-            cursor.execute('SELECT id, username, email, is_admin FROM users WHERE username = %s', (username,))
-        else:  # SQLite
-            cursor.execute('SELECT id, username, email, is_admin FROM users WHERE username = ?', (username,))
-        
-        user_data = cursor.fetchone()
-        conn.close()
+        with repository.session() as db:
+            user_data = db.fetchone('SELECT id, username, email, is_admin FROM users WHERE username = ?', (username,))
         
         if user_data:
             return User(user_data[0], user_data[1], user_data[2], user_data[3])
@@ -63,40 +96,54 @@ class User(UserMixin):
     
     @staticmethod
     def get_by_id(user_id):
-        """ID로 사용자 조회"""
-        conn = database.get_connection()
-        cursor = conn.cursor()
+        """ID로 사용자 조회 (user_cache에 있으면 DB 조회 없이 반환)"""
+        found, user = user_cache.get(user_id)
+        if found:
+            return user
         
-        if hasattr(conn, 'server_version'):  # PostgreSQL
-            cursor.execute('SELECT id, username, email, is_admin FROM users WHERE id = %s', (user_id,))
-        else:  # SQLite
-            cursor.execute('SELECT id, username, email, is_admin FROM users WHERE id = ?', (user_id,))
-        
-        user_data = cursor.fetchone()
-        conn.close()
+        generation = user_cache.generation
+        with repository.session() as db:
+            user_data = db.fetchone('SELECT id, username, email, is_admin FROM users WHERE id = ?', (user_id,))
         
         if user_data:
-            return User(user_data[0], user_data[1], user_data[2], user_data[3])
+            user = User(user_data[0], user_data[1], user_data[2], user_data[3])
+            # 없는 사용자는 캐시하지 않는다 (생성 직후 바로 보이도록)
+            user_cache.set(user_id, user, generation=generation)
+            return user
         return None
     
     @staticmethod
-    def verify_password(username, password):
-        """비밀번호 확인"""
-        conn = database.get_connection()
-        cursor = conn.cursor()
+    def authenticate(username, password):
+        """
+        로그인 - 사용자와 비밀번호 해시를 한 번에 조회해 확인하고, 맞으면 User 반환
+        저장된 해시의 비용이 BCRYPT_LOG_ROUNDS와 다르면 새 비용으로 다시 해시해 저장한다.
+        해시 검사 대기열이 가득 차면 LoginBusy.
+        """
+        with repository.session() as db:
+            user_data = db.fetchone(
+                'SELECT id, username, email, is_admin, password_hash FROM users WHERE username = ?',
+                (username,)
+            )
+        
+        if not user_data:
+            return None
         
-        # 연결 타입 확인 (psycopg2 vs sqlite3)
-        if hasattr(conn, 'server_version'):  # PostgreSQL
-            cursor.execute('SELECT password_hash FROM users WHERE username = %s', (username,))
-        else:  # SQLite
-            cursor.execute('SELECT password_hash FROM users WHERE username = ?', (username,))
+        password_hash = user_data[4]
+        if not _run_hash(bcrypt.check_password_hash, password_hash, password):
+            return None
         
-        result = cursor.fetchone()
-        conn.close()
+        if _hash_rounds(password_hash) != BCRYPT_LOG_ROUNDS:
+            new_hash = _run_hash(hash_password, password)
+            with repository.session() as db:
+                db.execute('UPDATE users SET password_hash = ? WHERE id = ?', (new_hash, user_data[0]))
+                db.commit()
         
-        if result:
-            return bcrypt.check_password_hash(result[0], password)
-        return False
+        return User(user_data[0], user_data[1], user_data[2], user_data[3])
+    
+    @staticmethod
+    def verify_password(username, password):
+        """비밀번호 확인"""
+        return User.authenticate(username, password) is not None
     
     @staticmethod
     def init_admin():
@@ -0,0 +1,316 @@
+"""재고/판매 주요 경로 벤치마크
+
+합성 상품/판매 데이터를 만들어 넣고 매니저 메서드와 Flask 화면/API(test client)의 응답 시간을 재어
+JSON으로 저장한다. 커밋 사이 성능 회귀 비교용.
+
+    python benchmark.py --size small                          # SQLite, 상품 100 / 판매 1천
+    python benchmark.py --size medium -o before.json
+    python benchmark.py --size medium --compare before.json   # 이전 결과와 비교
+    python benchmark.py --backend sqlite postgres --postgres-url postgresql://localhost/bench
+
+백엔드마다 별도 프로세스에서 실행한다. SQLite는 임시 디렉터리의 새 DB를 쓰고,
+PostgreSQL은 --postgres-url 데이터베이스의 products/sales/users 데이터를 지우고 시작하므로
+반드시 벤치마크 전용 DB(로컬 docker 등)를 지정한다.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SIZES = {
+    'small': (100, 1_000),
+    'medium': (10_000, 100_000),
+    'large': (100_000, 1_000_000),
+}
+
+PLATFORMS = ['네이버', '쿠팡', '자사몰']
+WORDS = ['무선', '블루투스', '이어폰', '스피커', '케이블', '충전기', '거치대', '마우스', '키보드',
+         '모니터', '노트북', '파우치', '텀블러', '머그컵', '티셔츠', '양말', '모자', '가방']
+OPTIONS = ['색상: 블랙', '색상: 화이트', '색상: 레드', '사이즈: S', '사이즈: M', '사이즈: L', '']
+
+
+def _timings(fn, repeat, before=None):
+    samples = []
+    for _ in range(repeat):
+        if before:
+            before()
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        'runs': repeat,
+        'min_ms': round(samples[0], 3),
+        'median_ms': round(statistics.median(samples), 3),
+        'mean_ms': round(statistics.fmean(samples), 3),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+    }
+
+
+def _reset_postgres(db):
+    db.execute('TRUNCATE sales_daily, sales, products, users, stock_movements, stock_snapshots RESTART IDENTITY CASCADE')
+    # TRUNCATE는 행 트리거를 실행하지 않으므로 재고 집계 행은 직접 비운다
+    db.execute('UPDATE inventory_totals SET product_count = 0, total_quantity = 0, total_value = 0, price_sum = 0')
+    db.commit()
+
+def _seed(db, products, sales_count, seed):
+    """합성 상품/판매 삽입 - 같은 seed면 같은 데이터"""
+    rng = random.Random(seed)
+    catalog = []
+    batch = []
+    for i in range(products):
+        price = rng.randrange(1_000, 100_000, 100)
+        margins = (rng.choice([0, 5, 10, 15]), rng.choice([0, 8, 12]), rng.choice([0, 20, 25]))
+        name = ' '.join(rng.sample(WORDS, 2)) + f' {i:06d}'
+        batch.append((name, rng.choice(OPTIONS), price, *margins, rng.randint(1_000, 5_000)))
+        catalog.append((price, dict(zip(PLATFORMS, margins))))
+        if len(batch) >= 5_000:
+            db.insert_many('products', ['name', 'options', 'price', 'margin_naver', 'margin_coupang',
+                                        'margin_self', 'quantity'], batch)
+            batch = []
+    db.insert_many('products', ['name', 'options', 'price', 'margin_naver', 'margin_coupang',
+                                'margin_self', 'quantity'], batch)
+    db.commit()
+
+    stock = db.fetchall('SELECT id, quantity FROM products ORDER BY id')
+    product_ids = [row[0] for row in stock]
+    # 재고 변동 원장 기초 재고 (판매 시드는 재고를 차감하지 않으므로 원장도 기초 재고뿐)
+    moved_at = datetime.now().isoformat(sep=' ', timespec='seconds')
+    db.insert_many('stock_movements', ['product_id', 'movement_type', 'quantity_change', 'note', 'moved_at'],
+                   [(row[0], 'adjust', row[1], '기초 재고', moved_at) for row in stock])
+    start = date.today() - timedelta(days=3 * 365)
+    batch = []
+    for _ in range(sales_count):
+        index = rng.randrange(len(product_ids))
+        price, margins = catalog[index]
+        quantity = rng.randint(1, 5)
+        platform = rng.choice(PLATFORMS)
+        revenue = price * quantity
+        batch.append((product_ids[index], (start + timedelta(days=rng.randrange(3 * 365))).isoformat(),
+                      quantity, platform, revenue, revenue * margins[platform] / 100))
+        if len(batch) >= 10_000:
+            db.insert_many('sales', ['product_id', 'sale_date', 'quantity', 'platform', 'revenue', 'profit'], batch)
+            batch = []
+    db.insert_many('sales', ['product_id', 'sale_date', 'quantity', 'platform', 'revenue', 'profit'], batch)
+
+    # 일별 집계는 마이그레이션 backfill과 같은 방식으로 한 번에 다시 만든다
+    db.execute('DELETE FROM sales_daily')
+    db.execute('''
+        INSERT INTO sales_daily (sale_date, product_id, platform, sales_count, quantity, revenue, profit)
+        SELECT sale_date, product_id, platform, COUNT(*), SUM(quantity), SUM(revenue), SUM(profit)
+        FROM sales
+        GROUP BY sale_date, product_id, platform
+    ''')
+    db.commit()
+    if not db.dialect.is_postgres:
+        db.execute('ANALYZE')
+        db.commit()
+    return product_ids
+
+
+def run_backend(args):
+    """현재 프로세스의 DATABASE_URL 백엔드로 시드 + 측정 (자식 프로세스에서 실행)"""
+    import migrations
+    import repository
+    migrations.migrate()
+
+    seed_started = time.perf_counter()
+    with repository.session() as db:
+        backend = db.dialect.name
+        if db.dialect.is_postgres:
+            _reset_postgres(db)
+        product_ids = _seed(db, args.products, args.sales, args.seed)
+    seed_seconds = time.perf_counter() - seed_started
+
+    import analytics
+    import forecast
+    import inventory
+    import sales
+    from auth import User
+    from app import app
+    manager = inventory.InventoryManager()
+    sales_manager = sales.SalesManager()
+    sales_analytics = analytics.SalesAnalytics()
+    forecast_manager = forecast.ForecastManager()
+    clear_cache = inventory.product_cache.clear
+    repeat = args.repeat
+    rng = random.Random(args.seed + 1)
+
+    today = date.today()
+    last_30 = ((today - timedelta(days=30)).isoformat(), today.isoformat())
+    all_time = ((today - timedelta(days=3 * 365)).isoformat(), today.isoformat())
+
+    results = {}
+    # 읽기 - 캐시를 비우고 매번 DB에서 읽는 시간
+    results['get_all_products'] = _timings(manager.get_all_products, repeat, clear_cache)
+    results['get_all_products_search'] = _timings(lambda: manager.get_all_products(search='블루투스'), repeat, clear_cache)
+    results['get_all_products_cached'] = _timings(manager.get_all_products, repeat)
+    results['get_products_page'] = _timings(lambda: manager.get_products_page(sort_by='value', limit=50), repeat)
+    results['get_inventory_summary'] = _timings(manager.get_inventory_summary, repeat, clear_cache)
+    results['get_sales_summary_30d'] = _timings(lambda: sales_manager.get_sales_summary(*last_30), repeat)
+    results['get_sales_summary_all'] = _timings(lambda: sales_manager.get_sales_summary(*all_time), repeat)
+    results['get_sales_report_all'] = _timings(lambda: sales_analytics.get_sales_report(*all_time), repeat,
+                                               analytics.analytics_cache.clear)
+
+    results['run_forecast'] = _timings(forecast_manager.run_forecast, repeat)
+
+    # 쓰기
+    results['record_sale'] = _timings(
+        lambda: sales_manager.record_sale(rng.choice(product_ids), today.isoformat(), 1, rng.choice(PLATFORMS)),
+        repeat
+    )
+    results['bulk_update_products_100'] = _timings(
+        lambda: manager.bulk_update_products([
+            {'id': product_id, 'price': rng.randrange(1_000, 100_000, 100), 'quantity': rng.randint(1_000, 5_000)}
+            for product_id in rng.sample(product_ids, min(100, len(product_ids)))
+        ]),
+        repeat
+    )
+
+    # 화면/API (로그인 후 test client)
+    User.create_user('bench', 'bench@example.com', 'bench-password')
+    app.config['TESTING'] = True
+    client = app.test_client()
+    client.post('/login', data={'username': 'bench', 'password': 'bench-password'})
+    routes = {
+        'route_dashboard': '/',
+        'route_inventory': '/inventory',
+        'route_sales': f'/sales?start_date={last_30[0]}&end_date={last_30[1]}',
+        'route_reports_month': '/reports?period=month',
+        'route_api_products': '/api/products',
+        'route_api_inventory_summary': '/api/inventory/summary',
+    }
+    for name, url in routes.items():
+        def request(url=url):
+            response = client.get(url)
+            if response.status_code != 200:
+                raise RuntimeError(f"{url} returned {response.status_code}")
+        results[name] = _timings(request, repeat, clear_cache)
+
+    return {
+        'backend': backend,
+        'products': args.products,
+        'sales': args.sales,
+        'seed_seconds': round(seed_seconds, 2),
+        'results': results,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _spawn(backend, args):
+    """백엔드별 자식 프로세스 실행 - 환경변수로 DB를 고르고 결과 JSON 파일을 읽는다"""
+    with tempfile.TemporaryDirectory(prefix='inventory-bench-') as workdir:
+        env = dict(os.environ)
+        env['PYTHONPATH'] = REPO_DIR + os.pathsep + env.get('PYTHONPATH', '')
+        # 빈 값이면 .env의 DATABASE_URL도 무시하고 SQLite(작업 디렉터리의 inventory.db) 사용
+        env['DATABASE_URL'] = args.postgres_url if backend == 'postgres' else ''
+        env.setdefault('BCRYPT_LOG_ROUNDS', '4')
+        output = os.path.join(workdir, 'result.json')
+        command = [sys.executable, os.path.join(REPO_DIR, 'benchmark.py'), '--child', output,
+                   '--products', str(args.products), '--sales', str(args.sales),
+                   '--repeat', str(args.repeat), '--seed', str(args.seed)]
+        subprocess.run(command, cwd=workdir, env=env, check=True)
+        with open(output, encoding='utf-8') as f:
+            return json.load(f)
+
+def compare(current, baseline, threshold):
+    """같은 백엔드/항목의 median 비교 - threshold배 이상 느려진 항목 수 반환"""
+    regressions = 0
+    if (current['meta']['products'], current['meta']['sales']) != (baseline['meta']['products'], baseline['meta']['sales']):
+        print("Warning: baseline was seeded with a different data size; timings are not comparable")
+    baseline_runs = {run['backend']: run for run in baseline['runs']}
+    for run in current['runs']:
+        base = baseline_runs.get(run['backend'])
+        if base is None:
+            continue
+        print(f"\n[{run['backend']}] vs {baseline['meta'].get('commit') or 'baseline'}")
+        for name, result in run['results'].items():
+            if name not in base['results']:
+                continue
+            before = base['results'][name]['median_ms']
+            after = result['median_ms']
+            ratio = after / before if before else float('inf')
+            mark = '  REGRESSION' if ratio >= threshold else ''
+            if mark:
+                regressions += 1
+            print(f"  {name:<32} {before:>10.2f}ms -> {after:>10.2f}ms  x{ratio:.2f}{mark}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='재고/판매 주요 경로 벤치마크')
+    parser.add_argument('--backend', nargs='+', choices=['sqlite', 'postgres'], default=['sqlite'])
+    parser.add_argument('--postgres-url', default=os.getenv('BENCHMARK_DATABASE_URL'),
+                        help='벤치마크 전용 PostgreSQL URL (데이터가 지워진다)')
+    parser.add_argument('--size', choices=list(SIZES), default='small')
+    parser.add_argument('--products', type=int, help='상품 수 (--size 대신 직접 지정)')
+    parser.add_argument('--sales', type=int, help='판매 건수 (--size 대신 직접 지정)')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('-o', '--output', help='결과 JSON 저장 경로 (생략 시 표준 출력)')
+    parser.add_argument('--compare', help='비교할 이전 결과 JSON')
+    parser.add_argument('--threshold', type=float, default=1.2, help='이 배수 이상 느려지면 회귀로 표시')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    default_products, default_sales = SIZES[args.size]
+    args.products = args.products or default_products
+    args.sales = args.sales or default_sales
+
+    if args.child:
+        result = run_backend(args)
+        with open(args.child, 'w', encoding='utf-8') as f:
+            json.dump(result, f)
+        return 0
+
+    if 'postgres' in args.backend and not args.postgres_url:
+        parser.error('--postgres-url (or BENCHMARK_DATABASE_URL) is required for the postgres backend')
+
+    report = {
+        'meta': {
+            'commit': _git_commit(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'products': args.products,
+            'sales': args.sales,
+            'repeat': args.repeat,
+            'seed': args.seed,
+        },
+        'runs': [_spawn(backend, args) for backend in args.backend],
+    }
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        print(f"Saved benchmark results to {args.output}")
+    elif not args.compare:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        print(f"\n{regressions} regression(s) at x{args.threshold} threshold")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""프로세스 내 읽기 캐시
+
+TTL + 크기 제한 LRU 캐시. 쓰기 경로(상품 추가/수정/삭제, 판매 기록)에서 clear()로 무효화한다.
+gunicorn 워커마다 별도의 캐시를 가지므로 다른 워커(작업 워커 포함)의 쓰기는 clear()를 부르지 않는다.
+sources를 준 캐시는 조건부 요청(httpcache.conditional)이 데이터 변경 카운터를 읽을 때마다 sync()로
+마지막으로 본 카운터와 비교해 바뀌었으면 비운다 - ETag와 캐시된 본문이 같은 데이터 버전을 가리키도록.
+그 밖의 읽기에서는 다른 프로세스의 쓰기가 TTL이 지나야 반영된다.
+"""
+import functools
+import inspect
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+_registry: List['TTLCache'] = []
+
+
+class TTLCache:
+    """스레드 안전 TTL + LRU 캐시"""
+
+    def __init__(self, name: str, maxsize: int = 256, ttl: float = 30, sources: Tuple[str, ...] = ()):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # 캐시 내용이 의존하는 데이터 변경 카운터 이름 (httpcache.load_versions)
+        self.sources = tuple(sources)
+        self._seen_versions = None
+        self._data = OrderedDict()  # key -> (expires_at, value), 마지막이 가장 최근 사용
+        self._lock = threading.Lock()
+        # clear()마다 증가 - 조회 도중 무효화된 결과가 캐시에 들어가지 않도록 비교용
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        _registry.append(self)
+
+    def get(self, key):
+        """(찾음 여부, 값) 반환"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return False, None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def set(self, key, value, generation=None):
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.generation += 1
+            self.invalidations += 1
+
+    def sync(self, versions: Dict):
+        """데이터 변경 카운터({이름: (카운터, 시각)})가 마지막으로 본 값과 다르면 비운다 (처음 볼 때도)"""
+        if not self.sources:
+            return
+        seen = tuple(versions.get(name, (0, None))[0] for name in self.sources)
+        with self._lock:
+            changed = seen != self._seen_versions
+            self._seen_versions = seen
+        if changed:
+            self.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'name': self.name,
+                'entries': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+
+def cached(cache: TTLCache):
+    """메서드 결과를 (메서드명, 인자) 키로 캐시 - 반환값은 캐시와 공유되므로 호출자가 수정하면 안 된다
+
+    코루틴 메서드도 지원한다. 이름과 인자가 같으면 동기/비동기 메서드가 같은 항목을 공유한다.
+    """
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(self, *args, **kwargs):
+                key = (fn.__name__, args, tuple(sorted(kwargs.items())))
+                found, value = cache.get(key)
+                if found:
+                    return value
+                generation = cache.generation
+                value = await fn(self, *args, **kwargs)
+                cache.set(key, value, generation=generation)
+                return value
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            key = (fn.__name__, args, tuple(sorted(kwargs.items())))
+            found, value = cache.get(key)
+            if found:
+                return value
+            generation = cache.generation
+            value = fn(self, *args, **kwargs)
+            cache.set(key, value, generation=generation)
+            return value
+        return wrapper
+    return decorator
+
+
+def create_cache(name: str, sources: Tuple[str, ...] = ()) -> TTLCache:
+    """환경변수(CACHE_TTL, CACHE_MAX_ENTRIES) 설정으로 캐시 생성"""
+    return TTLCache(
+        name,
+        maxsize=int(os.getenv('CACHE_MAX_ENTRIES', '256')),
+        ttl=float(os.getenv('CACHE_TTL', '30')),
+        sources=sources
+    )
+
+
+def sync_all(versions: Dict):
+    """sources가 있는 모든 캐시를 현재 데이터 변경 카운터에 맞춘다 (다른 프로세스의 쓰기 반영)"""
+    for cache in _registry:
+        cache.sync(versions)
+
+
+def all_stats() -> List[Dict]:
+    return [c.stats() for c in _registry]
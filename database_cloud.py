@@ -1,7 +1,10 @@
 import os
 import sqlite3
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 from dotenv import load_dotenv
+from pool import PostgresPool, SQLitePool, PoolTimeout
 
 # 환경변수 로드
 load_dotenv()
@@ -9,167 +12,97 @@ load_dotenv()
 # 데이터베이스 URL (환경변수에서 가져오기)
 DATABASE_URL = os.getenv('DATABASE_URL')
 USE_POSTGRESQL = DATABASE_URL and DATABASE_URL.startswith('postgresql')
+SQLITE_PATH = 'inventory.db'
 
 if USE_POSTGRESQL:
     import psycopg2
     from psycopg2.extras import RealDictCursor
-    from urllib.parse import urlparse
+
+_pool = None
+_pool_lock = threading.Lock()
+_fallback_pool = None
 
 def init_database():
-    """데이터베이스 초기화 - SQLite와 PostgreSQL 모두 지원"""
+    """데이터베이스 초기화 - 미적용 스키마 마이그레이션을 순서대로 적용 (SQLite와 PostgreSQL 모두 지원)"""
+    import migrations
+    migrations.migrate()
+    print(f"Database initialized successfully ({'PostgreSQL' if USE_POSTGRESQL else 'SQLite'})")
+
+def _postgres_dsn():
+    """PostgreSQL 접속 URL 반환 (pooler URL은 direct로 변경, sslmode 강제)"""
+    # Direct connection 강제 (pooler 대신)
+    direct_url = DATABASE_URL
+    # pooler URL이면 direct로 변경
+    if 'pooler.supabase.com:6543' in direct_url:
+        # pooler URL을 direct URL로 변경
+        # postgres.zbovkkoffkiivhpddlxf -> db.zbovkkoffkiivhpddlxf
+        # pooler.supabase.com:6543 -> supabase.co:5432
+        direct_url = direct_url.replace('postgres.zbovkkoffkiivhpddlxf', 'db.zbovkkoffkiivhpddlxf')
+        direct_url = direct_url.replace('pooler.supabase.com:6543', 'supabase.co:5432')
+    
+    # sslmode 추가하여 연결 시도
+    if '?' not in direct_url:
+        direct_url += '?sslmode=require'
+    elif 'sslmode' not in direct_url:
+        direct_url += '&sslmode=require'
+    return direct_url
+
+def _create_pool():
     if USE_POSTGRESQL:
-        # PostgreSQL 연결
-        result = urlparse(DATABASE_URL)
-        conn = psycopg2.connect(
-            database=result.path[1:],
-            user=result.username,
-            password=result.password,
-            host=result.hostname,
-            port=result.port
-        )
-        cursor = conn.cursor()
-        
-        # PostgreSQL 테이블 생성
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS products (
-            id SERIAL PRIMARY KEY,
-            name VARCHAR(100) NOT NULL,
-            options TEXT,
-            price DECIMAL(10,2) NOT NULL,
-            margin_naver DECIMAL(5,2) NOT NULL,
-            margin_coupang DECIMAL(5,2) NOT NULL,
-            margin_self DECIMAL(5,2) NOT NULL,
-            quantity INTEGER NOT NULL DEFAULT 0,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS sales (
-            id SERIAL PRIMARY KEY,
-            product_id INTEGER NOT NULL REFERENCES products(id),
-            sale_date DATE NOT NULL,
-            quantity INTEGER NOT NULL,
-            platform VARCHAR(10) NOT NULL,
-            revenue DECIMAL(10,2) NOT NULL,
-            profit DECIMAL(10,2) NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        # 사용자 테이블 추가 (인증 시스템용)
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id SERIAL PRIMARY KEY,
-            username VARCHAR(50) UNIQUE NOT NULL,
-            email VARCHAR(100) UNIQUE NOT NULL,
-            password_hash VARCHAR(255) NOT NULL,
-            is_admin BOOLEAN DEFAULT FALSE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-    else:
-        # SQLite 연결 (기존 코드)
-        conn = sqlite3.connect('inventory.db')
-        cursor = conn.cursor()
-        
-        # SQLite 테이블 생성
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS products (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name VARCHAR(100) NOT NULL,
-            options TEXT,
-            price DECIMAL(10,2) NOT NULL,
-            margin_naver DECIMAL(5,2) NOT NULL,
-            margin_coupang DECIMAL(5,2) NOT NULL,
-            margin_self DECIMAL(5,2) NOT NULL,
-            quantity INTEGER NOT NULL DEFAULT 0,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        dsn = _postgres_dsn()
+        return PostgresPool(
+            lambda: psycopg2.connect(dsn),
+            max_size=int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+            idle_timeout=float(os.getenv('DB_POOL_IDLE_TIMEOUT', '300')),
+            timeout=float(os.getenv('DB_POOL_TIMEOUT', '30')),
+            health_check_interval=float(os.getenv('DB_POOL_HEALTH_CHECK_INTERVAL', '30')),
         )
-        ''')
-        
-        # 마이그레이션 체크
-        cursor.execute("PRAGMA table_info(products)")
-        columns = [column[1] for column in cursor.fetchall()]
-        
-        if 'options' not in columns:
-            cursor.execute('ALTER TABLE products ADD COLUMN options TEXT')
-            print("Added 'options' column to products table")
-        
-        if 'margin_a' in columns and 'margin_naver' not in columns:
-            cursor.execute('ALTER TABLE products ADD COLUMN margin_naver DECIMAL(5,2)')
-            cursor.execute('ALTER TABLE products ADD COLUMN margin_coupang DECIMAL(5,2)')
-            cursor.execute('ALTER TABLE products ADD COLUMN margin_self DECIMAL(5,2)')
-            cursor.execute('UPDATE products SET margin_naver = margin_a, margin_coupang = margin_b, margin_self = margin_c')
-            print("Migrated margin columns to new platform names")
-        
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS sales (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            product_id INTEGER NOT NULL,
-            sale_date DATE NOT NULL,
-            quantity INTEGER NOT NULL,
-            platform VARCHAR(10) NOT NULL,
-            revenue DECIMAL(10,2) NOT NULL,
-            profit DECIMAL(10,2) NOT NULL,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (product_id) REFERENCES products (id)
-        )
-        ''')
-        
-        # 사용자 테이블 추가 (인증 시스템용)
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username VARCHAR(50) UNIQUE NOT NULL,
-            email VARCHAR(100) UNIQUE NOT NULL,
-            password_hash VARCHAR(255) NOT NULL,
-            is_admin BOOLEAN DEFAULT 0,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-    
-    conn.commit()
-    conn.close()
-    print(f"Database initialized successfully ({'PostgreSQL' if USE_POSTGRESQL else 'SQLite'})")
+    return SQLitePool(SQLITE_PATH)
+
+def get_pool():
+    """프로세스 공용 커넥션 풀 (최초 사용 시 생성)"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = _create_pool()
+    return _pool
+
+def after_fork():
+    """fork된 워커(gunicorn post_fork)에서 호출 - 부모에게 물려받은 풀 대신 이 프로세스 전용 연결을 쓰도록 초기화
+
+    PostgresPool은 os.register_at_fork로도 같은 처리를 하므로 여러 번 호출해도 안전하다.
+    SQLitePool은 연결을 쓸 때 프로세스 id를 확인해 새로 연다.
+    """
+    for pool in (_pool, _fallback_pool):
+        if isinstance(pool, PostgresPool):
+            pool.after_fork()
 
 def get_connection():
-    """데이터베이스 연결 반환"""
-    if USE_POSTGRESQL:
-        try:
-            # Direct connection 강제 (pooler 대신)
-            direct_url = DATABASE_URL
-            # pooler URL이면 direct로 변경
-            if 'pooler.supabase.com:6543' in direct_url:
-                # pooler URL을 direct URL로 변경
-                # postgres.zbovkkoffkiivhpddlxf -> db.zbovkkoffkiivhpddlxf
-                # pooler.supabase.com:6543 -> supabase.co:5432
-                direct_url = direct_url.replace('postgres.zbovkkoffkiivhpddlxf', 'db.zbovkkoffkiivhpddlxf')
-                direct_url = direct_url.replace('pooler.supabase.com:6543', 'supabase.co:5432')
-                print(f"Converting pooler URL to direct connection...")
-            
-            print(f"Attempting PostgreSQL connection to Supabase...")
-            print(f"Database URL: {direct_url[:30]}...")  # URL 일부만 출력
-            
-            # sslmode 추가하여 연결 시도
-            if '?' not in direct_url:
-                direct_url += '?sslmode=require'
-            elif 'sslmode' not in direct_url:
-                direct_url += '&sslmode=require'
-            
-            conn = psycopg2.connect(direct_url)
-            print("✅ PostgreSQL connection successful!")
-            return conn
-        except Exception as e:
-            # PostgreSQL 연결 실패시 SQLite 폴백
-            print(f"❌ PostgreSQL connection failed: {str(e)}")
-            print("📁 Using SQLite fallback")
-            return sqlite3.connect('inventory.db')
-    else:
-        return sqlite3.connect('inventory.db')
+    """풀에서 연결을 빌려 반환 - close() 호출 시 연결을 닫지 않고 풀로 돌려준다"""
+    global _fallback_pool
+    try:
+        return get_pool().connect()
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        if not USE_POSTGRESQL:
+            raise
+        # PostgreSQL 연결 실패시 SQLite 폴백
+        print(f"❌ PostgreSQL connection failed: {str(e)}")
+        print("📁 Using SQLite fallback")
+        if _fallback_pool is None:
+            _fallback_pool = SQLitePool(SQLITE_PATH)
+        return _fallback_pool.connect()
+
+@contextmanager
+def connection():
+    """with 블록 동안 풀에서 연결을 빌린다 - 블록이 끝나면 커밋되지 않은 작업은 롤백하고 반환"""
+    conn = get_connection()
+    try:
+        yield conn
+    finally:
+        conn.close()
 
 def dict_factory(cursor, row):
     """SQLite 결과를 딕셔너리로 변환"""
@@ -0,0 +1,333 @@
+"""변경 알림 (Server-Sent Events)
+
+InventoryManager / SalesManager의 쓰기가 같은 트랜잭션에서 작은 변경 이벤트를 발행하고(publish),
+브라우저는 GET /api/events(SSE)로 받아 목록을 다시 불러오지 않고 해당 행만 고친다.
+
+    {'type': 'product', 'id': 1, 'fields': {'quantity': 42, 'price': 12000.0}}   # 바뀐 필드만 (등록 시 전체, created)
+    {'type': 'product_deleted', 'id': 1}
+    {'type': 'variant', 'id': 7, 'product_id': 1, 'fields': {'quantity': 3}}    # 옵션 (variant_deleted도 같은 모양)
+    {'type': 'sale', 'action': 'created' | 'updated' | 'deleted' | 'imported', ...}
+    {'type': 'reload'}   # 놓친 이벤트가 있을 수 있음 - 클라이언트는 목록을 다시 불러온다
+
+전달 경로
+    PostgreSQL  pg_notify(CHANNEL) - 커밋될 때 전달되고 롤백되면 버려진다. 워커마다 LISTEN 스레드 하나가
+                받아서 그 프로세스의 구독자에게 나눠 주므로 다른 워커의 쓰기도 전달된다.
+    SQLite      커밋 직후 같은 프로세스의 구독자에게 바로 전달 (Session.after_commit). 다른 프로세스(워커)의
+                쓰기는 data_versions의 events 버전으로 알 수 있으므로 스트림이 SSE_POLL_SECONDS마다 확인해
+                이 프로세스가 전달받지 못한 커밋이 있으면 reload를 보낸다.
+
+동기(Flask) 스트림은 gthread 스레드 하나를 점유하므로 워커당 SSE_MAX_CLIENTS개까지만 받고,
+SSE_MAX_SECONDS마다 연결을 끊어(브라우저 EventSource가 자동 재연결) 스레드를 돌려준다.
+동시 접속이 많으면 ASGI 모드(asgi.py)로 실행한다.
+"""
+import asyncio
+import json
+import os
+import queue
+import select
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+import database_cloud as database
+import repository
+
+CHANNEL = 'inventory_events'
+# SQLite - 이벤트를 발행한 커밋마다 올라가는 data_versions 행
+EVENTS_VERSION = 'events'
+
+SSE_MAX_CLIENTS = int(os.getenv('SSE_MAX_CLIENTS', '2'))
+SSE_MAX_ASYNC_CLIENTS = int(os.getenv('SSE_MAX_ASYNC_CLIENTS', '500'))
+SSE_MAX_SECONDS = float(os.getenv('SSE_MAX_SECONDS', '300'))
+SSE_POLL_SECONDS = float(os.getenv('SSE_POLL_SECONDS', '2'))
+HEARTBEAT_SECONDS = 15
+RETRY_MS = 3000
+QUEUE_SIZE = 1000
+
+# pg_notify 페이로드 제한은 8000바이트 - 여유를 두고 나눠 보낸다
+_NOTIFY_LIMIT = 7000
+
+RELOAD = {'type': 'reload'}
+
+
+def product_changed(product_id: int, fields: Dict, created: bool = False) -> Dict:
+    event = {'type': 'product', 'id': product_id, 'fields': fields}
+    if created:
+        event['created'] = True
+    return event
+
+def product_deleted(product_id: int) -> Dict:
+    return {'type': 'product_deleted', 'id': product_id}
+
+def variant_changed(variant_id: int, product_id: int, fields: Dict, created: bool = False) -> Dict:
+    event = {'type': 'variant', 'id': variant_id, 'product_id': product_id, 'fields': fields}
+    if created:
+        event['created'] = True
+    return event
+
+def variant_deleted(variant_id: int, product_id: int) -> Dict:
+    return {'type': 'variant_deleted', 'id': variant_id, 'product_id': product_id}
+
+def sale_changed(action: str, **values) -> Dict:
+    return dict({'type': 'sale', 'action': action}, **values)
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, default=str, separators=(',', ':'))
+
+def _payloads(events: List[Dict]) -> List[str]:
+    """이벤트 목록 -> _NOTIFY_LIMIT 이하 JSON 배열 문자열들 (한 건이 너무 크면 reload로 대체)"""
+    payloads, batch, size = [], [], 2
+    for event in events:
+        encoded = _dumps(event)
+        if len(encoded.encode('utf-8')) + 2 > _NOTIFY_LIMIT:
+            encoded = _dumps(RELOAD)
+        length = len(encoded.encode('utf-8')) + 1
+        if batch and size + length > _NOTIFY_LIMIT:
+            payloads.append('[' + ','.join(batch) + ']')
+            batch, size = [], 2
+        batch.append(encoded)
+        size += length
+    if batch:
+        payloads.append('[' + ','.join(batch) + ']')
+    return payloads
+
+def publish(db, events: List[Dict]):
+    """쓰기 트랜잭션 안에서 호출 - 커밋되면 구독자에게 전달되고 롤백되면 버려진다"""
+    if not events:
+        return
+    if db.dialect.is_postgres:
+        for payload in _payloads(events):
+            db.execute('SELECT pg_notify(?, ?)', (CHANNEL, payload))
+    else:
+        # 다른 프로세스의 스트림은 이 버전이 건너뛴 것을 보고 reload를 보낸다 (_VersionWatch)
+        repository.bump_data_version(db, EVENTS_VERSION)
+        version = db.fetchone('SELECT version FROM data_versions WHERE name = ?', (EVENTS_VERSION,))[0]
+        db.after_commit(lambda: broker.dispatch(events, version))
+
+def events_version() -> int:
+    """SQLite - 지금까지 이벤트를 발행한 커밋 수"""
+    with repository.session() as db:
+        row = db.fetchone('SELECT version FROM data_versions WHERE name = ?', (EVENTS_VERSION,))
+    return row[0] if row else 0
+
+
+class Broker:
+    """프로세스 안의 구독자(콜백)에게 이벤트 목록을 나눠 준다"""
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback: Callable[[List[Dict], Optional[int]], None], kind: str, limit: int) -> bool:
+        with self._lock:
+            if sum(1 for k in self._subscribers.values() if k == kind) >= limit:
+                return False
+            self._subscribers[callback] = kind
+        if database.USE_POSTGRESQL:
+            _start_listener()
+        return True
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self._subscribers.pop(callback, None)
+
+    def dispatch(self, events: List[Dict], version: Optional[int] = None):
+        """version: SQLite에서 이 이벤트를 발행한 커밋의 events 버전"""
+        with self._lock:
+            callbacks = list(self._subscribers)
+        for callback in callbacks:
+            callback(events, version)
+
+broker = Broker()
+
+
+_listener_lock = threading.Lock()
+_listener_pid = None
+
+def _start_listener():
+    """이 프로세스의 LISTEN 스레드 시작 (처음 구독할 때 한 번, fork된 워커에서는 다시)"""
+    global _listener_pid
+    with _listener_lock:
+        if _listener_pid == os.getpid():
+            return
+        _listener_pid = os.getpid()
+        threading.Thread(target=_listen, name='events-listener', daemon=True).start()
+
+def _listen():
+    import psycopg2
+    backoff = 1
+    reconnect = False
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(database._postgres_dsn())
+            conn.autocommit = True
+            conn.cursor().execute(f'LISTEN {CHANNEL}')
+            if reconnect:
+                # 끊겨 있던 동안의 알림은 받지 못했으므로 화면에 다시 불러오라고 알린다
+                broker.dispatch([RELOAD])
+            reconnect = True
+            backoff = 1
+            while True:
+                if select.select([conn], [], [], HEARTBEAT_SECONDS) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    try:
+                        broker.dispatch(json.loads(notify.payload))
+                    except ValueError:
+                        broker.dispatch([RELOAD])
+        except Exception as e:
+            print(f"⚠️ Event listener disconnected, retrying in {backoff}s: {e}")
+        finally:
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+        time.sleep(backoff)
+        backoff = min(backoff * 2, 30)
+
+
+def format_message(events: List[Dict]) -> str:
+    return f'event: change\ndata: {_dumps(events)}\n\n'
+
+def _ready() -> str:
+    return f'retry: {RETRY_MS}\nevent: ready\ndata: {{}}\n\n'
+
+
+class _VersionWatch:
+    """SQLite 스트림 - 이 프로세스로 전달된 커밋의 events 버전을 세어 다른 프로세스의 커밋을 찾는다"""
+
+    def __init__(self, version: int):
+        self.seen = version
+        self.polled = time.monotonic()
+
+    def delivered(self, version: Optional[int]):
+        # 바로 다음 버전일 때만 앞으로 - 사이에 빈 버전이 있으면 다음 확인에서 reload
+        if version is not None and version == self.seen + 1:
+            self.seen = version
+
+    def due(self) -> bool:
+        return time.monotonic() - self.polled >= SSE_POLL_SECONDS
+
+    def missed(self, version: int) -> bool:
+        """DB의 현재 버전 - 전달받지 못한 커밋이 있으면 True"""
+        self.polled = time.monotonic()
+        if version > self.seen:
+            self.seen = version
+            return True
+        return False
+
+
+class Subscription:
+    """동기(스레드) 구독 - 큐가 넘치면(느린 클라이언트) reload를 보내고 연결을 끝낸다"""
+
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self.overflowed = False
+
+    def __call__(self, events, version=None):
+        try:
+            self.queue.put_nowait((events, version))
+        except queue.Full:
+            self.overflowed = True
+
+def subscribe() -> Optional[Subscription]:
+    """동기 스트림용 구독 - 워커의 SSE 연결 수가 SSE_MAX_CLIENTS에 닿았으면 None"""
+    subscription = Subscription()
+    if not broker.subscribe(subscription, 'sync', SSE_MAX_CLIENTS):
+        return None
+    return subscription
+
+def stream(subscription: Subscription):
+    """SSE 본문 제너레이터 - 이벤트가 없으면 HEARTBEAT_SECONDS마다 주석 줄로 연결 유지"""
+    deadline = time.monotonic() + SSE_MAX_SECONDS
+    watch = None if database.USE_POSTGRESQL else _VersionWatch(events_version())
+    wait = HEARTBEAT_SECONDS if watch is None else min(SSE_POLL_SECONDS, HEARTBEAT_SECONDS)
+    try:
+        yield _ready()
+        sent = time.monotonic()
+        while time.monotonic() < deadline:
+            try:
+                events, version = subscription.queue.get(timeout=wait)
+            except queue.Empty:
+                events = None
+            if subscription.overflowed:
+                yield format_message([RELOAD])
+                return
+            if events is not None:
+                if watch is not None:
+                    watch.delivered(version)
+                yield format_message(events)
+                sent = time.monotonic()
+            if watch is not None and watch.due() and watch.missed(events_version()):
+                yield format_message([RELOAD])
+                sent = time.monotonic()
+            if time.monotonic() - sent >= HEARTBEAT_SECONDS:
+                yield ': ping\n\n'
+                sent = time.monotonic()
+    finally:
+        broker.unsubscribe(subscription)
+
+
+class AsyncSubscription:
+    """asyncio 구독 - 다른 스레드(LISTEN, 커밋한 스레드)에서 온 이벤트를 이벤트 루프로 넘긴다"""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.overflowed = False
+
+    def _put(self, events, version):
+        try:
+            self.queue.put_nowait((events, version))
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    def __call__(self, events, version=None):
+        try:
+            self.loop.call_soon_threadsafe(self._put, events, version)
+        except RuntimeError:
+            # 이벤트 루프가 이미 닫힘 (종료 중)
+            pass
+
+def subscribe_async() -> Optional[AsyncSubscription]:
+    subscription = AsyncSubscription(asyncio.get_running_loop())
+    if not broker.subscribe(subscription, 'async', SSE_MAX_ASYNC_CLIENTS):
+        return None
+    return subscription
+
+async def stream_async(subscription: AsyncSubscription):
+    """stream의 비동기 버전 - 연결 시간 제한 없이 클라이언트가 끊을 때까지"""
+    loop = asyncio.get_running_loop()
+    watch = None
+    if not database.USE_POSTGRESQL:
+        # 버전 확인은 동기 DB 호출이므로 이벤트 루프를 막지 않도록 스레드에서
+        watch = _VersionWatch(await loop.run_in_executor(None, events_version))
+    wait = HEARTBEAT_SECONDS if watch is None else min(SSE_POLL_SECONDS, HEARTBEAT_SECONDS)
+    try:
+        yield _ready()
+        sent = time.monotonic()
+        while True:
+            try:
+                events, version = await asyncio.wait_for(subscription.queue.get(), wait)
+            except asyncio.TimeoutError:
+                events = None
+            if subscription.overflowed:
+                yield format_message([RELOAD])
+                return
+            if events is not None:
+                if watch is not None:
+                    watch.delivered(version)
+                yield format_message(events)
+                sent = time.monotonic()
+            if watch is not None and watch.due() and watch.missed(await loop.run_in_executor(None, events_version)):
+                yield format_message([RELOAD])
+                sent = time.monotonic()
+            if time.monotonic() - sent >= HEARTBEAT_SECONDS:
+                yield ': ping\n\n'
+                sent = time.monotonic()
+    finally:
+        broker.unsubscribe(subscription)
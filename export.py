@@ -0,0 +1,67 @@
+"""상품/판매 내보내기 (CSV, NDJSON)
+
+InventoryManager.iter_products / SalesManager.iter_sales 가 서버 측 커서로 읽은 행을
+chunk_rows 행 단위 문자열 청크로 인코딩한다. 결과 전체를 메모리에 만들지 않으므로
+여러 해 분량의 판매 내역도 일정한 메모리로 내보낼 수 있다.
+"""
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, Iterable, Iterator, List
+
+PRODUCT_FIELDS = ['id', 'name', 'options', 'price', 'margin_naver', 'margin_coupang', 'margin_self',
+                  'quantity', 'value', 'created_at', 'updated_at']
+SALES_FIELDS = ['id', 'product_id', 'product_name', 'variant_id', 'variant_options', 'sale_date', 'quantity',
+                'platform', 'revenue', 'profit', 'created_at']
+
+# 형식 -> (Content-Type, 파일 확장자)
+FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'ndjson': ('application/x-ndjson; charset=utf-8', 'ndjson'),
+}
+
+
+def _json_default(value):
+    # 금액은 반올림 오차가 없도록 문자열로 (jsonify와 동일)
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def _csv_chunks(rows: Iterable[Dict], fields: List[str], chunk_rows: int) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM - 엑셀에서 한글이 깨지지 않도록 (manage.py import-sales 기본 인코딩 utf-8-sig와 짝)
+    buffer.write('\ufeff')
+    writer.writerow(fields)
+    pending = 0
+    for row in rows:
+        writer.writerow(['' if row[f] is None else row[f] for f in fields])
+        pending += 1
+        if pending >= chunk_rows:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue()
+
+def _ndjson_chunks(rows: Iterable[Dict], fields: List[str], chunk_rows: int) -> Iterator[str]:
+    lines = []
+    for row in rows:
+        lines.append(json.dumps({f: row[f] for f in fields}, ensure_ascii=False, default=_json_default))
+        if len(lines) >= chunk_rows:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+def encode(rows: Iterable[Dict], fields: List[str], fmt: str, chunk_rows: int = 500) -> Iterator[str]:
+    """행 dict 이터러블을 fmt('csv' 또는 'ndjson') 문자열 청크로 인코딩"""
+    if fmt == 'csv':
+        return _csv_chunks(rows, fields, chunk_rows)
+    if fmt == 'ndjson':
+        return _ndjson_chunks(rows, fields, chunk_rows)
+    raise ValueError(f"Unsupported export format: {fmt} (use {', '.join(FORMATS)})")
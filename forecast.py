@@ -0,0 +1,208 @@
+"""재고 소진 예측 / 발주 제안 (배치)
+
+    python manage.py forecast [--as-of 2024-06-30]   # 하루 한 번 (cron 등)
+
+최근 FORECAST_HISTORY_DAYS일의 일별 판매 집계(sales_daily)와 현재 재고(products.quantity)로
+전체 상품의 판매 속도(플랫폼별 지수 평활 + 이동 평균), 수요 표준편차, 재고 소진 일수, 재주문점, 발주 제안 수량을
+NumPy로 한 번에 계산해 stock_forecasts 테이블에 통째로 다시 쓴다.
+화면은 저장된 결과만 읽으므로 요청마다 예측을 다시 계산하지 않는다.
+
+    재주문점 = 일 판매 속도 × 리드타임 + 안전계수 × 수요 표준편차 × √리드타임
+    발주 제안 = 재고가 재주문점 이하일 때 (재주문점 + 일 판매 속도 × 목표 보유 일수 - 현재 재고)
+"""
+import math
+import os
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional
+import numpy as np
+import repository
+from analytics import load_columns, PLATFORM_LABELS
+from cache import cached
+from inventory import product_cache
+from metrics import timed
+
+HISTORY_DAYS = int(os.getenv('FORECAST_HISTORY_DAYS', '90'))
+# 지수 평활 스팬(일) - alpha = 2 / (span + 1)
+SMOOTHING_SPAN = float(os.getenv('FORECAST_SMOOTHING_DAYS', '14'))
+MOVING_AVERAGE_DAYS = int(os.getenv('FORECAST_MOVING_AVERAGE_DAYS', '28'))
+LEAD_TIME_DAYS = float(os.getenv('FORECAST_LEAD_TIME_DAYS', '7'))
+# 안전재고 계수 (1.65 ≈ 95% 서비스 수준)
+SAFETY_FACTOR = float(os.getenv('FORECAST_SAFETY_FACTOR', '1.65'))
+# 발주 시 재주문점 위로 확보할 판매 일수
+COVER_DAYS = float(os.getenv('FORECAST_COVER_DAYS', '30'))
+
+_LOCK_ID = 0x666f72  # 동시에 두 번 실행되지 않도록 (PostgreSQL advisory lock)
+_INSERT_BATCH = 5000
+
+
+def smoothing_weights(days: int, span: float) -> np.ndarray:
+    """마지막 날 가중치가 가장 큰 지수 평활 가중치 (합이 1이 되도록 정규화 - 짧은 이력에서도 편향 없음)"""
+    alpha = 2 / (span + 1)
+    weights = alpha * (1 - alpha) ** np.arange(days - 1, -1, -1, dtype=np.float64)
+    return weights / weights.sum()
+
+
+class ForecastManager:
+    @timed
+    def run_forecast(self, as_of: Optional[date] = None) -> Dict:
+        """
+        전체 상품 예측을 계산해 stock_forecasts를 교체하고 요약 반환
+        as_of: 기준일 (기본 오늘) - 전날까지 HISTORY_DAYS일을 사용한다 (당일 판매는 아직 진행 중이므로 제외)
+        """
+        started = time.perf_counter()
+        as_of = as_of or date.today()
+        end = as_of - timedelta(days=1)
+        start = as_of - timedelta(days=HISTORY_DAYS)
+
+        with repository.session() as db:
+            product_rows = db.fetchall('SELECT id, quantity FROM products ORDER BY id')
+            columns = load_columns(db, start, end)
+
+        product_ids = np.array([row[0] for row in product_rows], dtype=np.int64)
+        quantity = np.array([row[1] for row in product_rows], dtype=np.float64)
+        result = self._compute(product_ids, quantity, columns)
+        computed_at = datetime.now().replace(microsecond=0)
+        rows = self._rows(product_ids, quantity, result, as_of, computed_at)
+
+        with repository.session() as db:
+            if db.dialect.is_postgres:
+                db.execute('SELECT pg_advisory_xact_lock(?)', (_LOCK_ID,))
+            else:
+                db.execute('BEGIN IMMEDIATE')
+            db.execute('DELETE FROM stock_forecasts')
+            for offset in range(0, len(rows), _INSERT_BATCH):
+                db.insert_many('stock_forecasts', [
+                    'product_id', 'velocity', 'velocity_naver', 'velocity_coupang', 'velocity_self',
+                    'moving_average', 'demand_std', 'quantity', 'days_of_cover', 'stockout_date',
+                    'reorder_point', 'suggested_quantity', 'computed_at'
+                ], rows[offset:offset + _INSERT_BATCH])
+            repository.bump_data_version(db, 'forecasts')
+            db.commit()
+
+        product_cache.clear()
+        return {
+            'as_of': as_of.isoformat(),
+            'products': len(rows),
+            'selling': int((result['velocity'] > 0).sum()),
+            'reorder': int((result['suggested'] > 0).sum()),
+            'computed_at': computed_at.isoformat(sep=' '),
+            'seconds': round(time.perf_counter() - started, 3)
+        }
+
+    def _compute(self, product_ids: np.ndarray, quantity: np.ndarray, columns) -> Dict[str, np.ndarray]:
+        size = len(product_ids)
+        days = columns.days
+        platforms = len(PLATFORM_LABELS)
+
+        # 판매 행의 상품 id -> products 배열 위치 (삭제된 상품의 판매는 제외)
+        position = np.searchsorted(product_ids, columns.product)
+        known = position < size
+        known[known] = product_ids[position[known]] == columns.product[known]
+        position = position[known]
+        day = columns.day[known]
+        sold = columns.quantity[known].astype(np.float64)
+
+        # 플랫폼별 지수 평활 판매 속도 (상품 × 플랫폼)
+        weights = smoothing_weights(days, SMOOTHING_SPAN)
+        by_platform = np.bincount(position * platforms + columns.platform[known], weights=sold * weights[day],
+                                  minlength=size * platforms).reshape(size, platforms)
+        velocity = by_platform.sum(axis=1)
+
+        recent = day >= days - MOVING_AVERAGE_DAYS
+        moving_average = np.bincount(position[recent], weights=sold[recent], minlength=size) / min(MOVING_AVERAGE_DAYS, days)
+
+        # 일별 판매량(플랫폼 합) 표준편차 - 판매가 없던 날은 0으로 포함
+        product_day, index = np.unique(position * days + day, return_inverse=True)
+        daily_total = np.bincount(index, weights=sold)
+        sum_squares = np.bincount(product_day // days, weights=daily_total ** 2, minlength=size)
+        mean = np.bincount(position, weights=sold, minlength=size) / days
+        demand_std = np.sqrt(np.maximum(sum_squares / days - mean ** 2, 0))
+
+        selling = velocity > 0
+        days_of_cover = np.full(size, np.nan)
+        days_of_cover[selling] = quantity[selling] / velocity[selling]
+        reorder_point = np.ceil(velocity * LEAD_TIME_DAYS + SAFETY_FACTOR * demand_std * math.sqrt(LEAD_TIME_DAYS))
+        order_up_to = reorder_point + np.ceil(velocity * COVER_DAYS)
+        suggested = np.where(selling & (quantity <= reorder_point), np.maximum(order_up_to - quantity, 0), 0)
+
+        return {
+            'by_platform': by_platform,
+            'velocity': velocity,
+            'moving_average': moving_average,
+            'demand_std': demand_std,
+            'days_of_cover': days_of_cover,
+            'reorder_point': reorder_point,
+            'suggested': suggested
+        }
+
+    def _rows(self, product_ids, quantity, result: Dict[str, np.ndarray], as_of: date, computed_at: datetime):
+        by_platform = np.round(result['by_platform'], 4).tolist()
+        cover = result['days_of_cover']
+        stockout = [
+            (as_of + timedelta(days=int(value))).isoformat() if not math.isnan(value) and value < 36500 else None
+            for value in cover.tolist()
+        ]
+        return list(zip(
+            product_ids.tolist(),
+            np.round(result['velocity'], 4).tolist(),
+            [p[0] for p in by_platform],
+            [p[1] for p in by_platform],
+            [p[2] for p in by_platform],
+            np.round(result['moving_average'], 4).tolist(),
+            np.round(result['demand_std'], 4).tolist(),
+            quantity.astype(np.int64).tolist(),
+            [None if math.isnan(value) else round(value, 2) for value in cover.tolist()],
+            stockout,
+            result['reorder_point'].astype(np.int64).tolist(),
+            result['suggested'].astype(np.int64).tolist(),
+            [computed_at.isoformat(sep=' ')] * len(product_ids)
+        ))
+
+    @timed
+    @cached(product_cache)
+    def get_stockout_risks(self, limit: int = 10) -> Dict:
+        """
+        예측상 재고가 가장 먼저 떨어질 상품 목록과 발주 제안 건수 (대시보드용)
+        순위와 발주 제안 건수는 마지막 예측 시점 기준이고, 목록의 남은 일수/제안 수량은 현재 재고로 다시 계산한다.
+        """
+        limit = repository.page_size(limit, 10, 500)
+        with repository.session() as db:
+            summary = db.fetchone('''
+                SELECT COUNT(*), SUM(CASE WHEN suggested_quantity > 0 THEN 1 ELSE 0 END), MAX(computed_at)
+                FROM stock_forecasts
+            ''')
+            rows = db.fetchall('''
+                SELECT p.id, p.name, p.options, p.quantity, f.velocity, f.moving_average, f.reorder_point
+                FROM stock_forecasts f
+                JOIN products p ON p.id = f.product_id
+                WHERE f.days_of_cover IS NOT NULL
+                ORDER BY f.days_of_cover, f.product_id
+                LIMIT ?
+            ''', (limit,))
+
+        items = []
+        for row in rows:
+            velocity = float(row[4])
+            days_of_cover = row[3] / velocity
+            needs_reorder = row[3] <= row[6]
+            items.append({
+                'product_id': row[0],
+                'name': row[1],
+                'options': row[2],
+                'quantity': row[3],
+                'velocity': round(velocity, 2),
+                'moving_average': round(float(row[5]), 2),
+                'days_of_cover': round(days_of_cover, 1),
+                'stockout_date': (date.today() + timedelta(days=int(days_of_cover))).isoformat() if days_of_cover < 36500 else None,
+                'reorder_point': row[6],
+                'suggested_quantity': max(row[6] + math.ceil(velocity * COVER_DAYS) - row[3], 0) if needs_reorder else 0,
+                'needs_reorder': needs_reorder
+            })
+
+        return {
+            'products': summary[0] or 0,
+            'reorder_count': summary[1] or 0,
+            'computed_at': summary[2],
+            'items': items
+        }
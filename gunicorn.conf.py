@@ -0,0 +1,45 @@
+"""gunicorn 운영 설정
+
+    python manage.py init                  # 배포(릴리스) 단계에서 1회 - 마이그레이션 + 관리자 계정
+    gunicorn -c gunicorn.conf.py app:app
+
+앱은 마스터에서 한 번만 import(preload)하고 워커는 fork로 복제하므로 워커 시작은 풀 생성뿐이다.
+스키마 작업은 하지 않는다. 모든 값은 환경변수로 조정한다.
+"""
+import multiprocessing
+import os
+
+
+def _bool(name, default):
+    return os.getenv(name, default).lower() in ('1', 'true', 'yes', 'on')
+
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+# sync: 요청마다 워커 하나, gthread: 워커당 threads개 요청 동시 처리 (DB 대기 중 다른 요청 처리)
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.getenv('WEB_CONCURRENCY', str(min(multiprocessing.cpu_count() * 2 + 1, 8))))
+# 변경 알림 스트림(/api/events) 연결 하나가 스레드 하나를 최대 SSE_MAX_SECONDS 동안 점유하므로
+# 일반 요청에 남는 스레드는 threads - SSE_MAX_CLIENTS개다. 스트림을 더 받으려면 둘을 함께 늘리거나 ASGI 모드(asgi.py)로
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+
+preload_app = _bool('GUNICORN_PRELOAD', 'true')
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+
+# 메모리 누수/단편화 대비 주기적 워커 재시작 (0이면 사용 안 함)
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '1000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '100'))
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+
+def post_fork(server, worker):
+    # preload 중 마스터가 연결을 열었더라도 워커는 자기 연결을 새로 열도록 풀 초기화
+    import database_cloud
+    database_cloud.after_fork()
+    server.log.info(f"Worker {worker.pid} ready (database pool reset)")
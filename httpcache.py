@@ -0,0 +1,152 @@
+"""조건부 GET (ETag / Last-Modified)과 응답 압축
+
+- conditional(*sources): 뷰 데코레이터 - 데이터 변경 카운터로 ETag를 만들고, If-None-Match가 같으면
+  목록/요약을 다시 조회·렌더링하지 않고 304를 반환한다
+- init_app(app): 큰 JSON/HTML 응답을 gzip(brotli 패키지가 있으면 br)으로 압축
+
+변경 카운터(load_versions)
+    inventory  상품 쓰기 - products 트리거가 inventory_totals 샤드별 changes/changed_at을 올린다
+    sales      판매 쓰기 - data_versions (SalesManager._apply_to_daily_many)
+    forecasts  예측 배치 - data_versions (ForecastManager.run_forecast)
+
+ETag에는 배포 버전(코드/템플릿 해시)과 로그인 사용자 id도 들어가므로 배포 후나 다른 사용자에게 이전 화면이 재사용되지 않는다.
+카운터를 읽은 뒤 프로세스 내 캐시(cache.sync_all)를 맞추고 뷰를 실행하므로, 다른 워커/작업 워커가 쓴 뒤에도
+새 ETag에 이전 캐시 본문이 붙지 않는다.
+압축하면 본문 바이트가 달라지므로 약한 ETag(W/"...")를 쓴다. If-None-Match가 있으면 If-Modified-Since는 보지 않는다.
+"""
+import functools
+import gzip
+import hashlib
+import os
+from datetime import date, datetime, timezone
+from typing import Dict, Optional, Tuple
+import cache
+import repository
+
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', '1024'))
+COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', '6'))
+COMPRESSIBLE_TYPES = {'application/json', 'text/html', 'text/plain', 'text/csv', 'text/css', 'application/javascript'}
+
+# (이름, 버전, 마지막 변경 시각 UTC)
+VERSIONS_QUERY = '''
+    SELECT 'inventory', SUM(changes), MAX(changed_at) FROM inventory_totals
+    UNION ALL
+    SELECT name, version, updated_at FROM data_versions
+'''
+
+
+def _build_id() -> str:
+    """코드/템플릿 내용 해시 - 같은 배포의 워커끼리는 같고, 배포가 바뀌면 ETag도 바뀐다"""
+    digest = hashlib.sha1()
+    root = os.path.dirname(os.path.abspath(__file__))
+    for folder in (root, os.path.join(root, 'templates')):
+        for name in sorted(os.listdir(folder)):
+            if name.endswith(('.py', '.html')):
+                with open(os.path.join(folder, name), 'rb') as f:
+                    digest.update(name.encode('utf-8') + f.read())
+    return digest.hexdigest()[:12]
+
+BUILD_ID = os.getenv('APP_BUILD_ID') or _build_id()
+
+
+def _utc(value) -> Optional[datetime]:
+    if value is None:
+        return None
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(str(value)[:19])
+    return value.replace(tzinfo=timezone.utc, microsecond=0)
+
+def versions_from_rows(rows) -> Dict[str, Tuple[int, Optional[datetime]]]:
+    return {row[0]: (int(row[1] or 0), _utc(row[2])) for row in rows}
+
+def load_versions(db) -> Dict[str, Tuple[int, Optional[datetime]]]:
+    """{이름: (변경 카운터, 마지막 변경 시각)}"""
+    return versions_from_rows(db.fetchall(VERSIONS_QUERY))
+
+def make_etag(versions: Dict, sources, *extra) -> str:
+    parts = [BUILD_ID] + [f'{name}:{versions.get(name, (0, None))[0]}' for name in sources] + [str(e) for e in extra]
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()[:20]
+
+def last_modified(versions: Dict, sources) -> Optional[datetime]:
+    times = [versions[name][1] for name in sources if name in versions and versions[name][1] is not None]
+    return max(times) if times else None
+
+def not_modified(etag: str, modified: Optional[datetime], if_none_match, if_modified_since) -> bool:
+    """요청의 조건부 헤더(werkzeug ETags / datetime)로 보아 클라이언트 사본이 최신이면 True"""
+    if if_none_match:
+        return if_none_match.contains_weak(etag)
+    return bool(if_modified_since and modified and modified <= if_modified_since)
+
+
+def choose_encoding(accept_encodings) -> Optional[str]:
+    """Accept-Encoding(werkzeug MIMEAccept 계열) 중 사용할 압축 방식"""
+    offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return accept_encodings.best_match(offered)
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, quality=4)
+    return gzip.compress(data, compresslevel=COMPRESS_LEVEL)
+
+
+def conditional(*sources, daily=False):
+    """
+    sources 데이터가 바뀌지 않았으면 뷰를 실행하지 않고 304 반환 (flash 메시지가 남아 있으면 항상 새로 렌더링)
+    daily: 오늘 날짜로 계산하는 값(소진 예상일 등)이 있는 화면 - 날짜가 바뀌면 ETag도 바뀐다
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            from flask import make_response, request, session
+            from flask_login import current_user
+
+            if session.get('_flashes'):
+                return view(*args, **kwargs)
+
+            with repository.session() as db:
+                versions = load_versions(db)
+            cache.sync_all(versions)
+            etag = make_etag(versions, sources, current_user.get_id(), date.today() if daily else '')
+            modified = last_modified(versions, sources)
+
+            if not_modified(etag, modified, request.if_none_match, request.if_modified_since):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            if modified:
+                response.last_modified = modified
+            # 브라우저가 매번 재검증하도록 (사용자별 화면이므로 공유 캐시 금지)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
+
+
+def init_app(app):
+    """응답 압축 훅 등록 - 스트리밍(내보내기)/파일 응답과 작은 응답은 그대로 보낸다"""
+    from flask import request
+
+    @app.after_request
+    def _compress(response):
+        if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_TYPES):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding(request.accept_encodings)
+        data = response.get_data()
+        if not encoding or len(data) < COMPRESS_MIN_SIZE:
+            return response
+        response.set_data(compress(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+        return response
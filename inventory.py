@@ -1,12 +1,89 @@
-import sqlite3
+import json
+import math
 from datetime import datetime
-from typing import List, Dict, Optional, Tuple
-import database
+from typing import List, Dict, Iterator, Optional, Tuple
+import database_cloud as database
+import events
+import repository
+import search_index
+from cache import cached, create_cache
+from metrics import timed
+from stock_ledger import record_movements
+
+# 상품 목록/재고 요약/평균 마진/소진 예측 캐시 - 상품 쓰기와 판매 기록 시 무효화
+# 다른 프로세스의 쓰기는 조건부 요청이 inventory/forecasts 카운터 변화를 보고 비운다 (cache.TTLCache.sync)
+product_cache = create_cache('products', sources=('inventory', 'forecasts'))
+
+# 정렬 기준 -> ORDER BY 식 (키셋 페이지네이션에서는 id를 보조 키로 붙인다)
+PRODUCT_SORT_KEYS = {
+    'name': 'name',
+    'price': 'price',
+    'quantity': 'quantity',
+    'value': 'price * quantity'
+}
+
+# 옵션 가격이 부모 상품 가격과 다른 만큼의 재고 가치 차이 (가격을 따로 정한 옵션이 없으면 NULL)
+VARIANT_VALUE_ADJUSTMENT = '''
+    (SELECT SUM((v.price - products.price) * v.quantity) FROM product_variants v
+     WHERE v.product_id = products.id AND v.price IS NOT NULL)
+'''
+
+# 옵션(product_variants) 열 - 상품 행에 JSON 배열 한 열로 붙여 상품과 옵션을 한 번의 조회로 읽는다
+VARIANT_FIELDS = ['id', 'options', 'sku', 'quantity', 'price', 'margin_naver', 'margin_coupang', 'margin_self']
+# 옵션별로 따로 정할 수 있는 값 (NULL이면 부모 상품 값)
+VARIANT_OVERRIDE_FIELDS = ['price', 'margin_naver', 'margin_coupang', 'margin_self']
+
+# {variants}는 방언별 JSON 집계 (variants_column) - 옵션이 없는 상품(variant_count = 0)은 하위 조회를 건너뛴다
+PRODUCT_LIST_QUERY = f'''
+    SELECT id, name, options, price, margin_naver, margin_coupang, margin_self, quantity,
+           price * quantity as value, created_at, updated_at,
+           CASE WHEN variant_count > 0 THEN {VARIANT_VALUE_ADJUSTMENT} END as variant_value,
+           {{variants}} as variants
+    FROM products
+'''
+
+# 상품 쓰기 트리거가 유지하는 집계 행(inventory_totals)의 합계 - 상품 수와 무관하게 일정한 비용
+# 옵션 가격이 다른 만큼의 재고 가치 차이도 옵션/상품 트리거가 total_value에 반영한다 (마이그레이션 15)
+INVENTORY_TOTALS_QUERY = '''
+    SELECT SUM(product_count), CAST(SUM(total_quantity) AS BIGINT), SUM(total_value), SUM(price_sum)
+    FROM inventory_totals
+'''
+
+# 재고 많은 순 상품별 재고 (키셋 페이지 - idx_products_quantity_id 역방향 스캔)
+INVENTORY_DETAILS_QUERY = f'''
+    SELECT id, name, quantity,
+           price * quantity + COALESCE(CASE WHEN variant_count > 0 THEN {VARIANT_VALUE_ADJUSTMENT} END, 0) as value
+    FROM products
+'''
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# 인라인 편집기(bulk-update)에서 수정 가능한 필드
+BULK_UPDATE_FIELDS = ['price', 'margin_naver', 'margin_coupang', 'margin_self', 'quantity']
+
+
+def variants_column(db) -> str:
+    """상품 행의 옵션 목록 JSON 배열 식 (id 순) - PostgreSQL json_agg, SQLite json_group_array"""
+    pairs = ', '.join(f"'{field}', v.{field}" for field in VARIANT_FIELDS)
+    if db.dialect.is_postgres:
+        return (f"(SELECT json_agg(json_build_object({pairs}) ORDER BY v.id) "
+                f"FROM product_variants v WHERE v.product_id = products.id)")
+    return (f"(SELECT json_group_array(json_object({pairs})) "
+            f"FROM (SELECT * FROM product_variants WHERE product_id = products.id ORDER BY id) v)")
+
+def _variants_from_json(value) -> List[Dict]:
+    # psycopg2는 json을 파싱해서, SQLite/asyncpg는 문자열로 돌려준다
+    if isinstance(value, str):
+        return json.loads(value)
+    return value or []
+
+def product_list_query(db) -> str:
+    return PRODUCT_LIST_QUERY.format(variants=f"CASE WHEN variant_count > 0 THEN {variants_column(db)} END")
+
 
 class InventoryManager:
-    def __init__(self):
-        database.init_database()
-    
+    @timed
     def add_product(self, name: str, options: str, price: float, margin_naver: float, 
                    margin_coupang: float, margin_self: float, quantity: int = 0) -> int:
         if price < 0:
@@ -16,109 +93,169 @@ class InventoryManager:
         if quantity < 0:
             raise ValueError("Quantity must be non-negative")
         
-        conn = database.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO products (name, options, price, margin_naver, margin_coupang, margin_self, quantity)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (name, options, price, margin_naver, margin_coupang, margin_self, quantity))
-        
-        product_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        
+        with repository.session() as db:
+            product_id = db.insert('''
+                INSERT INTO products (name, options, price, margin_naver, margin_coupang, margin_self, quantity)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (name, options, price, margin_naver, margin_coupang, margin_self, quantity))
+            record_movements(db, [(product_id, 'receipt', quantity, None, '상품 등록')])
+            events.publish(db, [events.product_changed(product_id, {
+                'name': name, 'options': options, 'price': price, 'margin_naver': margin_naver,
+                'margin_coupang': margin_coupang, 'margin_self': margin_self, 'quantity': quantity
+            }, created=True)])
+            db.commit()
+        
+        product_cache.clear()
         return product_id
     
+    @timed
     def get_product(self, product_id: int) -> Optional[Dict]:
-        conn = database.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, name, options, price, margin_naver, margin_coupang, margin_self, quantity, 
-                   created_at, updated_at
-            FROM products
-            WHERE id = ?
-        ''', (product_id,))
-        
-        row = cursor.fetchone()
-        conn.close()
+        """상품 + 옵션 목록(variants)을 한 번의 조회로"""
+        with repository.session() as db:
+            row = db.fetchone(product_list_query(db) + " WHERE id = ?", (product_id,))
         
-        if row:
-            return {
-                'id': row[0],
-                'name': row[1],
-                'options': row[2],
-                'price': row[3],
-                'margin_naver': row[4],
-                'margin_coupang': row[5],
-                'margin_self': row[6],
-                'quantity': row[7],
-                'created_at': row[8],
-                'updated_at': row[9]
-            }
-        return None
+        return self._product_from_row(row) if row else None
     
+    @timed
+    @cached(product_cache)
     def get_all_products(self, search: str = "", sort_by: str = "name") -> List[Dict]:
-        conn = database.get_connection()
-        cursor = conn.cursor()
-        
-        valid_sort = {
-            'name': 'name',
-            'price': 'price',
-            'quantity': 'quantity',
-            'value': 'price * quantity'
-        }
+        with repository.session() as db:
+            query, params = self._all_products_query(db, search, sort_by)
+            rows = db.fetchall(query, params)
         
-        sort_column = valid_sort.get(sort_by, 'name')
-        
-        query = '''
-            SELECT id, name, options, price, margin_naver, margin_coupang, margin_self, quantity,
-                   price * quantity as value, created_at, updated_at
-            FROM products
-        '''
+        return [self._product_from_row(row) for row in rows]
+    
+    def _all_products_query(self, db, search: str, sort_by: str) -> Tuple[str, list]:
+        sort_column = PRODUCT_SORT_KEYS.get(sort_by, 'name')
         
+        query = product_list_query(db)
         params = []
         if search:
-            query += " WHERE name LIKE ?"
-            params.append(f'%{search}%')
+            condition, params = search_index.filter_clause(db, search)
+            query += f" WHERE {condition}"
         
         query += f" ORDER BY {sort_column}"
+        return query, params
+    
+    @timed
+    def get_products_page(self, search: str = "", sort_by: str = "name",
+                          limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None) -> Dict:
+        """
+        키셋(커서) 페이지네이션 상품 목록
+        (정렬 값, id) 순으로 정렬하고 이전 페이지 마지막 행 이후부터 limit개를 읽으므로
+        페이지 위치와 관계없이 조회 비용이 일정하다. next_cursor가 None이면 마지막 페이지.
+        """
+        if sort_by not in PRODUCT_SORT_KEYS:
+            sort_by = 'name'
+        limit = repository.page_size(limit, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
         
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
-        conn.close()
+        with repository.session() as db:
+            query, params = self._products_page_query(db, search, sort_by, limit, cursor)
+            rows = db.fetchall(query, params)
         
-        products = []
-        for row in rows:
-            products.append({
-                'id': row[0],
-                'name': row[1],
-                'options': row[2],
-                'price': row[3],
-                'margin_naver': row[4],
-                'margin_coupang': row[5],
-                'margin_self': row[6],
-                'quantity': row[7],
-                'value': row[8],
-                'created_at': row[9],
-                'updated_at': row[10]
-            })
+        return self._products_page(rows, sort_by, limit)
+    
+    def _products_page_query(self, db, search: str, sort_by: str, limit: int,
+                             cursor: Optional[str]) -> Tuple[str, list]:
+        sort_column = PRODUCT_SORT_KEYS[sort_by]
+        conditions = []
+        params = []
+        if search:
+            condition, search_params = search_index.filter_clause(db, search)
+            conditions.append(condition)
+            params.extend(search_params)
+        if cursor:
+            key, last_id = repository.decode_cursor(cursor, sort_by)
+            conditions.append(f"({sort_column}, id) > (?, ?)")
+            params.extend([key, last_id])
+        
+        query = product_list_query(db)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += f" ORDER BY {sort_column}, id LIMIT ?"
+        # 다음 페이지 존재 여부 확인용으로 한 행 더 읽는다
+        params.append(limit + 1)
+        return query, params
+    
+    def _products_page(self, rows, sort_by: str, limit: int) -> Dict:
+        items = [self._product_from_row(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = items[-1]
+            # value 정렬은 부모 가격 기준 식(price * quantity)이므로 옵션 가격을 반영하기 전 값으로 커서를 만든다
+            key = rows[limit - 1][8] if sort_by == 'value' else last[sort_by]
+            next_cursor = repository.encode_cursor(sort_by, key, last['id'])
         
-        return products
+        return {
+            'items': items,
+            'next_cursor': next_cursor
+        }
     
-    def update_product(self, product_id: int, **kwargs) -> bool:
-        allowed_fields = ['name', 'options', 'price', 'margin_naver', 'margin_coupang', 'margin_self', 'quantity']
+    @timed
+    @cached(product_cache)
+    def search_products(self, query: str, limit: int = 20) -> List[Dict]:
+        """
+        상품명 + 옵션 검색 (관련도 순)
+        상품명이 첫 검색어로 시작하는 상품을 먼저, 그다음 검색 인덱스 점수 순으로 정렬한다.
+        """
+        words = search_index.terms(query)
+        if not words:
+            return []
+        limit = repository.page_size(limit, 20, 100)
         
-        if 'price' in kwargs and kwargs['price'] < 0:
+        with repository.session() as db:
+            sql, params = self._search_query(db, query, limit)
+            rows = db.fetchall(sql, params)
+        
+        return [self._product_from_row(row) for row in rows]
+    
+    def _search_query(self, db, query: str, limit: int) -> Tuple[str, list]:
+        hits, params = search_index.hits_query(db, query)
+        first_word = search_index.terms(query)[0]
+        sql = (f"WITH hits AS ({hits}) "
+               + product_list_query(db)
+               + f" JOIN hits USING (id) ORDER BY (name {db.dialect.like} ? ESCAPE '\\') DESC, rank DESC, name, id LIMIT ?")
+        return sql, params + [search_index.prefix_pattern(first_word), limit]
+    
+    def iter_products(self) -> Iterator[Dict]:
+        """내보내기용 전체 상품 (id 순) - 서버 측 커서로 조금씩 읽는다"""
+        with repository.session() as db:
+            for row in db.stream(product_list_query(db) + " ORDER BY id"):
+                yield self._product_from_row(row)
+    
+    def _product_from_row(self, row) -> Dict:
+        return {
+            'id': row[0],
+            'name': row[1],
+            'options': row[2],
+            'price': row[3],
+            'margin_naver': row[4],
+            'margin_coupang': row[5],
+            'margin_self': row[6],
+            'quantity': row[7],
+            # 옵션 가격이 따로 있으면 그 가격으로 계산한 재고 가치
+            'value': row[8] + row[11] if row[11] is not None else row[8],
+            'created_at': row[9],
+            'updated_at': row[10],
+            'variants': _variants_from_json(row[12])
+        }
+    
+    def _validate_product_fields(self, fields: Dict):
+        if 'price' in fields and fields['price'] < 0:
             raise ValueError("Price must be non-negative")
         
         for margin in ['margin_naver', 'margin_coupang', 'margin_self']:
-            if margin in kwargs and not (0 <= kwargs[margin] <= 100):
+            if margin in fields and not (0 <= fields[margin] <= 100):
                 raise ValueError(f"{margin} must be between 0 and 100")
         
-        if 'quantity' in kwargs and kwargs['quantity'] < 0:
+        if 'quantity' in fields and fields['quantity'] < 0:
             raise ValueError("Quantity must be non-negative")
+    
+    @timed
+    def update_product(self, product_id: int, **kwargs) -> bool:
+        allowed_fields = ['name', 'options', 'price', 'margin_naver', 'margin_coupang', 'margin_self', 'quantity']
+        
+        self._validate_product_fields(kwargs)
         
         fields_to_update = []
         values = []
@@ -134,121 +271,426 @@ class InventoryManager:
         fields_to_update.append("updated_at = CURRENT_TIMESTAMP")
         values.append(product_id)
         
-        conn = database.get_connection()
-        cursor = conn.cursor()
-        
         query = f"UPDATE products SET {', '.join(fields_to_update)} WHERE id = ?"
-        cursor.execute(query, values)
-        
-        success = cursor.rowcount > 0
-        conn.commit()
-        conn.close()
         
+        def update(db):
+            if 'quantity' in kwargs:
+                # 이전 수량과의 차이를 원장에 남기도록 행을 잠그고 읽는다
+                locked = db.lock_rows('products', [product_id], ['quantity', 'variant_count']).get(product_id)
+                if not locked:
+                    return False
+                if locked[1]:
+                    raise ValueError("Quantity of a product with variants is managed per variant")
+            
+            db.execute(query, values)
+            
+            success = db.rowcount > 0
+            if success and 'quantity' in kwargs:
+                record_movements(db, [(product_id, 'adjust', kwargs['quantity'] - locked[0], None, '상품 수정')])
+            if success and ('name' in kwargs or 'options' in kwargs):
+                # 판매 분석 결과에 상품명이 들어가므로 분석 캐시 무효화
+                repository.bump_data_version(db, 'products')
+            if success:
+                events.publish(db, [events.product_changed(
+                    product_id, {field: kwargs[field] for field in allowed_fields if field in kwargs})])
+            return success
+        
+        success = repository.run_in_transaction(update)
+        product_cache.clear()
         return success
     
+    @timed
     def delete_product(self, product_id: int) -> bool:
-        conn = database.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("DELETE FROM products WHERE id = ?", (product_id,))
-        
-        success = cursor.rowcount > 0
-        conn.commit()
-        conn.close()
-        
+        def delete(db):
+            locked = db.lock_rows('products', [product_id], ['quantity']).get(product_id)
+            if not locked:
+                return False
+            # delete_variant와 같은 규칙 - 판매 수정/삭제가 재고를 되돌릴 옵션이 남아 있어야 한다
+            if db.fetchone('''
+                SELECT 1 FROM sales s JOIN product_variants v ON v.id = s.variant_id
+                WHERE v.product_id = ? LIMIT 1
+            ''', (product_id,)):
+                raise ValueError("Product has variants with sales records; set their quantity to 0 instead")
+            
+            # SQLite는 외래 키 CASCADE를 강제하지 않으므로 옵션을 직접 삭제
+            db.execute("DELETE FROM product_variants WHERE product_id = ?", (product_id,))
+            db.execute("DELETE FROM products WHERE id = ?", (product_id,))
+            # 삭제된 상품의 원장 합계도 0이 되도록 남은 재고를 차감
+            record_movements(db, [(product_id, 'adjust', -locked[0], None, '상품 삭제')])
+            events.publish(db, [events.product_deleted(product_id)])
+            return True
+        
+        success = repository.run_in_transaction(delete)
+        product_cache.clear()
+        return success
+    
+    @timed
+    def receive_stock(self, product_id: int, quantity: int, note: Optional[str] = None,
+                      variant_id: Optional[int] = None) -> bool:
+        """
+        입고 - 재고를 quantity만큼 늘리고 원장에 receipt로 기록 (상품이 없으면 False)
+        옵션이 있는 상품은 variant_id로 입고할 옵션을 지정해야 한다.
+        """
+        if quantity <= 0:
+            raise ValueError("Quantity must be positive")
+        
+        def receive(db):
+            product = db.lock_rows('products', [product_id], ['quantity', 'variant_count']).get(product_id)
+            if not product:
+                return False
+            
+            changed = []
+            if variant_id is not None or product[1]:
+                variant_quantity = self._add_variant_stock(db, product_id, variant_id, quantity)
+                changed.append(events.variant_changed(variant_id, product_id, {'quantity': variant_quantity}))
+            
+            db.execute('''
+                UPDATE products SET quantity = quantity + ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (quantity, product_id))
+            record_movements(db, [(product_id, 'receipt', quantity, None, note)])
+            events.publish(db, [events.product_changed(product_id, {'quantity': product[0] + quantity})] + changed)
+            return True
+        
+        success = repository.run_in_transaction(receive)
+        if success:
+            product_cache.clear()
+        return success
+    
+    @timed
+    def add_variant(self, product_id: int, options: str, quantity: int = 0, sku: Optional[str] = None,
+                    price: Optional[float] = None, margin_naver: Optional[float] = None,
+                    margin_coupang: Optional[float] = None, margin_self: Optional[float] = None) -> Optional[int]:
+        """
+        상품에 옵션(SKU) 추가 후 옵션 id 반환 (상품이 없으면 None)
+        가격/마진을 주지 않으면 부모 상품 값으로 판매한다. 옵션이 있는 상품의 재고는 옵션 재고의 합계이므로
+        옵션이 없던 상품에 첫 옵션을 추가하면 상품의 기존 재고와 판매 기록은 그 옵션의 것으로 옮겨진다
+        (판매 수정/삭제가 되돌린 재고가 옵션 재고 합계에서 벗어나지 않도록).
+        """
+        options = self._variant_options(options)
+        sku = (sku or '').strip() or None
+        values = {'price': price, 'margin_naver': margin_naver, 'margin_coupang': margin_coupang, 'margin_self': margin_self}
+        overrides = {field: value for field, value in values.items() if value is not None}
+        self._validate_product_fields(dict(overrides, quantity=quantity))
+        
+        def add(db):
+            product = db.lock_rows('products', [product_id], ['quantity', 'variant_count']).get(product_id)
+            if not product:
+                return None
+            current_quantity, variant_count = product
+            self._check_variant_unique(db, product_id, options, sku)
+            
+            stock = quantity + (current_quantity if variant_count == 0 else 0)
+            columns = ['product_id', 'options', 'sku', 'quantity'] + list(overrides)
+            variant_id = db.insert(f'''
+                INSERT INTO product_variants ({', '.join(columns)})
+                VALUES ({', '.join('?' for _ in columns)})
+            ''', [product_id, options, sku, stock] + list(overrides.values()))
+            db.execute('''
+                UPDATE products SET quantity = quantity + ?, variant_count = variant_count + 1,
+                       updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (quantity, product_id))
+            if variant_count == 0:
+                db.execute('UPDATE sales SET variant_id = ? WHERE product_id = ? AND variant_id IS NULL',
+                           (variant_id, product_id))
+            record_movements(db, [(product_id, 'receipt', quantity, None, f'옵션 추가: {options}')])
+            events.publish(db, [
+                events.product_changed(product_id, {'quantity': current_quantity + quantity}),
+                events.variant_changed(variant_id, product_id,
+                                       dict(overrides, options=options, sku=sku, quantity=stock), created=True)
+            ])
+            return variant_id
+        
+        variant_id = repository.run_in_transaction(add)
+        product_cache.clear()
+        return variant_id
+    
+    @timed
+    def update_variant(self, variant_id: int, **kwargs) -> bool:
+        """
+        옵션 수정 (options, sku, quantity, price, margin_naver, margin_coupang, margin_self)
+        가격/마진에 None을 주면 부모 상품 값으로 되돌린다. 수량을 바꾸면 부모 상품 재고도 같은 만큼 바뀐다.
+        """
+        allowed_fields = ['options', 'sku', 'quantity'] + VARIANT_OVERRIDE_FIELDS
+        fields = {field: kwargs[field] for field in allowed_fields if field in kwargs}
+        if not fields:
+            return False
+        if 'options' in fields:
+            fields['options'] = self._variant_options(fields['options'])
+        if 'sku' in fields:
+            fields['sku'] = (fields['sku'] or '').strip() or None
+        if 'quantity' in fields and fields['quantity'] is None:
+            raise ValueError("Quantity must be non-negative")
+        self._validate_product_fields({field: value for field, value in fields.items() if value is not None})
+        
+        def update(db):
+            row = db.fetchone('SELECT product_id FROM product_variants WHERE id = ?', (variant_id,))
+            if not row:
+                return False
+            product_id = row[0]
+            # 상품 -> 옵션 순으로 잠근다 (판매 기록과 같은 순서)
+            product = db.lock_rows('products', [product_id], ['quantity']).get(product_id)
+            variant = db.lock_rows('product_variants', [variant_id], ['quantity']).get(variant_id)
+            if not product or not variant:
+                return False
+            if fields.get('options') or fields.get('sku'):
+                self._check_variant_unique(db, product_id, fields.get('options'), fields.get('sku'), exclude_id=variant_id)
+            
+            assignments = ', '.join(f"{field} = ?" for field in fields)
+            db.execute(f"UPDATE product_variants SET {assignments}, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                       list(fields.values()) + [variant_id])
+            # 가격만 바뀌어도 부모 상품 행을 갱신해 재고 가치 캐시/변경 카운터(ETag)가 옵션 변경을 반영하도록 한다
+            change = fields['quantity'] - variant[0] if 'quantity' in fields else 0
+            db.execute('UPDATE products SET quantity = quantity + ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+                       (change, product_id))
+            record_movements(db, [(product_id, 'adjust', change, None, '옵션 수정')])
+            events.publish(db, [
+                events.product_changed(product_id, {'quantity': product[0] + change}),
+                events.variant_changed(variant_id, product_id, fields)
+            ])
+            return True
+        
+        success = repository.run_in_transaction(update)
+        product_cache.clear()
+        return success
+    
+    @timed
+    def delete_variant(self, variant_id: int) -> bool:
+        """옵션 삭제 - 남은 재고만큼 부모 상품 재고도 줄어든다. 판매 기록이 있는 옵션은 삭제하지 않는다 (수량을 0으로)"""
+        def delete(db):
+            row = db.fetchone('SELECT product_id FROM product_variants WHERE id = ?', (variant_id,))
+            if not row:
+                return False
+            product_id = row[0]
+            product = db.lock_rows('products', [product_id], ['quantity']).get(product_id)
+            variant = db.lock_rows('product_variants', [variant_id], ['quantity']).get(variant_id)
+            if not product or not variant:
+                return False
+            # 판매 수정/삭제가 재고를 되돌릴 옵션이 남아 있어야 한다
+            if db.fetchone('SELECT 1 FROM sales WHERE variant_id = ? LIMIT 1', (variant_id,)):
+                raise ValueError("Variant has sales records; set its quantity to 0 instead")
+            
+            db.execute('DELETE FROM product_variants WHERE id = ?', (variant_id,))
+            db.execute('''
+                UPDATE products SET quantity = quantity - ?, variant_count = variant_count - 1,
+                       updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (variant[0], product_id))
+            record_movements(db, [(product_id, 'adjust', -variant[0], None, '옵션 삭제')])
+            events.publish(db, [
+                events.product_changed(product_id, {'quantity': product[0] - variant[0]}),
+                events.variant_deleted(variant_id, product_id)
+            ])
+            return True
+        
+        success = repository.run_in_transaction(delete)
+        product_cache.clear()
         return success
     
+    def _variant_options(self, options) -> str:
+        options = (options or '').strip()
+        if not options:
+            raise ValueError("Variant options are required")
+        if len(options) > 200:
+            raise ValueError("Variant options must be at most 200 characters")
+        return options
+    
+    def _check_variant_unique(self, db, product_id: int, options: Optional[str] = None, sku: Optional[str] = None,
+                              exclude_id: int = 0):
+        """같은 상품 안의 옵션명 / 전체 SKU 중복 확인 - 상품 행을 잠근 트랜잭션 안에서 호출"""
+        if options and db.fetchone('SELECT 1 FROM product_variants WHERE product_id = ? AND options = ? AND id <> ?',
+                                   (product_id, options, exclude_id)):
+            raise ValueError(f"Variant already exists: {options}")
+        if sku and db.fetchone('SELECT 1 FROM product_variants WHERE sku = ? AND id <> ?', (sku, exclude_id)):
+            raise ValueError(f"SKU already in use: {sku}")
+    
+    def _add_variant_stock(self, db, product_id: int, variant_id: Optional[int], quantity: int) -> int:
+        """옵션 재고를 quantity만큼 늘리고 새 옵션 재고 반환 - 상품 행을 잠근 트랜잭션 안에서 호출"""
+        if variant_id is None:
+            raise ValueError("variant_id is required for a product with variants")
+        db.execute('''
+            UPDATE product_variants SET quantity = quantity + ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND product_id = ?
+        ''', (quantity, variant_id, product_id))
+        if db.rowcount == 0:
+            raise ValueError("Variant not found")
+        return db.fetchone('SELECT quantity FROM product_variants WHERE id = ?', (variant_id,))[0]
+    
+    @timed
     def bulk_update_products(self, updates: List[Dict]) -> Dict:
         """
         여러 상품을 한 번에 업데이트
         updates: [{'id': 1, 'price': 10000, 'quantity': 50, ...}, ...]
-        """
-        conn = database.get_connection()
-        cursor = conn.cursor()
         
-        success_count = 0
-        errors = []
+        전체 배치를 update_product와 같은 규칙으로 먼저 검증한 뒤, 유효한 행만
+        바뀐 필드 조합별로 한 문장씩 하나의 트랜잭션에서 적용한다.
+        results에 행별 처리 결과(updated / not_found / invalid / skipped)를 담아 반환한다.
+        """
+        results = []
+        valid = []  # (results 인덱스, product_id, {field: value})
         
         for update in updates:
+            product_id = update.get('id')
+            fields = {field: update[field] for field in BULK_UPDATE_FIELDS if field in update}
+            
+            if not product_id or not fields:
+                results.append({'id': product_id, 'status': 'skipped'})
+                continue
+            
             try:
-                product_id = update.get('id')
-                if not product_id:
-                    continue
-                
-                # 업데이트할 필드만 추출
-                fields_to_update = []
-                values = []
+                product_id = int(product_id)
+                for field, value in fields.items():
+                    try:
+                        fields[field] = float(value)
+                    except (TypeError, ValueError):
+                        raise ValueError(f"{field} must be a number")
+                    if not math.isfinite(fields[field]):
+                        raise ValueError(f"{field} must be a number")
+                if 'quantity' in fields:
+                    if not fields['quantity'].is_integer():
+                        raise ValueError("Quantity must be an integer")
+                    fields['quantity'] = int(fields['quantity'])
+                self._validate_product_fields(fields)
+            except (TypeError, ValueError) as e:
+                results.append({'id': product_id, 'status': 'invalid', 'error': str(e)})
+                continue
+            
+            results.append({'id': product_id, 'status': 'updated'})
+            valid.append((len(results) - 1, product_id, fields))
+        
+        if valid:
+            with repository.session() as db:
+                # 수량을 바꾸는 행은 이전 수량과의 차이를 원장에 남기도록 잠그고 읽는다
+                quantity_ids = {product_id for _, product_id, fields in valid if 'quantity' in fields}
+                locked = db.lock_rows('products', quantity_ids, ['quantity', 'variant_count'])
+                current = {product_id: row[0] for product_id, row in locked.items()}
+                existing = set(current) | db.existing_ids(
+                    'products', {product_id for _, product_id, _ in valid} - quantity_ids)
                 
-                for field in ['price', 'margin_naver', 'margin_coupang', 'margin_self', 'quantity']:
-                    if field in update:
-                        fields_to_update.append(f"{field} = ?")
-                        values.append(update[field])
+                # 바뀐 필드 조합이 같은 행끼리 묶어서 한 문장으로 갱신
+                groups = {}
+                movements = []
+                for index, product_id, fields in valid:
+                    if product_id not in existing:
+                        results[index] = {'id': product_id, 'status': 'not_found'}
+                        continue
+                    if 'quantity' in fields and locked[product_id][1]:
+                        results[index] = {'id': product_id, 'status': 'invalid',
+                                          'error': 'Quantity of a product with variants is managed per variant'}
+                        continue
+                    columns = tuple(field for field in BULK_UPDATE_FIELDS if field in fields)
+                    groups.setdefault(columns, []).append((product_id,) + tuple(fields[c] for c in columns))
+                    if 'quantity' in fields:
+                        movements.append((product_id, 'adjust', fields['quantity'] - current[product_id], None, '일괄 수정'))
+                        current[product_id] = fields['quantity']
                 
-                if not fields_to_update:
-                    continue
+                for columns, rows in groups.items():
+                    db.update_many('products', 'id', columns, rows, set_extra="updated_at = CURRENT_TIMESTAMP")
                 
-                # 업데이트 실행
-                fields_to_update.append("updated_at = CURRENT_TIMESTAMP")
-                values.append(product_id)
-                
-                query = f"UPDATE products SET {', '.join(fields_to_update)} WHERE id = ?"
-                cursor.execute(query, values)
-                success_count += 1
-                
-            except Exception as e:
-                errors.append({'id': product_id, 'error': str(e)})
-        
-        conn.commit()
-        conn.close()
+                record_movements(db, movements)
+                events.publish(db, [events.product_changed(product_id, fields)
+                                    for index, product_id, fields in valid if results[index]['status'] == 'updated'])
+                db.commit()
+            
+            product_cache.clear()
+        
+        errors = [
+            {'id': result['id'], 'error': result.get('error', 'Product not found')}
+            for result in results if result['status'] in ('invalid', 'not_found')
+        ]
         
         return {
-            'success_count': success_count,
-            'errors': errors
+            'success_count': sum(1 for result in results if result['status'] == 'updated'),
+            'errors': errors,
+            'results': results
         }
     
+    @timed
+    @cached(product_cache)
     def get_inventory_summary(self) -> Dict:
-        conn = database.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT 
-                COUNT(*) as total_products,
-                SUM(quantity) as total_quantity,
-                SUM(price * quantity) as total_value,
-                AVG(price) as avg_price
-            FROM products
-        ''')
-        
-        row = cursor.fetchone()
-        
-        cursor.execute('''
-            SELECT name, quantity, price * quantity as value,
-                   ROUND(100.0 * quantity / NULLIF((SELECT SUM(quantity) FROM products), 0), 2) as quantity_ratio
-            FROM products
-            ORDER BY quantity DESC
-        ''')
-        
-        product_details = []
-        for product_row in cursor.fetchall():
-            product_details.append({
-                'name': product_row[0],
-                'quantity': product_row[1],
-                'value': product_row[2],
-                'quantity_ratio': product_row[3] or 0
-            })
-        
-        conn.close()
+        """상품 수, 총 재고 수량/가치, 평균 가격 - 상품별 목록은 get_inventory_details_page"""
+        with repository.session() as db:
+            row = db.fetchone(INVENTORY_TOTALS_QUERY)
         
+        return self._inventory_summary(row)
+    
+    def _inventory_summary(self, row) -> Dict:
+        total_products = row[0] or 0
         return {
-            'total_products': row[0] or 0,
+            'total_products': total_products,
             'total_quantity': row[1] or 0,
             'total_value': row[2] or 0,
-            'avg_price': round(row[3], 2) if row[3] else 0,
-            'product_details': product_details
+            'avg_price': round(row[3] / total_products, 2) if total_products else 0
+        }
+    
+    @timed
+    def get_inventory_details_page(self, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None) -> Dict:
+        """
+        재고 많은 순 상품별 재고/재고 가치/재고 비중 - 키셋 페이지 {'items', 'next_cursor'}
+        """
+        limit = repository.page_size(limit, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+        query, params = self._inventory_details_query(limit, cursor)
+        total_quantity = self.get_inventory_summary()['total_quantity']
+        
+        with repository.session() as db:
+            rows = db.fetchall(query, params)
+        
+        return self._inventory_details_page(rows, total_quantity, limit)
+    
+    def _inventory_details_query(self, limit: int, cursor: Optional[str]) -> Tuple[str, list]:
+        query = INVENTORY_DETAILS_QUERY
+        params = []
+        if cursor:
+            last_quantity, last_id = repository.decode_cursor(cursor, '-quantity')
+            query += " WHERE (quantity, id) < (?, ?)"
+            params.extend([last_quantity, last_id])
+        query += " ORDER BY quantity DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+        return query, params
+    
+    def _inventory_details_page(self, rows, total_quantity, limit: int) -> Dict:
+        items = []
+        for row in rows[:limit]:
+            items.append({
+                'id': row[0],
+                'name': row[1],
+                'quantity': row[2],
+                'value': row[3],
+                'quantity_ratio': round(100.0 * row[2] / float(total_quantity), 2) if total_quantity else 0
+            })
+        
+        next_cursor = None
+        if len(rows) > limit:
+            last = items[-1]
+            next_cursor = repository.encode_cursor('-quantity', last['quantity'], last['id'])
+        
+        return {
+            'items': items,
+            'next_cursor': next_cursor
+        }
+    
+    @timed
+    @cached(product_cache)
+    def get_average_margins(self) -> Dict:
+        """플랫폼별 평균 마진율 (0 제외)"""
+        with repository.session() as db:
+            # 각 플랫폼별로 0이 아닌 마진율만 계산
+            avg_margins = db.fetchone('''
+                SELECT 
+                    (SELECT AVG(margin_naver) FROM products WHERE margin_naver > 0) as avg_margin_naver,
+                    (SELECT AVG(margin_coupang) FROM products WHERE margin_coupang > 0) as avg_margin_coupang,
+                    (SELECT AVG(margin_self) FROM products WHERE margin_self > 0) as avg_margin_self
+            ''')
+        
+        return {
+            'naver': round(avg_margins[0], 1) if avg_margins and avg_margins[0] else 0,
+            'coupang': round(avg_margins[1], 1) if avg_margins and avg_margins[1] else 0,
+            'self': round(avg_margins[2], 1) if avg_margins and avg_margins[2] else 0
         }
-
 
 if __name__ == "__main__":
+    database.init_database()
     manager = InventoryManager()
     
     print("Testing InventoryManager...")
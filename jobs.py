@@ -0,0 +1,323 @@
+"""백그라운드 작업 큐
+
+오래 걸리는 일(판매 분석 리포트, 일괄 수정/판매 가져오기, 예측·스냅샷 재계산)을 요청 안에서 바로 실행하지 않고
+jobs 테이블에 넣으면, 별도 워커 프로세스가 스레드 풀로 꺼내 실행한다. 웹 요청은 작업 id만 받아 바로 끝나고
+GET /api/jobs/<id>로 상태와 결과를 확인한다.
+
+    python manage.py worker             # 계속 실행 (JOB_WORKER_THREADS개 동시 실행)
+    python manage.py worker --burst     # 대기 중인 작업이 없으면 종료 (cron 등)
+
+상태: queued -> running -> succeeded | failed
+- 처리기가 ValueError를 내면 입력 오류로 보고 바로 failed, 그 밖의 예외는 지수 백오프 후 max_attempts까지 재시도
+- 워커가 작업 도중 죽으면 JOB_TIMEOUT_SECONDS 뒤 다른 워커가 다시 대기열에 넣는다.
+  다시 실행하면 결과가 중복되는 작업(판매 가져오기)은 재실행하지 않고 failed로 남긴다.
+
+JOBS_ENABLED=true(워커를 띄운 배포)이면 /reports와 큰 일괄 요청이 자동으로 큐를 거치고,
+그렇지 않으면 ?async=1을 붙인 요청만 큐에 넣는다.
+"""
+import json
+import os
+import signal
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional
+import repository
+from metrics import timed
+
+JOBS_ENABLED = os.getenv('JOBS_ENABLED', 'false').lower() == 'true'
+# JOBS_ENABLED일 때 이보다 많은 행의 일괄 요청은 큐로 보낸다
+JOBS_INLINE_MAX_ROWS = int(os.getenv('JOBS_INLINE_MAX_ROWS', '500'))
+JOB_WORKER_THREADS = int(os.getenv('JOB_WORKER_THREADS', '2'))
+JOB_POLL_SECONDS = float(os.getenv('JOB_POLL_SECONDS', '1'))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+JOB_RETRY_SECONDS = float(os.getenv('JOB_RETRY_SECONDS', '10'))
+JOB_TIMEOUT_SECONDS = float(os.getenv('JOB_TIMEOUT_SECONDS', '1800'))
+JOB_RETENTION_DAYS = int(os.getenv('JOB_RETENTION_DAYS', '7'))
+
+# 워커가 멈춘 작업 회수 / 오래된 작업 삭제를 확인하는 간격
+MAINTENANCE_SECONDS = 60
+
+STATUSES = ('queued', 'running', 'succeeded', 'failed')
+JOB_COLUMNS = 'id, kind, status, attempts, max_attempts, created_by, result, error, created_at, started_at, finished_at'
+
+
+class Handler:
+    def __init__(self, fn: Callable[[Dict], object], idempotent: bool):
+        self.fn = fn
+        # 다시 실행해도 결과가 같은지 - 워커가 도중에 죽은 작업을 다시 대기열에 넣어도 되는지
+        self.idempotent = idempotent
+
+HANDLERS: Dict[str, Handler] = {}
+
+def handler(kind: str, idempotent: bool = True):
+    """작업 처리기 등록 - 함수는 payload(dict)를 받아 JSON으로 저장할 결과를 반환한다"""
+    def register(fn):
+        HANDLERS[kind] = Handler(fn, idempotent)
+        return fn
+    return register
+
+
+@handler('sales_report')
+def _sales_report(payload):
+    import analytics
+    return analytics.SalesAnalytics().get_sales_report(payload['start_date'], payload['end_date'])
+
+@handler('bulk_update_products')
+def _bulk_update_products(payload):
+    import inventory
+    return inventory.InventoryManager().bulk_update_products(payload['updates'])
+
+@handler('import_sales', idempotent=False)
+def _import_sales(payload):
+    import sales
+    return sales.SalesManager().record_sales_bulk(payload['lines'])
+
+@handler('forecast')
+def _forecast(payload):
+    import forecast
+    as_of = payload.get('as_of')
+    return forecast.ForecastManager().run_forecast(date.fromisoformat(as_of) if as_of else None)
+
+@handler('snapshot_stock')
+def _snapshot_stock(payload):
+    import stock_ledger
+    cutoff = payload.get('cutoff')
+    return stock_ledger.StockLedger().snapshot_stock(datetime.fromisoformat(cutoff) if cutoff else None)
+
+
+def _timestamp(value: datetime) -> str:
+    return value.isoformat(sep=' ', timespec='seconds')
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+def _job_from_row(row) -> Dict:
+    return {
+        'id': row[0],
+        'kind': row[1],
+        'status': row[2],
+        'attempts': row[3],
+        'max_attempts': row[4],
+        'created_by': row[5],
+        'result': json.loads(row[6]) if row[6] is not None else None,
+        'error': row[7],
+        'created_at': str(row[8])[:19],
+        'started_at': str(row[9])[:19] if row[9] else None,
+        'finished_at': str(row[10])[:19] if row[10] else None
+    }
+
+
+class JobQueue:
+    @timed
+    def enqueue(self, kind: str, payload: Dict, created_by: Optional[int] = None,
+                dedupe_key: Optional[str] = None, max_attempts: int = JOB_MAX_ATTEMPTS) -> int:
+        """
+        작업을 대기열에 추가하고 id 반환
+        dedupe_key가 같은 작업이 대기/실행 중이거나 이미 성공했으면 새로 넣지 않고 그 작업 id를 반환한다.
+        """
+        if kind not in HANDLERS:
+            raise ValueError(f"Unknown job type: {kind}")
+        with repository.session() as db:
+            if dedupe_key:
+                existing = self._active_job_id(db, dedupe_key)
+                if existing:
+                    return existing
+            now = _timestamp(datetime.now())
+            # 같은 dedupe_key로 동시에 들어온 요청은 유일 인덱스(idx_jobs_dedupe_active)가 하나만 받는다
+            job_id = db.insert('''
+                INSERT INTO jobs (kind, payload, max_attempts, dedupe_key, created_by, run_after, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (dedupe_key) WHERE status <> 'failed' DO NOTHING
+            ''', (kind, _dumps(payload), max_attempts, dedupe_key, created_by, now, now))
+            if job_id is None:
+                job_id = self._active_job_id(db, dedupe_key)
+            db.commit()
+        return job_id
+
+    def _active_job_id(self, db, dedupe_key: str) -> Optional[int]:
+        """dedupe_key가 같은 대기/실행 중이거나 성공한 작업 id"""
+        row = db.fetchone("SELECT id FROM jobs WHERE dedupe_key = ? AND status <> 'failed'", (dedupe_key,))
+        return row[0] if row else None
+
+    @timed
+    def get_job(self, job_id: int) -> Optional[Dict]:
+        with repository.session() as db:
+            row = db.fetchone(f'SELECT {JOB_COLUMNS} FROM jobs WHERE id = ?', (job_id,))
+        return _job_from_row(row) if row else None
+
+    def claim(self, worker_id: str) -> Optional[Dict]:
+        """실행할 수 있는 가장 오래된 작업 하나를 running으로 바꾸고 {id, kind, payload, attempts, max_attempts} 반환"""
+        now = _timestamp(datetime.now())
+        query = '''
+            SELECT id, kind, payload, attempts, max_attempts FROM jobs
+            WHERE status = 'queued' AND run_after <= ?
+            ORDER BY id
+            LIMIT 1
+        '''
+        with repository.session() as db:
+            if db.dialect.is_postgres:
+                # 다른 워커가 잡고 있는 행은 건너뛰어 워커끼리 서로 기다리지 않는다
+                row = db.fetchone(query + ' FOR UPDATE SKIP LOCKED', (now,))
+            else:
+                db.execute('BEGIN IMMEDIATE')
+                row = db.fetchone(query, (now,))
+            if not row:
+                db.rollback()
+                return None
+            db.execute('''
+                UPDATE jobs SET status = 'running', attempts = attempts + 1, locked_by = ?, started_at = ?
+                WHERE id = ?
+            ''', (worker_id, now, row[0]))
+            db.commit()
+        return {
+            'id': row[0],
+            'kind': row[1],
+            'payload': json.loads(row[2]),
+            'attempts': row[3] + 1,
+            'max_attempts': row[4],
+            'worker_id': worker_id
+        }
+
+    def complete(self, job: Dict, result):
+        with repository.session() as db:
+            db.execute('''
+                UPDATE jobs SET status = 'succeeded', result = ?, error = NULL, finished_at = ?
+                WHERE id = ? AND status = 'running' AND locked_by = ?
+            ''', (_dumps(result), _timestamp(datetime.now()), job['id'], job['worker_id']))
+            db.commit()
+
+    def fail(self, job: Dict, error: str, retry: bool = True):
+        """실패 기록 - retry이고 시도 횟수가 남았으면 JOB_RETRY_SECONDS * 2^(시도-1) 뒤에 다시 실행"""
+        now = datetime.now()
+        with repository.session() as db:
+            if retry and job['attempts'] < job['max_attempts']:
+                run_after = now + timedelta(seconds=JOB_RETRY_SECONDS * 2 ** (job['attempts'] - 1))
+                db.execute('''
+                    UPDATE jobs SET status = 'queued', error = ?, locked_by = NULL, run_after = ?
+                    WHERE id = ? AND status = 'running' AND locked_by = ?
+                ''', (error, _timestamp(run_after), job['id'], job['worker_id']))
+            else:
+                db.execute('''
+                    UPDATE jobs SET status = 'failed', error = ?, finished_at = ?
+                    WHERE id = ? AND status = 'running' AND locked_by = ?
+                ''', (error, _timestamp(now), job['id'], job['worker_id']))
+            db.commit()
+
+    def recover_stale(self) -> int:
+        """JOB_TIMEOUT_SECONDS 넘게 running인 작업(워커가 죽음) 정리 - 다시 실행해도 되면 대기열로, 아니면 failed"""
+        now = datetime.now()
+        cutoff = _timestamp(now - timedelta(seconds=JOB_TIMEOUT_SECONDS))
+        with repository.session() as db:
+            rows = db.fetchall('''
+                SELECT id, kind, attempts, max_attempts FROM jobs
+                WHERE status = 'running' AND started_at < ?
+            ''', (cutoff,))
+            for job_id, kind, attempts, max_attempts in rows:
+                registered = HANDLERS.get(kind)
+                if registered and registered.idempotent and attempts < max_attempts:
+                    db.execute('''
+                        UPDATE jobs SET status = 'queued', locked_by = NULL, run_after = ?, error = ?
+                        WHERE id = ? AND status = 'running'
+                    ''', (_timestamp(now), 'Worker stopped before the job finished; retrying', job_id))
+                else:
+                    db.execute('''
+                        UPDATE jobs SET status = 'failed', finished_at = ?, error = ?
+                        WHERE id = ? AND status = 'running'
+                    ''', (_timestamp(now), 'Worker stopped before the job finished', job_id))
+            db.commit()
+        return len(rows)
+
+    def purge(self, days: int = JOB_RETENTION_DAYS) -> int:
+        """days일 지난 완료(succeeded/failed) 작업 삭제"""
+        with repository.session() as db:
+            db.execute('''
+                DELETE FROM jobs
+                WHERE status IN ('succeeded', 'failed') AND finished_at < ?
+            ''', (_timestamp(datetime.now() - timedelta(days=days)),))
+            deleted = db.rowcount
+            db.commit()
+        return deleted
+
+    def counts(self) -> Dict[str, int]:
+        """상태별 작업 수"""
+        with repository.session() as db:
+            rows = db.fetchall('SELECT status, COUNT(*) FROM jobs GROUP BY status')
+        return dict({status: 0 for status in STATUSES}, **{row[0]: row[1] for row in rows})
+
+
+class Worker:
+    """대기열에서 작업을 꺼내 스레드 풀로 실행 - SIGTERM/SIGINT를 받으면 실행 중인 작업을 마치고 종료"""
+
+    def __init__(self, queue: Optional[JobQueue] = None, threads: int = JOB_WORKER_THREADS,
+                 poll_interval: float = JOB_POLL_SECONDS):
+        self.queue = queue or JobQueue()
+        self.threads = max(1, threads)
+        self.poll_interval = poll_interval
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = threading.Event()
+
+    def stop(self, *_):
+        self.stopping.set()
+
+    def run_job(self, job: Dict):
+        registered = HANDLERS.get(job['kind'])
+        if registered is None:
+            self.queue.fail(job, f"Unknown job type: {job['kind']}", retry=False)
+            return
+        started = time.perf_counter()
+        try:
+            result = registered.fn(job['payload'])
+        except ValueError as e:
+            # 입력 오류 - 다시 실행해도 같으므로 재시도하지 않는다
+            self.queue.fail(job, str(e), retry=False)
+            print(f"❌ Job {job['id']} ({job['kind']}) failed: {e}")
+        except Exception as e:
+            traceback.print_exc()
+            self.queue.fail(job, f'{type(e).__name__}: {e}')
+            print(f"⚠️ Job {job['id']} ({job['kind']}) attempt {job['attempts']}/{job['max_attempts']} failed: {e}")
+        else:
+            self.queue.complete(job, result)
+            print(f"✅ Job {job['id']} ({job['kind']}) done in {time.perf_counter() - started:.2f}s")
+
+    def run(self, burst: bool = False) -> int:
+        """작업 실행 루프 - burst이면 대기 중인 작업이 없어질 때 종료, 실행한 작업 수 반환"""
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self.stop)
+            signal.signal(signal.SIGINT, self.stop)
+        print(f"Job worker {self.worker_id} started ({self.threads} thread(s))")
+
+        processed = 0
+        running: List = []
+        next_maintenance = 0.0
+        with ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='job') as executor:
+            while not self.stopping.is_set():
+                if time.monotonic() >= next_maintenance:
+                    recovered = self.queue.recover_stale()
+                    if recovered:
+                        print(f"Recovered {recovered} stalled job(s)")
+                    self.queue.purge()
+                    next_maintenance = time.monotonic() + MAINTENANCE_SECONDS
+
+                running = [future for future in running if not future.done()]
+                claimed = False
+                while len(running) < self.threads:
+                    job = self.queue.claim(self.worker_id)
+                    if job is None:
+                        break
+                    claimed = True
+                    processed += 1
+                    running.append(executor.submit(self.run_job, job))
+
+                if burst and not claimed and not running:
+                    break
+                if running and len(running) >= self.threads:
+                    wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                elif not claimed:
+                    self.stopping.wait(self.poll_interval)
+
+        print(f"Job worker {self.worker_id} stopped after {processed} job(s)")
+        return processed
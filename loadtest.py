@@ -0,0 +1,155 @@
+"""재고 차감 동시성 부하 테스트
+
+한 상품(핫 SKU)에 재고 --stock 개를 넣고, 여러 프로세스 × 스레드가 동시에 1개씩 --orders 건 주문해
+초과 판매(oversell)가 없는지 확인한다. 현재 DATABASE_URL(없으면 SQLite) 데이터베이스를 사용하며
+끝나면 만든 판매/상품을 지운다 (--keep 으로 유지).
+
+    python loadtest.py --stock 200 --orders 1000 --processes 4 --threads 8
+
+성공 조건: 성공한 주문 수 == 재고 수 == 기록된 판매 수, 남은 재고 0
+
+    python loadtest.py --check-cache
+
+다른 프로세스(웹 워커, 작업 워커)가 상품을 수정한 뒤 이 프로세스의 조건부 GET /api/products가
+이전 ETag로 304를 주지 않고, 새 ETag와 함께 캐시가 아닌 새 가격을 돌려주는지 확인한다.
+"""
+import argparse
+import multiprocessing
+import sys
+import threading
+import time
+from datetime import date
+
+
+def _worker(product_id, orders, threads):
+    # spawn된 자식 프로세스에서 실행 - 자식마다 자체 연결 풀을 연다
+    import sales
+    manager = sales.SalesManager()
+    counts = {'ok': 0, 'insufficient': 0, 'error': 0}
+    lock = threading.Lock()
+    today = date.today().isoformat()
+
+    def place(n):
+        for _ in range(n):
+            try:
+                manager.record_sale(product_id, today, 1, '자사몰')
+                result = 'ok'
+            except ValueError as e:
+                result = 'insufficient' if 'Insufficient stock' in str(e) else 'error'
+            except Exception as e:
+                print(f"  order failed: {type(e).__name__}: {e}")
+                result = 'error'
+            with lock:
+                counts[result] += 1
+
+    per_thread = [orders // threads + (1 if i < orders % threads else 0) for i in range(threads)]
+    workers = [threading.Thread(target=place, args=(n,)) for n in per_thread]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return counts
+
+
+def _update_price(product_id, price):
+    # spawn된 자식 프로세스에서 실행 - 부모 프로세스의 상품 캐시를 비우지 못하는 다른 워커 역할
+    import inventory
+    inventory.InventoryManager().update_product(product_id, price=price)
+
+
+def check_cache():
+    """다른 프로세스의 쓰기 뒤 조건부 GET이 새 ETag와 새 본문을 함께 돌려주면 0"""
+    import app as appmod
+    import repository
+
+    manager = appmod.manager
+    product_id = manager.add_product(f'loadtest-cache-{int(time.time())}', '', 1000, 10, 10, 10, 1)
+    with repository.session() as db:
+        user_id = db.fetchone('SELECT id FROM users ORDER BY id LIMIT 1')[0]
+    client = appmod.app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+
+    def price_of(response):
+        return next(float(p['price']) for p in response.get_json() if p['id'] == product_id)
+
+    try:
+        first = client.get('/api/products')
+        etag = first.headers['ETag']
+        # 캐시가 채워진 상태에서 다른 프로세스가 가격 변경
+        context = multiprocessing.get_context('spawn')
+        writer = context.Process(target=_update_price, args=(product_id, 99999))
+        writer.start()
+        writer.join()
+
+        second = client.get('/api/products', headers={'If-None-Match': etag})
+        print(f"before: etag={etag} price={price_of(first)}")
+        print(f"after:  status={second.status_code} etag={second.headers.get('ETag')}"
+              f" price={price_of(second) if second.status_code == 200 else '-'}")
+        passed = (writer.exitcode == 0 and second.status_code == 200
+                  and second.headers['ETag'] != etag and price_of(second) == 99999)
+        # 새 ETag로 다시 물으면 304 (본문을 다시 만들지 않음)
+        third = client.get('/api/products', headers={'If-None-Match': second.headers.get('ETag', '')})
+        passed = passed and third.status_code == 304
+    finally:
+        manager.delete_product(product_id)
+
+    print("PASS: cross-process write invalidated the cache" if passed else "FAIL: stale cached body")
+    return 0 if passed else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='핫 SKU 동시 주문 초과 판매 검사')
+    parser.add_argument('--stock', type=int, default=200)
+    parser.add_argument('--orders', type=int, default=1000)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--keep', action='store_true', help='테스트 상품/판매를 지우지 않음')
+    parser.add_argument('--check-cache', action='store_true',
+                        help='다른 프로세스의 쓰기 뒤 조건부 GET이 새 데이터를 돌려주는지만 확인')
+    args = parser.parse_args(argv)
+    if args.check_cache:
+        return check_cache()
+
+    import inventory
+    import repository
+    import sales
+    manager = inventory.InventoryManager()
+    sales_manager = sales.SalesManager()
+
+    product_id = manager.add_product(f'loadtest-hot-sku-{int(time.time())}', '', 1000, 10, 10, 10, args.stock)
+    per_process = [args.orders // args.processes + (1 if i < args.orders % args.processes else 0)
+                   for i in range(args.processes)]
+
+    started = time.perf_counter()
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(args.processes) as pool:
+        results = pool.starmap(_worker, [(product_id, n, args.threads) for n in per_process])
+    elapsed = time.perf_counter() - started
+
+    counts = {key: sum(r[key] for r in results) for key in ('ok', 'insufficient', 'error')}
+    with repository.session() as db:
+        remaining = db.fetchone('SELECT quantity FROM products WHERE id = ?', (product_id,))[0]
+        sale_ids = [row[0] for row in db.fetchall('SELECT id FROM sales WHERE product_id = ?', (product_id,))]
+
+    print(f"orders={args.orders} processes={args.processes} threads={args.threads} "
+          f"elapsed={elapsed:.2f}s ({args.orders / elapsed:.0f} orders/s)")
+    print(f"ok={counts['ok']} insufficient={counts['insufficient']} error={counts['error']} "
+          f"sales_rows={len(sale_ids)} remaining_stock={remaining}")
+
+    expected_sold = min(args.stock, args.orders)
+    passed = (counts['ok'] == len(sale_ids) == expected_sold
+              and remaining == args.stock - expected_sold
+              and counts['error'] == 0)
+    print("PASS: no oversell" if passed else "FAIL: stock and sales do not match")
+
+    if not args.keep:
+        for sale_id in sale_ids:
+            sales_manager.delete_sale(sale_id)
+        manager.delete_product(product_id)
+
+    return 0 if passed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""관리 명령
+
+    python manage.py init             # 배포 시 1회: 마이그레이션 적용 + 초기 관리자 계정 생성
+    python manage.py migrate          # 미적용 스키마 마이그레이션 적용
+    python manage.py migrate-status   # 마이그레이션 적용 현황
+    python manage.py import-sales orders.csv [--encoding cp949]
+    python manage.py export products [--format ndjson] [-o products.csv]
+    python manage.py export sales --start-date 2024-01-01 --end-date 2024-12-31 -o sales.csv
+    python manage.py forecast [--as-of 2024-06-30]   # 재고 소진 예측/발주 제안 다시 계산 (하루 한 번)
+    python manage.py snapshot-stock [--at 2024-07-01]  # 상품별 재고 스냅샷 추가 (하루 한 번, 기본 오늘 0시)
+    python manage.py check-stock      # 재고 변동 원장 합계와 현재 재고 비교
+    python manage.py worker [--threads 4] [--burst]  # 백그라운드 작업 워커 (jobs.py)
+    python manage.py enqueue forecast  # 작업 큐에 추가 (워커가 실행)
+"""
+import argparse
+import csv
+import sys
+from datetime import date, datetime
+import migrations
+
+# 판매 CSV 헤더 별칭 (주문 내역 엑셀에서 저장한 한글 헤더 허용)
+SALES_CSV_COLUMNS = {
+    'product_id': ['product_id', '상품ID', '상품번호'],
+    'sale_date': ['sale_date', '판매일', '주문일', '결제일'],
+    'quantity': ['quantity', '수량', '판매수량'],
+    'platform': ['platform', '플랫폼', '판매처'],
+}
+# 없어도 되는 열 - 옵션이 있는 상품의 판매 줄에만 채운다
+SALES_CSV_OPTIONAL_COLUMNS = {
+    'variant_id': ['variant_id', '옵션ID', '옵션번호'],
+}
+
+
+def cmd_init(args):
+    # 웹 워커는 시작할 때 스키마 작업을 하지 않으므로 배포(릴리스) 단계에서 한 번 실행한다
+    cmd_migrate(args)
+    from auth import User
+    User.init_admin()
+
+def cmd_migrate(args):
+    applied = migrations.migrate()
+    if not applied:
+        print("No pending migrations")
+
+def cmd_migrate_status(args):
+    pending = 0
+    for m in migrations.status():
+        mark = 'applied' if m['applied'] else 'pending'
+        applied_at = f"  ({m['applied_at']})" if m['applied_at'] else ''
+        print(f"[{mark:>7}] {m['version']:04d}_{m['name']}{applied_at}")
+        if not m['applied']:
+            pending += 1
+    print(f"{pending} pending migration(s)")
+
+def _read_sales_csv(path, encoding):
+    with open(path, newline='', encoding=encoding) as f:
+        reader = csv.DictReader(f)
+        header = {name.strip(): name for name in (reader.fieldnames or [])}
+        mapping = {}
+        for field, aliases in SALES_CSV_COLUMNS.items():
+            source = next((header[a] for a in aliases if a in header), None)
+            if source is None:
+                raise SystemExit(f"Missing column for '{field}' (accepted: {', '.join(aliases)})")
+            mapping[field] = source
+        for field, aliases in SALES_CSV_OPTIONAL_COLUMNS.items():
+            source = next((header[a] for a in aliases if a in header), None)
+            if source is not None:
+                mapping[field] = source
+        return [{field: row[source] for field, source in mapping.items()} for row in reader]
+
+def cmd_import_sales(args):
+    import sales
+    lines = _read_sales_csv(args.path, args.encoding)
+    result = sales.SalesManager().record_sales_bulk(lines)
+    print(f"Imported {result['inserted']} of {len(lines)} sale(s)")
+    for reject in result['rejected']:
+        # CSV 줄 번호 = 데이터 줄 번호 + 1 (헤더)
+        print(f"  line {reject['line'] + 1}: {reject['error']}")
+    return 1 if result['rejected'] else 0
+
+def cmd_export(args):
+    import export
+    if args.what == 'products':
+        import inventory
+        rows = inventory.InventoryManager().iter_products()
+        fields = export.PRODUCT_FIELDS
+    else:
+        import sales
+        rows = sales.SalesManager().iter_sales(args.start_date, args.end_date)
+        fields = export.SALES_FIELDS
+    out = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for chunk in export.encode(rows, fields, args.format):
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+
+def cmd_forecast(args):
+    import forecast
+    summary = forecast.ForecastManager().run_forecast(args.as_of)
+    print(f"Forecast for {summary['products']} product(s) as of {summary['as_of']}: "
+          f"{summary['selling']} selling, {summary['reorder']} to reorder ({summary['seconds']}s)")
+
+def cmd_snapshot_stock(args):
+    import stock_ledger
+    cutoff = datetime.combine(args.at, datetime.min.time()) if args.at else None
+    summary = stock_ledger.StockLedger().snapshot_stock(cutoff)
+    print(f"Snapshot at {summary['snapshot_at']}: {summary['products']} product(s) changed "
+          f"since {summary['previous'] or 'the beginning'}")
+
+def cmd_check_stock(args):
+    import stock_ledger
+    mismatches = stock_ledger.StockLedger().check()
+    for m in mismatches:
+        print(f"  product {m['product_id']}: quantity {m['quantity']}, ledger {m['ledger_quantity']}")
+    print(f"{len(mismatches)} product(s) out of balance")
+    return 1 if mismatches else 0
+
+def cmd_worker(args):
+    import jobs
+    jobs.Worker(threads=args.threads or jobs.JOB_WORKER_THREADS).run(burst=args.burst)
+
+def cmd_enqueue(args):
+    import jobs
+    if args.kind == 'forecast':
+        kind, payload = 'forecast', {'as_of': args.at.isoformat()} if args.at else {}
+    else:
+        kind, payload = 'snapshot_stock', {'cutoff': f'{args.at} 00:00:00'} if args.at else {}
+    job_id = jobs.JobQueue().enqueue(kind, payload)
+    print(f"Queued job {job_id} ({kind})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='재고관리 시스템 관리 명령')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('init', help='마이그레이션 적용 + 초기 관리자 계정 생성 (배포 시 1회)').set_defaults(func=cmd_init)
+    subparsers.add_parser('migrate', help='미적용 스키마 마이그레이션 적용').set_defaults(func=cmd_migrate)
+    subparsers.add_parser('migrate-status', help='마이그레이션 적용 현황').set_defaults(func=cmd_migrate_status)
+
+    import_sales = subparsers.add_parser('import-sales', help='판매 CSV 일괄 등록 (product_id, sale_date, quantity, platform[, variant_id])')
+    import_sales.add_argument('path')
+    import_sales.add_argument('--encoding', default='utf-8-sig', help='CSV 인코딩 (엑셀 저장 파일은 cp949)')
+    import_sales.set_defaults(func=cmd_import_sales)
+
+    export_parser = subparsers.add_parser('export', help='상품/판매 내역 CSV 또는 NDJSON 내보내기')
+    export_parser.add_argument('what', choices=['products', 'sales'])
+    export_parser.add_argument('--format', choices=['csv', 'ndjson'], default='csv')
+    export_parser.add_argument('--start-date', help='판매 내보내기 시작일 (YYYY-MM-DD)')
+    export_parser.add_argument('--end-date', help='판매 내보내기 종료일 (YYYY-MM-DD)')
+    export_parser.add_argument('-o', '--output', help='저장할 파일 (생략 시 표준 출력)')
+    export_parser.set_defaults(func=cmd_export)
+
+    forecast_parser = subparsers.add_parser('forecast', help='전체 상품 재고 소진 예측/발주 제안 계산 (stock_forecasts 갱신)')
+    forecast_parser.add_argument('--as-of', type=date.fromisoformat, help='기준일 (YYYY-MM-DD, 기본 오늘)')
+    forecast_parser.set_defaults(func=cmd_forecast)
+
+    snapshot_parser = subparsers.add_parser('snapshot-stock', help='상품별 재고 스냅샷 추가 (시점 재고 조회용)')
+    snapshot_parser.add_argument('--at', type=date.fromisoformat, help='스냅샷 기준일 0시 (YYYY-MM-DD, 기본 오늘)')
+    snapshot_parser.set_defaults(func=cmd_snapshot_stock)
+    subparsers.add_parser('check-stock', help='재고 변동 원장 합계와 현재 재고 비교').set_defaults(func=cmd_check_stock)
+
+    worker_parser = subparsers.add_parser('worker', help='백그라운드 작업 워커 실행')
+    worker_parser.add_argument('--threads', type=int, default=None, help='동시 실행 작업 수 (기본 JOB_WORKER_THREADS)')
+    worker_parser.add_argument('--burst', action='store_true', help='대기 중인 작업을 모두 실행하면 종료')
+    worker_parser.set_defaults(func=cmd_worker)
+    enqueue_parser = subparsers.add_parser('enqueue', help='배치 작업을 작업 큐에 추가')
+    enqueue_parser.add_argument('kind', choices=['forecast', 'snapshot-stock'])
+    enqueue_parser.add_argument('--at', type=date.fromisoformat, help='기준일 (YYYY-MM-DD)')
+    enqueue_parser.set_defaults(func=cmd_enqueue)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
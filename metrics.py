@@ -0,0 +1,334 @@
+"""요청/쿼리 계측과 Prometheus 지표
+
+- init_app(app): Flask 요청마다 경로별 응답 시간, 요청당 쿼리 수를 기록하고 Server-Timing 헤더를 붙인다
+- InstrumentedCursor: DB-API 커서 래퍼 - 쿼리마다 SQL, 소요 시간(execute + fetch), 행 수를 기록
+- timed: 매니저 메서드 소요 시간 기록 데코레이터
+- render(): /metrics 용 Prometheus 텍스트 형식
+
+SLOW_QUERY_MS 이상 걸린 쿼리, SLOW_REQUEST_MS 이상 걸린 요청(그 요청의 쿼리 목록 포함)은 로그로 남긴다.
+값은 프로세스 메모리에 쌓이므로 gunicorn 워커마다 따로 집계된다 (스크레이프마다 한 워커의 값).
+"""
+import functools
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import List, Optional
+
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '500'))
+SLOW_REQUEST_MS = float(os.getenv('SLOW_REQUEST_MS', '2000'))
+
+# Prometheus 기본 버킷 (초)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+_OPERATIONS = {'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'BEGIN', 'CREATE', 'ALTER', 'DROP', 'TRUNCATE'}
+
+_registry: List = []
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names, values, extra=None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _number(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """레이블별 누적 카운터"""
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_labels(self.labels, label_values)} {_number(value)}')
+        return lines
+
+
+class Histogram:
+    """레이블별 누적 버킷 히스토그램"""
+
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self._series = {}  # 레이블 값 -> [버킷별 개수..., 합계, 개수]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for label_values, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f'{self.name}_bucket{_labels(self.labels, label_values, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labels, label_values)} {_number(series[-2])}')
+            lines.append(f'{self.name}_count{_labels(self.labels, label_values)} {series[-1]}')
+        return lines
+
+
+request_duration = Histogram('http_request_duration_seconds', 'Flask request latency by route',
+                             ('method', 'route', 'status'))
+request_queries = Histogram('http_request_db_queries', 'SQL statements executed per request',
+                            ('route',), buckets=QUERY_COUNT_BUCKETS)
+method_duration = Histogram('manager_method_duration_seconds', 'InventoryManager/SalesManager method latency',
+                            ('method',))
+query_duration = Histogram('db_query_duration_seconds', 'SQL statement latency (execute + fetch)',
+                           ('operation',))
+slow_queries = Counter('db_slow_queries_total', f'SQL statements slower than SLOW_QUERY_MS ({SLOW_QUERY_MS:g}ms)',
+                       ('operation',))
+
+
+class RequestTrace:
+    """요청 하나에서 실행된 쿼리 기록"""
+
+    def __init__(self, route: str):
+        self.route = route
+        self.started = time.perf_counter()
+        self.queries: List['QueryRecord'] = []
+
+    @property
+    def db_ms(self) -> float:
+        return sum(query.duration_ms for query in self.queries)
+
+
+_current: ContextVar[Optional[RequestTrace]] = ContextVar('metrics_request', default=None)
+
+
+class QueryRecord:
+    """쿼리 한 건 - 커서가 다음 쿼리를 실행하거나 닫힐 때 확정된다"""
+
+    __slots__ = ('sql', 'operation', 'duration_ms', 'rows')
+
+    def __init__(self, sql: str):
+        self.sql = sql
+        self.operation = _operation(sql)
+        self.duration_ms = 0.0
+        self.rows = 0
+
+
+def _sql_text(query) -> str:
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    return ' '.join(str(query).split())
+
+def _operation(sql: str) -> str:
+    word = sql.split(' ', 1)[0].upper()
+    return word if word in _OPERATIONS else 'OTHER'
+
+
+class InstrumentedCursor:
+    """DB-API 커서 래퍼 - execute/executemany/fetch 시간을 재어 쿼리 단위로 기록
+
+    SQLite는 execute가 첫 행까지만 계산하므로 fetch 시간까지 합쳐야 실제 쿼리 시간이 된다.
+    나머지 속성(rowcount, mogrify, connection 등)은 실제 커서로 위임하므로
+    psycopg2.extras.execute_values 같은 도우미에도 그대로 넘길 수 있다.
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._record = None
+        self._fetched = None
+
+    def __getattr__(self, name):
+        cursor = self.__dict__.get('_cursor')
+        if cursor is None:
+            raise AttributeError(name)
+        return getattr(cursor, name)
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def _run(self, method, query, args):
+        self._finish()
+        record = QueryRecord(_sql_text(query))
+        started = time.perf_counter()
+        try:
+            method(query, *args)
+        finally:
+            record.duration_ms = (time.perf_counter() - started) * 1000
+            self._record = record
+            self._fetched = None
+        return self
+
+    def execute(self, query, *args):
+        return self._run(self._cursor.execute, query, args)
+
+    def executemany(self, query, *args):
+        return self._run(self._cursor.executemany, query, args)
+
+    def _timed_fetch(self, method, *args):
+        started = time.perf_counter()
+        result = method(*args)
+        if self._record is not None:
+            self._record.duration_ms += (time.perf_counter() - started) * 1000
+            count = len(result) if isinstance(result, list) else int(result is not None)
+            self._fetched = (self._fetched or 0) + count
+        return result
+
+    def fetchone(self):
+        return self._timed_fetch(self._cursor.fetchone)
+
+    def fetchmany(self, *args):
+        return self._timed_fetch(self._cursor.fetchmany, *args)
+
+    def fetchall(self):
+        return self._timed_fetch(self._cursor.fetchall)
+
+    def _finish(self):
+        record, self._record = self._record, None
+        if record is None:
+            return
+        if self._fetched is not None:
+            record.rows = self._fetched
+        else:
+            record.rows = max(getattr(self._cursor, 'rowcount', 0) or 0, 0)
+        _record_query(record)
+
+    def close(self):
+        self._finish()
+        self._cursor.close()
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+
+def _record_query(record: QueryRecord):
+    query_duration.observe(record.duration_ms / 1000, record.operation)
+    trace = _current.get()
+    if trace is not None:
+        trace.queries.append(record)
+    if record.duration_ms >= SLOW_QUERY_MS:
+        slow_queries.inc(record.operation)
+        route = trace.route if trace is not None else '-'
+        print(f"🐢 Slow query {record.duration_ms:.0f}ms, {record.rows} rows [{route}]: {record.sql[:1000]}")
+
+
+def timed(fn):
+    """메서드 소요 시간을 manager_method_duration_seconds{method="클래스.메서드"}로 기록"""
+    name = fn.__qualname__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            method_duration.observe(time.perf_counter() - started, name)
+    return wrapper
+
+
+def init_app(app):
+    """Flask 앱에 요청 계측 훅 등록
+
+    시간은 뷰가 응답을 반환할 때까지이며, 스트리밍 응답(내보내기)의 본문 전송 시간은 포함하지 않는다.
+    """
+    from flask import g, request
+
+    @app.before_request
+    def _start_trace():
+        rule = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+        g._metrics_trace = RequestTrace(rule)
+        g._metrics_token = _current.set(g._metrics_trace)
+
+    @app.after_request
+    def _finish_trace(response):
+        trace = g.pop('_metrics_trace', None)
+        if trace is not None:
+            elapsed_ms = _end_trace(trace, response.status_code)
+            response.headers['Server-Timing'] = (
+                f'db;dur={trace.db_ms:.1f};desc="{len(trace.queries)} queries", app;dur={elapsed_ms:.1f}'
+            )
+        return response
+
+    @app.teardown_request
+    def _teardown_trace(exc):
+        # 처리되지 않은 예외로 after_request가 호출되지 않은 경우
+        trace = g.pop('_metrics_trace', None)
+        if trace is not None:
+            _end_trace(trace, 500)
+        token = g.pop('_metrics_token', None)
+        if token is not None:
+            _current.reset(token)
+
+def _end_trace(trace: RequestTrace, status: int) -> float:
+    from flask import request
+    elapsed_ms = (time.perf_counter() - trace.started) * 1000
+    request_duration.observe(elapsed_ms / 1000, request.method, trace.route, str(status))
+    request_queries.observe(len(trace.queries), trace.route)
+    if elapsed_ms >= SLOW_REQUEST_MS:
+        print(f"🐢 Slow request {request.method} {request.path} {elapsed_ms:.0f}ms "
+              f"(db {trace.db_ms:.0f}ms, {len(trace.queries)} queries)")
+        for query in sorted(trace.queries, key=lambda q: q.duration_ms, reverse=True)[:10]:
+            print(f"    {query.duration_ms:8.1f}ms {query.rows:>7} rows  {query.sql[:200]}")
+    return elapsed_ms
+
+
+def _samples(name: str, help: str, kind: str, labels, rows) -> List[str]:
+    lines = [f'# HELP {name} {help}', f'# TYPE {name} {kind}']
+    lines.extend(f'{name}{_labels(labels, values)} {_number(value)}' for values, value in rows)
+    return lines
+
+def render() -> str:
+    """등록된 모든 지표 + 캐시/커넥션 풀 상태를 Prometheus 텍스트 형식(0.0.4)으로"""
+    import cache
+    import database_cloud as database
+    lines = []
+    for metric in list(_registry):
+        lines.extend(metric.render())
+
+    cache_stats = cache.all_stats()
+    lines += _samples('cache_hits_total', 'Cache hits since process start', 'counter', ('cache',),
+                      [((s['name'],), s['hits']) for s in cache_stats])
+    lines += _samples('cache_misses_total', 'Cache misses since process start', 'counter', ('cache',),
+                      [((s['name'],), s['misses']) for s in cache_stats])
+    lines += _samples('cache_entries', 'Entries currently cached', 'gauge', ('cache',),
+                      [((s['name'],), s['entries']) for s in cache_stats])
+
+    pool_stats = database.get_pool().stats()
+    lines += _samples('db_pool_connections', 'Open pooled database connections', 'gauge', (),
+                      [((), pool_stats.get('size', 0))])
+    if 'idle' in pool_stats:
+        lines += _samples('db_pool_idle_connections', 'Idle pooled database connections', 'gauge', (),
+                          [((), pool_stats['idle'])])
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,833 @@
+"""버전 관리 스키마 마이그레이션
+
+마이그레이션은 버전 순서대로 한 번씩만 적용되며 schema_migrations 테이블에 기록된다.
+새 스키마 변경은 기존 마이그레이션을 고치지 말고 다음 버전 번호로 추가한다.
+
+    python manage.py migrate          # 미적용 마이그레이션 적용
+    python manage.py migrate-status   # 적용 현황 출력
+"""
+from datetime import datetime
+from typing import Dict, List
+import repository
+
+MIGRATIONS = []
+
+def migration(version: int, name: str):
+    """마이그레이션 함수 등록 - 함수는 Session을 받아 DDL/DML을 실행한다"""
+    def register(fn):
+        MIGRATIONS.append((version, name, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+def _table_columns(db, table: str) -> List[str]:
+    if db.dialect.is_postgres:
+        rows = db.fetchall('''
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = ?
+        ''', (table,))
+        return [row[0] for row in rows]
+    return [row[1] for row in db.fetchall(f"PRAGMA table_info({table})")]
+
+
+@migration(1, 'create_core_tables')
+def _create_core_tables(db):
+    if db.dialect.is_postgres:
+        db.execute('''
+        CREATE TABLE IF NOT EXISTS products (
+            id SERIAL PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            options TEXT,
+            price DECIMAL(10,2) NOT NULL,
+            margin_naver DECIMAL(5,2) NOT NULL,
+            margin_coupang DECIMAL(5,2) NOT NULL,
+            margin_self DECIMAL(5,2) NOT NULL,
+            quantity INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+        db.execute('''
+        CREATE TABLE IF NOT EXISTS sales (
+            id SERIAL PRIMARY KEY,
+            product_id INTEGER NOT NULL REFERENCES products(id),
+            sale_date DATE NOT NULL,
+            quantity INTEGER NOT NULL,
+            platform VARCHAR(10) NOT NULL,
+            revenue DECIMAL(10,2) NOT NULL,
+            profit DECIMAL(10,2) NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+        db.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            username VARCHAR(50) UNIQUE NOT NULL,
+            email VARCHAR(100) UNIQUE NOT NULL,
+            password_hash VARCHAR(255) NOT NULL,
+            is_admin BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+    else:
+        db.execute('''
+        CREATE TABLE IF NOT EXISTS products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name VARCHAR(100) NOT NULL,
+            options TEXT,
+            price DECIMAL(10,2) NOT NULL,
+            margin_naver DECIMAL(5,2) NOT NULL,
+            margin_coupang DECIMAL(5,2) NOT NULL,
+            margin_self DECIMAL(5,2) NOT NULL,
+            quantity INTEGER NOT NULL DEFAULT 0,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+        db.execute('''
+        CREATE TABLE IF NOT EXISTS sales (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER NOT NULL,
+            sale_date DATE NOT NULL,
+            quantity INTEGER NOT NULL,
+            platform VARCHAR(10) NOT NULL,
+            revenue DECIMAL(10,2) NOT NULL,
+            profit DECIMAL(10,2) NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (product_id) REFERENCES products (id)
+        )
+        ''')
+        db.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username VARCHAR(50) UNIQUE NOT NULL,
+            email VARCHAR(100) UNIQUE NOT NULL,
+            password_hash VARCHAR(255) NOT NULL,
+            is_admin BOOLEAN DEFAULT 0,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+
+
+@migration(2, 'legacy_product_columns')
+def _legacy_product_columns(db):
+    # 초기 버전 DB: options 컬럼 없음, 마진 컬럼명이 margin_a/b/c
+    columns = _table_columns(db, 'products')
+
+    if 'options' not in columns:
+        db.execute('ALTER TABLE products ADD COLUMN options TEXT')
+
+    if 'margin_a' in columns and 'margin_naver' not in columns:
+        db.execute('ALTER TABLE products ADD COLUMN margin_naver DECIMAL(5,2)')
+        db.execute('ALTER TABLE products ADD COLUMN margin_coupang DECIMAL(5,2)')
+        db.execute('ALTER TABLE products ADD COLUMN margin_self DECIMAL(5,2)')
+        db.execute('UPDATE products SET margin_naver = margin_a, margin_coupang = margin_b, margin_self = margin_c')
+
+
+@migration(3, 'sales_and_product_indexes')
+def _sales_and_product_indexes(db):
+    # get_sales_by_date / get_sales_summary 의 sale_date BETWEEN 범위 조회
+    db.execute('CREATE INDEX IF NOT EXISTS idx_sales_sale_date ON sales (sale_date)')
+    # get_product_sales_history 의 product_id = ? 조회 + sale_date 정렬
+    db.execute('CREATE INDEX IF NOT EXISTS idx_sales_product_date ON sales (product_id, sale_date)')
+    # 상품명 정렬/접두 검색
+    db.execute('CREATE INDEX IF NOT EXISTS idx_products_name ON products (name)')
+
+
+@migration(4, 'sales_daily_rollup')
+def _sales_daily_rollup(db):
+    # 날짜 × 상품 × 플랫폼 일별 집계 - SalesManager가 판매 기록/수정/삭제 시 같은 트랜잭션에서 갱신
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS sales_daily (
+            sale_date DATE NOT NULL,
+            product_id INTEGER NOT NULL,
+            platform VARCHAR(10) NOT NULL,
+            sales_count INTEGER NOT NULL DEFAULT 0,
+            quantity INTEGER NOT NULL DEFAULT 0,
+            revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+            profit DECIMAL(14,2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (sale_date, product_id, platform)
+        )
+    ''')
+    db.execute('''
+        INSERT INTO sales_daily (sale_date, product_id, platform, sales_count, quantity, revenue, profit)
+        SELECT sale_date, product_id, platform, COUNT(*), SUM(quantity), SUM(revenue), SUM(profit)
+        FROM sales
+        GROUP BY sale_date, product_id, platform
+    ''')
+
+
+@migration(5, 'keyset_pagination_indexes')
+def _keyset_pagination_indexes(db):
+    # get_products_page / get_sales_page 의 (정렬 값, id) 키셋 조회
+    db.execute('CREATE INDEX IF NOT EXISTS idx_products_name_id ON products (name, id)')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_products_price_id ON products (price, id)')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_products_quantity_id ON products (quantity, id)')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_products_value_id ON products ((price * quantity), id)')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_sales_sale_date_id ON sales (sale_date, id)')
+
+
+@migration(6, 'product_search_index')
+def _product_search_index(db):
+    # search_index.py 참고 - 확장/토크나이저를 쓸 수 없는 환경이면 인덱스 없이 LIKE 검색으로 동작
+    db.execute('SAVEPOINT product_search_index')
+    try:
+        if db.dialect.is_postgres:
+            db.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            db.execute('''
+                CREATE INDEX IF NOT EXISTS idx_products_search_trgm ON products
+                USING gin ((name || ' ' || COALESCE(options, '')) gin_trgm_ops)
+            ''')
+        else:
+            db.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+                    name, options, content='products', content_rowid='id', tokenize='trigram'
+                )
+            ''')
+            db.execute('''
+                CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+                    INSERT INTO products_fts (rowid, name, options) VALUES (new.id, new.name, new.options);
+                END
+            ''')
+            db.execute('''
+                CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+                    INSERT INTO products_fts (products_fts, rowid, name, options)
+                    VALUES ('delete', old.id, old.name, old.options);
+                END
+            ''')
+            db.execute('''
+                CREATE TRIGGER IF NOT EXISTS products_fts_update AFTER UPDATE OF name, options ON products BEGIN
+                    INSERT INTO products_fts (products_fts, rowid, name, options)
+                    VALUES ('delete', old.id, old.name, old.options);
+                    INSERT INTO products_fts (rowid, name, options) VALUES (new.id, new.name, new.options);
+                END
+            ''')
+            db.execute("INSERT INTO products_fts (products_fts) VALUES ('rebuild')")
+        db.execute('RELEASE SAVEPOINT product_search_index')
+    except Exception as e:
+        db.execute('ROLLBACK TO SAVEPOINT product_search_index')
+        db.execute('RELEASE SAVEPOINT product_search_index')
+        print(f"Product search index not available, falling back to LIKE search: {e}")
+
+
+@migration(7, 'data_versions')
+def _data_versions(db):
+    # 데이터 종류별 변경 카운터 - 쓰기 트랜잭션에서 증가시키고, 분석 결과 캐시 키로 사용 (analytics.py)
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS data_versions (
+            name VARCHAR(50) PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0
+        )
+    ''')
+    for name in ('sales', 'products'):
+        db.execute('INSERT INTO data_versions (name, version) VALUES (?, 0) ON CONFLICT (name) DO NOTHING', (name,))
+
+
+@migration(8, 'stock_forecasts')
+def _stock_forecasts(db):
+    # 상품별 판매 속도/재주문점 예측 결과 - forecast.py 배치 작업이 통째로 다시 쓴다
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS stock_forecasts (
+            product_id INTEGER PRIMARY KEY,
+            velocity DOUBLE PRECISION NOT NULL,
+            velocity_naver DOUBLE PRECISION NOT NULL,
+            velocity_coupang DOUBLE PRECISION NOT NULL,
+            velocity_self DOUBLE PRECISION NOT NULL,
+            moving_average DOUBLE PRECISION NOT NULL,
+            demand_std DOUBLE PRECISION NOT NULL,
+            quantity INTEGER NOT NULL,
+            days_of_cover DOUBLE PRECISION,
+            stockout_date DATE,
+            reorder_point INTEGER NOT NULL,
+            suggested_quantity INTEGER NOT NULL,
+            computed_at TIMESTAMP NOT NULL
+        )
+    ''')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_stock_forecasts_cover ON stock_forecasts (days_of_cover)')
+
+
+# inventory_totals 행 수 - 서로 다른 상품의 동시 쓰기가 같은 집계 행을 두고 기다리지 않도록 id % N 으로 나눈다
+INVENTORY_TOTALS_SHARDS = 16
+
+@migration(9, 'inventory_totals')
+def _inventory_totals(db):
+    # 상품 수/총 재고/총 재고 가치/가격 합계 - 상품 INSERT/DELETE/가격·수량 UPDATE 트리거가 같은 트랜잭션에서 증감
+    # 재고 요약은 이 N개 행의 합계만 읽는다 (InventoryManager.get_inventory_summary)
+    if db.dialect.is_postgres:
+        # 집계를 채우는 동안 트리거 없이 들어오는 상품 쓰기가 없도록
+        db.execute('LOCK TABLE products IN SHARE ROW EXCLUSIVE MODE')
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS inventory_totals (
+            shard INTEGER PRIMARY KEY,
+            product_count INTEGER NOT NULL DEFAULT 0,
+            total_quantity BIGINT NOT NULL DEFAULT 0,
+            total_value DECIMAL(18,2) NOT NULL DEFAULT 0,
+            price_sum DECIMAL(18,2) NOT NULL DEFAULT 0
+        )
+    ''')
+    db.execute('DELETE FROM inventory_totals')
+    db.executemany('INSERT INTO inventory_totals (shard) VALUES (?)',
+                   [(shard,) for shard in range(INVENTORY_TOTALS_SHARDS)])
+    totals = db.fetchall(f'''
+        SELECT id % {INVENTORY_TOTALS_SHARDS}, COUNT(*), SUM(quantity), SUM(price * quantity), SUM(price)
+        FROM products
+        GROUP BY id % {INVENTORY_TOTALS_SHARDS}
+    ''')
+    db.executemany('''
+        UPDATE inventory_totals
+        SET product_count = ?, total_quantity = ?, total_value = ?, price_sum = ?
+        WHERE shard = ?
+    ''', [tuple(row[1:]) + (row[0],) for row in totals])
+
+    add = f'''
+        UPDATE inventory_totals SET
+            product_count = product_count + 1,
+            total_quantity = total_quantity + NEW.quantity,
+            total_value = total_value + NEW.price * NEW.quantity,
+            price_sum = price_sum + NEW.price
+        WHERE shard = NEW.id % {INVENTORY_TOTALS_SHARDS};
+    '''
+    remove = f'''
+        UPDATE inventory_totals SET
+            product_count = product_count - 1,
+            total_quantity = total_quantity - OLD.quantity,
+            total_value = total_value - OLD.price * OLD.quantity,
+            price_sum = price_sum - OLD.price
+        WHERE shard = OLD.id % {INVENTORY_TOTALS_SHARDS};
+    '''
+    change = f'''
+        UPDATE inventory_totals SET
+            total_quantity = total_quantity + NEW.quantity - OLD.quantity,
+            total_value = total_value + NEW.price * NEW.quantity - OLD.price * OLD.quantity,
+            price_sum = price_sum + NEW.price - OLD.price
+        WHERE shard = NEW.id % {INVENTORY_TOTALS_SHARDS};
+    '''
+    if db.dialect.is_postgres:
+        db.execute(f'''
+            CREATE OR REPLACE FUNCTION inventory_totals_apply() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    {add}
+                ELSIF TG_OP = 'DELETE' THEN
+                    {remove}
+                ELSE
+                    {change}
+                END IF;
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql
+        ''')
+        db.execute('DROP TRIGGER IF EXISTS products_inventory_totals ON products')
+        db.execute('''
+            CREATE TRIGGER products_inventory_totals
+            AFTER INSERT OR DELETE OR UPDATE OF price, quantity ON products
+            FOR EACH ROW EXECUTE PROCEDURE inventory_totals_apply()
+        ''')
+    else:
+        db.execute(f'CREATE TRIGGER IF NOT EXISTS products_totals_insert AFTER INSERT ON products BEGIN {add} END')
+        db.execute(f'CREATE TRIGGER IF NOT EXISTS products_totals_delete AFTER DELETE ON products BEGIN {remove} END')
+        db.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS products_totals_update AFTER UPDATE OF price, quantity ON products
+            BEGIN {change} END
+        ''')
+
+
+
+@migration(10, 'stock_ledger')
+def _stock_ledger(db):
+    # 재고 변동 원장 (추가 전용) - 수량을 바꾸는 모든 쓰기가 같은 트랜잭션에서 증감분을 남긴다 (stock_ledger.py)
+    # 상품별 SUM(quantity_change) = products.quantity
+    if db.dialect.is_postgres:
+        # 기초 재고를 채우는 동안 원장 없이 바뀌는 수량이 없도록
+        db.execute('LOCK TABLE products IN SHARE ROW EXCLUSIVE MODE')
+        db.execute('''
+        CREATE TABLE IF NOT EXISTS stock_movements (
+            id BIGSERIAL PRIMARY KEY,
+            product_id INTEGER NOT NULL,
+            movement_type VARCHAR(20) NOT NULL,
+            quantity_change INTEGER NOT NULL,
+            sale_id INTEGER,
+            note VARCHAR(200),
+            moved_at TIMESTAMP NOT NULL
+        )
+        ''')
+    else:
+        db.execute('''
+        CREATE TABLE IF NOT EXISTS stock_movements (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER NOT NULL,
+            movement_type VARCHAR(20) NOT NULL,
+            quantity_change INTEGER NOT NULL,
+            sale_id INTEGER,
+            note VARCHAR(200),
+            moved_at DATETIME NOT NULL
+        )
+        ''')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_stock_movements_product_moved ON stock_movements (product_id, moved_at)')
+
+    # 상품별 기준 시점 재고 - snapshot_at 이전 변동의 합계 (manage.py snapshot-stock이 주기적으로 추가)
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS stock_snapshots (
+            product_id INTEGER NOT NULL,
+            snapshot_at TIMESTAMP NOT NULL,
+            quantity INTEGER NOT NULL,
+            PRIMARY KEY (product_id, snapshot_at)
+        )
+    ''')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_stock_snapshots_at ON stock_snapshots (snapshot_at)')
+
+    # 원장 시작 시점의 재고를 기초 재고(adjust)로 기록
+    moved_at = datetime.now().isoformat(sep=' ', timespec='seconds')
+    rows = db.fetchall('SELECT id, quantity FROM products WHERE quantity <> 0 ORDER BY id')
+    db.insert_many('stock_movements', ['product_id', 'movement_type', 'quantity_change', 'note', 'moved_at'],
+                   [(row[0], 'adjust', row[1], '기초 재고', moved_at) for row in rows])
+
+
+
+@migration(11, 'change_versions')
+def _change_versions(db):
+    # 조건부 GET(ETag/Last-Modified)용 변경 카운터 (httpcache.py)
+    # 상품 쓰기는 inventory_totals 트리거가 샤드별 changes/changed_at을 올린다 - 모든 열의 UPDATE로 범위를 넓힌다
+    # 판매/예측 쓰기는 data_versions 행(sales, forecasts)의 version/updated_at을 올린다 (repository.bump_data_version)
+    # 시각은 모두 시간대 없는 UTC
+    if db.dialect.is_postgres:
+        db.execute('LOCK TABLE products IN SHARE ROW EXCLUSIVE MODE')
+    db.execute('ALTER TABLE inventory_totals ADD COLUMN changes BIGINT NOT NULL DEFAULT 0')
+    db.execute('ALTER TABLE inventory_totals ADD COLUMN changed_at TIMESTAMP')
+    db.execute('ALTER TABLE data_versions ADD COLUMN updated_at TIMESTAMP')
+    db.execute('INSERT INTO data_versions (name, version) VALUES (?, 0) ON CONFLICT (name) DO NOTHING', ('forecasts',))
+
+    now = db.dialect.utc_now
+    add = f'''
+        UPDATE inventory_totals SET
+            product_count = product_count + 1,
+            total_quantity = total_quantity + NEW.quantity,
+            total_value = total_value + NEW.price * NEW.quantity,
+            price_sum = price_sum + NEW.price,
+            changes = changes + 1,
+            changed_at = {now}
+        WHERE shard = NEW.id % {INVENTORY_TOTALS_SHARDS};
+    '''
+    remove = f'''
+        UPDATE inventory_totals SET
+            product_count = product_count - 1,
+            total_quantity = total_quantity - OLD.quantity,
+            total_value = total_value - OLD.price * OLD.quantity,
+            price_sum = price_sum - OLD.price,
+            changes = changes + 1,
+            changed_at = {now}
+        WHERE shard = OLD.id % {INVENTORY_TOTALS_SHARDS};
+    '''
+    change = f'''
+        UPDATE inventory_totals SET
+            total_quantity = total_quantity + NEW.quantity - OLD.quantity,
+            total_value = total_value + NEW.price * NEW.quantity - OLD.price * OLD.quantity,
+            price_sum = price_sum + NEW.price - OLD.price,
+            changes = changes + 1,
+            changed_at = {now}
+        WHERE shard = NEW.id % {INVENTORY_TOTALS_SHARDS};
+    '''
+    if db.dialect.is_postgres:
+        db.execute(f'''
+            CREATE OR REPLACE FUNCTION inventory_totals_apply() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    {add}
+                ELSIF TG_OP = 'DELETE' THEN
+                    {remove}
+                ELSE
+                    {change}
+                END IF;
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql
+        ''')
+        db.execute('DROP TRIGGER IF EXISTS products_inventory_totals ON products')
+        db.execute('''
+            CREATE TRIGGER products_inventory_totals
+            AFTER INSERT OR DELETE OR UPDATE ON products
+            FOR EACH ROW EXECUTE PROCEDURE inventory_totals_apply()
+        ''')
+    else:
+        for trigger in ('products_totals_insert', 'products_totals_delete', 'products_totals_update'):
+            db.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        db.execute(f'CREATE TRIGGER products_totals_insert AFTER INSERT ON products BEGIN {add} END')
+        db.execute(f'CREATE TRIGGER products_totals_delete AFTER DELETE ON products BEGIN {remove} END')
+        db.execute(f'CREATE TRIGGER products_totals_update AFTER UPDATE ON products BEGIN {change} END')
+
+
+@migration(12, 'jobs')
+def _jobs(db):
+    # 백그라운드 작업 큐 (jobs.py) - 라우트가 추가하고 manage.py worker가 꺼내 실행한다
+    # payload/result는 JSON 문자열, 시각은 애플리케이션 현지 시각
+    if db.dialect.is_postgres:
+        id_column = 'id BIGSERIAL PRIMARY KEY'
+    else:
+        id_column = 'id INTEGER PRIMARY KEY AUTOINCREMENT'
+    db.execute(f'''
+        CREATE TABLE IF NOT EXISTS jobs (
+            {id_column},
+            kind VARCHAR(50) NOT NULL,
+            payload TEXT NOT NULL,
+            status VARCHAR(20) NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            dedupe_key VARCHAR(200),
+            created_by INTEGER,
+            result TEXT,
+            error TEXT,
+            locked_by VARCHAR(100),
+            run_after TIMESTAMP NOT NULL,
+            created_at TIMESTAMP NOT NULL,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    ''')
+    # 워커가 실행할 다음 작업 찾기 / 같은 작업 중복 추가 확인
+    db.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status_run_after ON jobs (status, run_after)')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_jobs_dedupe_key ON jobs (dedupe_key)')
+
+
+@migration(13, 'product_variants')
+def _product_variants(db):
+    # 상품 옵션(변형) - 옵션마다 상품을 복사하지 않고 부모 상품 아래 SKU 행으로 재고를 따로 관리한다 (inventory.py)
+    # 가격/마진은 옵션별로 다를 때만 채우고 NULL이면 부모 상품 값을 쓴다 (NULL 열은 저장 공간을 거의 차지하지 않는다)
+    # 옵션이 있는 상품의 products.quantity는 옵션 재고 합계로 유지되므로 재고 집계/원장/예측은 상품 단위 그대로 동작한다
+    if db.dialect.is_postgres:
+        id_column = 'id SERIAL PRIMARY KEY'
+    else:
+        id_column = 'id INTEGER PRIMARY KEY AUTOINCREMENT'
+    db.execute(f'''
+        CREATE TABLE IF NOT EXISTS product_variants (
+            {id_column},
+            product_id INTEGER NOT NULL REFERENCES products (id) ON DELETE CASCADE,
+            options VARCHAR(200) NOT NULL,
+            sku VARCHAR(64),
+            quantity INTEGER NOT NULL DEFAULT 0,
+            price DECIMAL(10,2),
+            margin_naver DECIMAL(5,2),
+            margin_coupang DECIMAL(5,2),
+            margin_self DECIMAL(5,2),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (product_id, options)
+        )
+    ''')
+    db.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_product_variants_sku ON product_variants (sku) WHERE sku IS NOT NULL')
+    # 재고 가치 보정(옵션 가격이 다른 행만) - get_inventory_summary
+    db.execute('''
+        CREATE INDEX IF NOT EXISTS idx_product_variants_priced ON product_variants (product_id)
+        WHERE price IS NOT NULL
+    ''')
+    # 옵션 수 - 0이면 상품 목록 조회에서 옵션 하위 조회를 건너뛴다
+    db.execute('ALTER TABLE products ADD COLUMN variant_count INTEGER NOT NULL DEFAULT 0')
+    db.execute('ALTER TABLE sales ADD COLUMN variant_id INTEGER')
+    # 판매 기록이 있는 옵션인지 확인 (옵션 삭제)
+    db.execute('CREATE INDEX IF NOT EXISTS idx_sales_variant ON sales (variant_id) WHERE variant_id IS NOT NULL')
+
+
+@migration(14, 'product_search_bigrams')
+def _product_search_bigrams(db):
+    # 2글자 검색어(양말, 가방 등 한글 두 음절 단어)용 bigram 색인 - trigram(FTS5/pg_trgm)은 3글자 미만을 찾지 못한다
+    # 상품명 + 옵션을 소문자로 바꿔 공백이 없는 2글자 조각마다 (bigram, product_id) 한 행, products 트리거로 동기화
+    if db.dialect.is_postgres:
+        # 색인을 채우는 동안 트리거 없이 들어오는 상품 쓰기가 없도록
+        db.execute('LOCK TABLE products IN SHARE ROW EXCLUSIVE MODE')
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS product_search_bigrams (
+            bigram VARCHAR(2) NOT NULL,
+            product_id INTEGER NOT NULL,
+            PRIMARY KEY (bigram, product_id)
+        )
+    ''')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_product_search_bigrams_product ON product_search_bigrams (product_id)')
+
+    def bigrams(source):
+        # source: (id, doc) 한 행 이상을 내는 하위 조회 -> INSERT할 (bigram, product_id) 조회
+        if db.dialect.is_postgres:
+            return f'''
+                SELECT DISTINCT substr(d.doc, i, 2), d.id
+                FROM ({source}) d, generate_series(1, length(d.doc) - 1) i
+                WHERE strpos(substr(d.doc, i, 2), ' ') = 0
+                ON CONFLICT DO NOTHING
+            '''
+        # SQLite 트리거 안에서는 WITH RECURSIVE를 쓸 수 없으므로 json_each로 0..길이-2 위치를 만든다
+        return f'''
+            SELECT substr(d.doc, j.key + 1, 2), d.id
+            FROM ({source}) d,
+                 json_each('[' || rtrim(replace(hex(zeroblob(length(d.doc) - 1)), '00', '0,'), ',') || ']') j
+            WHERE instr(substr(d.doc, j.key + 1, 2), ' ') = 0
+        '''
+
+    insert = 'INSERT INTO' if db.dialect.is_postgres else 'INSERT OR IGNORE INTO'
+    fill = f"{insert} product_search_bigrams (bigram, product_id) "
+    new_row = "SELECT NEW.id AS id, lower(NEW.name || ' ' || COALESCE(NEW.options, '')) AS doc"
+    if db.dialect.is_postgres:
+        db.execute(f'''
+            CREATE OR REPLACE FUNCTION product_search_bigrams_apply() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP <> 'INSERT' THEN
+                    DELETE FROM product_search_bigrams WHERE product_id = OLD.id;
+                END IF;
+                IF TG_OP <> 'DELETE' THEN
+                    {fill} {bigrams(new_row)};
+                END IF;
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql
+        ''')
+        db.execute('DROP TRIGGER IF EXISTS products_search_bigrams ON products')
+        db.execute('''
+            CREATE TRIGGER products_search_bigrams
+            AFTER INSERT OR DELETE OR UPDATE OF name, options ON products
+            FOR EACH ROW EXECUTE PROCEDURE product_search_bigrams_apply()
+        ''')
+    else:
+        db.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS products_bigrams_insert AFTER INSERT ON products BEGIN
+                {fill} {bigrams(new_row)};
+            END
+        ''')
+        db.execute('''
+            CREATE TRIGGER IF NOT EXISTS products_bigrams_delete AFTER DELETE ON products BEGIN
+                DELETE FROM product_search_bigrams WHERE product_id = OLD.id;
+            END
+        ''')
+        db.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS products_bigrams_update AFTER UPDATE OF name, options ON products BEGIN
+                DELETE FROM product_search_bigrams WHERE product_id = OLD.id;
+                {fill} {bigrams(new_row)};
+            END
+        ''')
+    db.execute(fill + bigrams("SELECT id, lower(name || ' ' || COALESCE(options, '')) AS doc FROM products"))
+
+
+@migration(15, 'variant_inventory_value')
+def _variant_inventory_value(db):
+    # 옵션 가격이 부모 가격과 다른 만큼의 재고 가치((옵션 가격 - 상품 가격) * 옵션 재고)를 inventory_totals.total_value에 포함한다
+    # 옵션 INSERT/DELETE/가격·수량 UPDATE 트리거와 상품 가격 UPDATE/DELETE 트리거가 같은 트랜잭션에서 증감하므로
+    # 재고 요약은 계속 N개 샤드 행의 합계만 읽는다 (InventoryManager.get_inventory_summary)
+    if db.dialect.is_postgres:
+        db.execute('LOCK TABLE products, product_variants IN SHARE ROW EXCLUSIVE MODE')
+
+    def adjustment(row):
+        # 옵션 행 하나의 보정값 - 가격이 NULL(부모 가격)이거나 부모 상품이 이미 지워졌으면 0
+        return f'''COALESCE((SELECT ({row}.price - p.price) * {row}.quantity
+                           FROM products p WHERE p.id = {row}.product_id), 0)'''
+
+
+    now = db.dialect.utc_now
+    db.execute(f'''
+        UPDATE inventory_totals SET total_value = total_value + COALESCE((
+            SELECT SUM((v.price - p.price) * v.quantity)
+            FROM product_variants v JOIN products p ON p.id = v.product_id
+            WHERE v.price IS NOT NULL AND p.id % {INVENTORY_TOTALS_SHARDS} = inventory_totals.shard
+        ), 0)
+    ''')
+
+    add = f'''
+        UPDATE inventory_totals SET
+            product_count = product_count + 1,
+            total_quantity = total_quantity + NEW.quantity,
+            total_value = total_value + NEW.price * NEW.quantity,
+            price_sum = price_sum + NEW.price,
+            changes = changes + 1,
+            changed_at = {now}
+        WHERE shard = NEW.id % {INVENTORY_TOTALS_SHARDS};
+    '''
+    remove = f'''
+        UPDATE inventory_totals SET
+            product_count = product_count - 1,
+            total_quantity = total_quantity - OLD.quantity,
+            total_value = total_value - OLD.price * OLD.quantity,
+            price_sum = price_sum - OLD.price,
+            changes = changes + 1,
+            changed_at = {now}
+        WHERE shard = OLD.id % {INVENTORY_TOTALS_SHARDS};
+    '''
+    # 옵션이 남은 상품을 지우면(PostgreSQL ON DELETE CASCADE) 옵션 트리거는 부모 가격을 읽을 수 없으므로
+    # 상품 행이 지워지기 전(BEFORE DELETE)에 남은 옵션의 보정값을 먼저 뺀다
+    detach = f'''
+        UPDATE inventory_totals SET
+            total_value = total_value - COALESCE((
+                SELECT SUM((v.price - OLD.price) * v.quantity) FROM product_variants v
+                WHERE v.product_id = OLD.id AND v.price IS NOT NULL
+            ), 0)
+        WHERE shard = OLD.id % {INVENTORY_TOTALS_SHARDS};
+    '''
+    # 상품 가격이 바뀌면 가격이 정해진 옵션의 보정값은 (가격 변화 * 옵션 재고)만큼 반대로 움직인다
+    change = f'''
+        UPDATE inventory_totals SET
+            total_quantity = total_quantity + NEW.quantity - OLD.quantity,
+            total_value = total_value + NEW.price * NEW.quantity - OLD.price * OLD.quantity
+                - CASE WHEN NEW.price <> OLD.price THEN (NEW.price - OLD.price) * COALESCE((
+                      SELECT SUM(v.quantity) FROM product_variants v
+                      WHERE v.product_id = NEW.id AND v.price IS NOT NULL
+                  ), 0) ELSE 0 END,
+            price_sum = price_sum + NEW.price - OLD.price,
+            changes = changes + 1,
+            changed_at = {now}
+        WHERE shard = NEW.id % {INVENTORY_TOTALS_SHARDS};
+    '''
+    variant_add = f'''
+        UPDATE inventory_totals SET
+            total_value = total_value + {adjustment('NEW')},
+            changes = changes + 1,
+            changed_at = {now}
+        WHERE shard = NEW.product_id % {INVENTORY_TOTALS_SHARDS};
+    '''
+    variant_remove = f'''
+        UPDATE inventory_totals SET
+            total_value = total_value - {adjustment('OLD')},
+            changes = changes + 1,
+            changed_at = {now}
+        WHERE shard = OLD.product_id % {INVENTORY_TOTALS_SHARDS};
+    '''
+    variant_change = f'''
+        UPDATE inventory_totals SET
+            total_value = total_value + {adjustment('NEW')} - {adjustment('OLD')},
+            changes = changes + 1,
+            changed_at = {now}
+        WHERE shard = NEW.product_id % {INVENTORY_TOTALS_SHARDS};
+    '''
+    if db.dialect.is_postgres:
+        for function, (on_insert, on_delete, on_update) in (
+            ('inventory_totals_apply', (add, remove, change)),
+            ('inventory_totals_variant_apply', (variant_add, variant_remove, variant_change)),
+        ):
+            db.execute(f'''
+                CREATE OR REPLACE FUNCTION {function}() RETURNS trigger AS $$
+                BEGIN
+                    IF TG_OP = 'INSERT' THEN
+                        {on_insert}
+                    ELSIF TG_OP = 'DELETE' THEN
+                        {on_delete}
+                    ELSE
+                        {on_update}
+                    END IF;
+                    RETURN NULL;
+                END
+                $$ LANGUAGE plpgsql
+            ''')
+        db.execute(f'''
+            CREATE OR REPLACE FUNCTION inventory_totals_variants_detach() RETURNS trigger AS $$
+            BEGIN
+                {detach}
+                RETURN OLD;
+            END
+            $$ LANGUAGE plpgsql
+        ''')
+        db.execute('DROP TRIGGER IF EXISTS products_inventory_totals_detach ON products')
+        db.execute('''
+            CREATE TRIGGER products_inventory_totals_detach
+            BEFORE DELETE ON products
+            FOR EACH ROW EXECUTE PROCEDURE inventory_totals_variants_detach()
+        ''')
+        db.execute('DROP TRIGGER IF EXISTS product_variants_inventory_totals ON product_variants')
+        db.execute('''
+            CREATE TRIGGER product_variants_inventory_totals
+            AFTER INSERT OR DELETE OR UPDATE OF price, quantity ON product_variants
+            FOR EACH ROW EXECUTE PROCEDURE inventory_totals_variant_apply()
+        ''')
+    else:
+        db.execute('DROP TRIGGER IF EXISTS products_totals_update')
+        db.execute(f'CREATE TRIGGER products_totals_update AFTER UPDATE ON products BEGIN {change} END')
+        db.execute(f'CREATE TRIGGER IF NOT EXISTS products_totals_detach BEFORE DELETE ON products BEGIN {detach} END')
+        db.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS variants_totals_insert AFTER INSERT ON product_variants
+            BEGIN {variant_add} END
+        ''')
+        db.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS variants_totals_delete AFTER DELETE ON product_variants
+            BEGIN {variant_remove} END
+        ''')
+        db.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS variants_totals_update AFTER UPDATE OF price, quantity ON product_variants
+            BEGIN {variant_change} END
+        ''')
+
+
+@migration(16, 'event_versions')
+def _event_versions(db):
+    # SQLite 변경 알림 - 이벤트를 발행한 커밋마다 올라가는 버전, 다른 워커의 스트림이 확인한다 (events.py)
+    db.execute('INSERT INTO data_versions (name, version) VALUES (?, 0) ON CONFLICT (name) DO NOTHING', ('events',))
+
+
+@migration(17, 'jobs_dedupe_unique')
+def _jobs_dedupe_unique(db):
+    # 같은 dedupe_key의 대기/실행 중/성공한 작업은 하나만 - 동시에 추가해도 중복 실행되지 않도록 (JobQueue.enqueue)
+    if db.dialect.is_postgres:
+        db.execute('LOCK TABLE jobs IN SHARE ROW EXCLUSIVE MODE')
+    # 이미 중복으로 들어간 작업은 가장 최근 것만 키를 남긴다
+    db.execute('''
+        UPDATE jobs SET dedupe_key = NULL
+        WHERE dedupe_key IS NOT NULL AND status <> 'failed'
+          AND id < (SELECT MAX(j.id) FROM jobs j WHERE j.dedupe_key = jobs.dedupe_key AND j.status <> 'failed')
+    ''')
+    db.execute('DROP INDEX IF EXISTS idx_jobs_dedupe_key')
+    db.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_dedupe_active ON jobs (dedupe_key)
+        WHERE status <> 'failed'
+    ''')
+
+
+def _ensure_migrations_table(db):
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    db.commit()
+
+def _applied_versions(db) -> Dict[int, str]:
+    rows = db.fetchall('SELECT version, applied_at FROM schema_migrations')
+    return {row[0]: row[1] for row in rows}
+
+def _begin(db):
+    # 여러 프로세스가 동시에 실행해도 같은 마이그레이션이 두 번 적용되지 않도록 잠금
+    if db.dialect.is_postgres:
+        db.execute('SELECT pg_advisory_xact_lock(?)', (0x6d6967,))
+    else:
+        db.execute('BEGIN IMMEDIATE')
+
+def migrate() -> List[int]:
+    """미적용 마이그레이션을 버전 순서대로 각자의 트랜잭션에서 적용하고, 적용한 버전 목록 반환"""
+    applied_now = []
+    with repository.session() as db:
+        _ensure_migrations_table(db)
+
+        for version, name, apply in MIGRATIONS:
+            if version in _applied_versions(db):
+                continue
+
+            _begin(db)
+            # 잠금을 기다리는 동안 다른 프로세스가 적용했을 수 있으므로 다시 확인
+            if version in _applied_versions(db):
+                db.rollback()
+                continue
+
+            apply(db)
+            db.execute('INSERT INTO schema_migrations (version, name) VALUES (?, ?)', (version, name))
+            db.commit()
+            applied_now.append(version)
+            print(f"Applied migration {version:04d}_{name}")
+
+    return applied_now
+
+def status() -> List[Dict]:
+    """마이그레이션별 적용 여부/적용 시각"""
+    with repository.session() as db:
+        _ensure_migrations_table(db)
+        applied = _applied_versions(db)
+
+    return [
+        {
+            'version': version,
+            'name': name,
+            'applied': version in applied,
+            'applied_at': applied.get(version)
+        }
+        for version, name, _ in MIGRATIONS
+    ]
@@ -0,0 +1,230 @@
+import os
+import sqlite3
+import threading
+import time
+
+
+class PoolTimeout(Exception):
+    """풀에서 제한 시간 안에 연결을 빌리지 못한 경우"""
+    pass
+
+
+class PooledConnection:
+    """풀에서 빌린 연결 래퍼 - close()는 연결을 닫지 않고 풀에 반환한다"""
+    
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+    
+    def __getattr__(self, name):
+        # cursor(), commit(), server_version 등은 실제 연결로 위임
+        conn = self.__dict__.get('_conn')
+        if conn is None:
+            raise AttributeError(name)
+        return getattr(conn, name)
+    
+    @property
+    def raw(self):
+        return self._conn
+    
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn)
+    
+    def __del__(self):
+        # close() 누락 시에도 풀 슬롯이 새지 않도록
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class PostgresPool:
+    """프로세스별 스레드 안전 PostgreSQL 커넥션 풀
+    
+    - max_size: 동시에 열어둘 수 있는 최대 연결 수
+    - idle_timeout: 이 시간(초) 이상 쉬고 있던 연결은 닫고 새로 만든다
+    - health_check_interval: 이 시간(초) 이상 쉬고 있던 연결은 빌려주기 전에 SELECT 1로 확인
+    - timeout: 풀이 가득 찼을 때 반환을 기다리는 최대 시간(초)
+    
+    gunicorn 워커처럼 fork된 자식 프로세스에서는 부모가 열어둔 소켓을 공유하지 않도록
+    물려받은 연결을 닫지 않고 버린 뒤 새로 연결한다.
+    """
+    
+    def __init__(self, connect, max_size=10, idle_timeout=300, timeout=30, health_check_interval=30):
+        self._connect = connect
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        # fork 이전에 열린 연결 - 자식에서 닫거나 GC되면 종료 메시지가 공유 소켓으로 나가
+        # 부모 세션이 끊기므로 프로세스가 끝날 때까지 참조만 보관한다
+        self._inherited = []
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self.after_fork)
+    
+    def after_fork(self):
+        """fork된 자식 프로세스에서 호출 - 물려받은 연결은 보관만 하고 빈 풀로 다시 시작 (여러 번 호출해도 안전)"""
+        if self._pid == os.getpid():
+            return
+        self._inherited.extend(conn for conn, _ in self._idle)
+        self._reset()
+    
+    def _reset(self):
+        self._cond = threading.Condition()
+        self._idle = []  # (conn, last_used) - 마지막이 가장 최근에 반환된 연결
+        self._size = 0
+        self._pid = os.getpid()
+    
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+    
+    def _is_healthy(self, conn):
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+            cursor.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+    
+    def acquire(self):
+        if self._pid != os.getpid():
+            self.after_fork()
+        
+        deadline = time.monotonic() + self.timeout
+        while True:
+            conn = None
+            last_used = None
+            with self._cond:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(f"No database connection available within {self.timeout}s (max_size={self.max_size})")
+                    self._cond.wait(remaining)
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                else:
+                    self._size += 1
+            
+            if conn is None:
+                try:
+                    return self._connect()
+                except Exception:
+                    self._discard_slot()
+                    raise
+            
+            idle_for = time.monotonic() - last_used
+            if conn.closed or idle_for > self.idle_timeout:
+                self._close_quietly(conn)
+                self._discard_slot()
+                continue
+            if idle_for > self.health_check_interval and not self._is_healthy(conn):
+                self._close_quietly(conn)
+                self._discard_slot()
+                continue
+            return conn
+    
+    def _discard_slot(self):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+    
+    def release(self, conn):
+        if self._pid != os.getpid():
+            # fork 이전에 빌린 연결 - 부모 것이므로 건드리지 않는다
+            self._inherited.append(conn)
+            return
+        
+        if not conn.closed:
+            try:
+                # 커밋되지 않은 작업/읽기 트랜잭션 정리 (idle in transaction 방지)
+                conn.rollback()
+            except Exception:
+                self._close_quietly(conn)
+        
+        if conn.closed:
+            self._discard_slot()
+            return
+        
+        now = time.monotonic()
+        expired = []
+        with self._cond:
+            self._idle.append((conn, now))
+            # 가장 오래 쉰 연결이 앞쪽에 있으므로 앞에서부터 정리
+            while self._idle and now - self._idle[0][1] > self.idle_timeout:
+                expired.append(self._idle.pop(0)[0])
+                self._size -= 1
+            self._cond.notify()
+        for stale in expired:
+            self._close_quietly(stale)
+    
+    def connect(self):
+        return PooledConnection(self, self.acquire())
+    
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+        for conn, _ in idle:
+            self._close_quietly(conn)
+    
+    def stats(self):
+        with self._cond:
+            return {'size': self._size, 'idle': len(self._idle), 'max_size': self.max_size}
+
+
+class SQLitePool:
+    """SQLite용 풀 - 스레드마다 WAL 모드 연결 하나를 유지하고 재사용한다
+    
+    같은 스레드 안에서 중첩해서 빌리면 같은 연결을 돌려주고,
+    가장 바깥 반환 시점에만 커밋되지 않은 작업을 롤백한다.
+    """
+    
+    def __init__(self, path, timeout=30):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+    
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=self.timeout)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+    
+    def acquire(self):
+        local = self._local
+        if getattr(local, 'conn', None) is None or local.pid != os.getpid():
+            local.conn = self._open()
+            local.pid = os.getpid()
+            local.depth = 0
+        local.depth += 1
+        return local.conn
+    
+    def release(self, conn):
+        local = self._local
+        if getattr(local, 'conn', None) is not conn:
+            return
+        local.depth -= 1
+        if local.depth == 0 and conn.in_transaction:
+            conn.rollback()
+    
+    def connect(self):
+        return PooledConnection(self, self.acquire())
+    
+    def close_all(self):
+        # 현재 스레드의 연결만 닫을 수 있다 (다른 스레드 연결은 스레드 종료 시 정리)
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.conn = None
+            conn.close()
+    
+    def stats(self):
+        return {'size': 1 if getattr(self._local, 'conn', None) is not None else 0, 'mode': 'sqlite-per-thread'}
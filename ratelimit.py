@@ -0,0 +1,77 @@
+"""요청 횟수 제한 (프로세스 메모리 백엔드)
+
+키(사용자명, IP 등)별로 window초 동안 limit번까지 허용하는 슬라이딩 윈도 제한.
+gunicorn 워커마다 따로 세므로 실제 허용량은 최대 limit × 워커 수이다.
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict
+
+
+class RateLimiter:
+    """스레드 안전 슬라이딩 윈도 제한기 - 키 수가 max_keys를 넘으면 가장 오래 쓰지 않은 키부터 버린다"""
+
+    def __init__(self, name: str, limit: int, window: float, max_keys: int = 10000):
+        self.name = name
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._hits = OrderedDict()  # key -> deque[시각]
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def _recent(self, key, now):
+        hits = self._hits.get(key)
+        if hits is None:
+            return None
+        while hits and hits[0] <= now - self.window:
+            hits.popleft()
+        if not hits:
+            del self._hits[key]
+            return None
+        return hits
+
+    def is_limited(self, key) -> bool:
+        with self._lock:
+            hits = self._recent(key, time.monotonic())
+            return hits is not None and len(hits) >= self.limit
+
+    def hit(self, key) -> bool:
+        """요청 한 번을 기록하고 허용 여부 반환 (제한에 걸린 요청은 기록하지 않는다)"""
+        now = time.monotonic()
+        with self._lock:
+            hits = self._recent(key, now)
+            if hits is not None and len(hits) >= self.limit:
+                self.rejected += 1
+                return False
+            if hits is None:
+                hits = self._hits[key] = deque()
+            hits.append(now)
+            self._hits.move_to_end(key)
+            while len(self._hits) > self.max_keys:
+                self._hits.popitem(last=False)
+            return True
+
+    def retry_after(self, key) -> int:
+        """다시 시도할 수 있을 때까지 남은 초 (제한 중이 아니면 0)"""
+        now = time.monotonic()
+        with self._lock:
+            hits = self._recent(key, now)
+            if hits is None or len(hits) < self.limit:
+                return 0
+            return max(1, int(hits[0] + self.window - now + 0.999))
+
+    def reset(self, key):
+        with self._lock:
+            self._hits.pop(key, None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'name': self.name,
+                'limit': self.limit,
+                'window': self.window,
+                'keys': len(self._hits),
+                'rejected': self.rejected
+            }
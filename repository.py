@@ -0,0 +1,286 @@
+import base64
+import json
+import random
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from decimal import Decimal
+from typing import Dict, Optional
+import database_cloud as database
+import metrics
+
+
+class Dialect:
+    """SQL 방언 차이 (플레이스홀더, INSERT 후 id 조회, 대소문자 무시 LIKE)"""
+
+    def __init__(self, name, placeholder, like):
+        self.name = name
+        self.placeholder = placeholder
+        self.like = like
+
+    @property
+    def is_postgres(self):
+        return self.name == 'postgresql'
+
+    @property
+    def utc_now(self):
+        """현재 UTC 시각 SQL 식 (시간대 없는 TIMESTAMP 열에 저장)"""
+        return "(now() AT TIME ZONE 'UTC')" if self.is_postgres else 'CURRENT_TIMESTAMP'
+
+    def sql(self, query):
+        """'?' 플레이스홀더로 작성된 쿼리를 현재 방언으로 변환"""
+        if self.placeholder == '?':
+            return query
+        # psycopg2는 '%'를 포맷 문자로 해석하므로 리터럴 '%'는 '%%'로 이스케이프
+        return query.replace('%', '%%').replace('?', self.placeholder)
+
+
+SQLITE = Dialect('sqlite', '?', 'LIKE')
+POSTGRESQL = Dialect('postgresql', '%s', 'ILIKE')
+
+
+def dialect_of(conn):
+    # PostgreSQL 연결 실패 시 SQLite로 폴백될 수 있으므로 설정이 아닌 실제 연결로 판단
+    return POSTGRESQL if hasattr(conn, 'server_version') else SQLITE
+
+
+class Session:
+    """풀에서 빌린 연결 하나에 대한 쿼리 실행기
+
+    쿼리는 항상 '?' 플레이스홀더로 작성하고, 실행 시점에 연결의 방언에 맞게 변환한다.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.dialect = dialect_of(conn)
+        self.cursor = metrics.InstrumentedCursor(conn.cursor())
+        self._after_commit = []
+
+    def execute(self, query, params=()):
+        self.cursor.execute(self.dialect.sql(query), params)
+        return self.cursor
+
+    def executemany(self, query, seq_of_params):
+        self.cursor.executemany(self.dialect.sql(query), seq_of_params)
+        return self.cursor
+
+    def fetchone(self, query, params=()):
+        return self.execute(query, params).fetchone()
+
+    def fetchall(self, query, params=()):
+        return self.execute(query, params).fetchall()
+
+    def stream(self, query, params=(), batch_size=1000):
+        """결과를 batch_size 행씩 가져오며 한 행씩 yield
+
+        PostgreSQL은 이름 있는(서버 측) 커서를 사용해 결과 전체를 클라이언트 메모리에 올리지 않는다.
+        제너레이터가 끝나거나 닫힐 때까지 세션을 유지해야 한다.
+        """
+        if self.dialect.is_postgres:
+            cursor = self.conn.cursor(name=f'stream_{uuid.uuid4().hex}')
+            cursor.itersize = batch_size
+        else:
+            cursor = self.conn.cursor()
+        cursor = metrics.InstrumentedCursor(cursor)
+        try:
+            cursor.execute(self.dialect.sql(query), params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            cursor.close()
+
+    def insert(self, query, params=()) -> Optional[int]:
+        """INSERT 실행 후 새 행의 id 반환 (PostgreSQL은 RETURNING, SQLite는 lastrowid)
+        ON CONFLICT DO NOTHING으로 넣지 않았으면 None
+        """
+        if self.dialect.is_postgres:
+            row = self.execute(query.rstrip() + ' RETURNING id', params).fetchone()
+            return row[0] if row else None
+        cursor = self.execute(query, params)
+        return cursor.lastrowid if cursor.rowcount else None
+
+    def update_many(self, table, key, columns, rows, set_extra=None):
+        """여러 행을 한 번에 갱신 - rows는 (key, columns 순서의 값...) 튜플 목록
+
+        PostgreSQL은 VALUES 목록과 조인하는 UPDATE 한 문장(한 번의 왕복),
+        SQLite는 같은 문장을 executemany로 실행한다.
+        """
+        if not rows:
+            return 0
+        if self.dialect.is_postgres:
+            from psycopg2.extras import execute_values
+            assignments = [f"{column} = v.{column}" for column in columns]
+            if set_extra:
+                assignments.append(set_extra)
+            query = (f"UPDATE {table} AS t SET {', '.join(assignments)} "
+                     f"FROM (VALUES %s) AS v({key}, {', '.join(columns)}) "
+                     f"WHERE t.{key} = v.{key}")
+            execute_values(self.cursor, query, rows, page_size=len(rows))
+        else:
+            assignments = [f"{column} = ?" for column in columns]
+            if set_extra:
+                assignments.append(set_extra)
+            query = f"UPDATE {table} SET {', '.join(assignments)} WHERE {key} = ?"
+            self.cursor.executemany(query, [tuple(row[1:]) + (row[0],) for row in rows])
+        return self.cursor.rowcount
+
+    def insert_many(self, table, columns, rows):
+        """여러 행 INSERT - PostgreSQL은 다중 VALUES 한 문장, SQLite는 executemany"""
+        if not rows:
+            return 0
+        if self.dialect.is_postgres:
+            from psycopg2.extras import execute_values
+            query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s"
+            execute_values(self.cursor, query, rows, page_size=1000)
+        else:
+            placeholders = ', '.join('?' for _ in columns)
+            self.cursor.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+        return len(rows)
+
+    def execute_batch(self, query, seq_of_params):
+        """같은 문장을 여러 파라미터로 실행 - PostgreSQL은 여러 문장을 묶어 왕복 횟수를 줄인다"""
+        if self.dialect.is_postgres:
+            from psycopg2.extras import execute_batch
+            execute_batch(self.cursor, self.dialect.sql(query), seq_of_params, page_size=500)
+        else:
+            self.cursor.executemany(query, seq_of_params)
+
+    def lock_rows(self, table, ids, columns, chunk_size=500):
+        """ids 행들을 트랜잭션 끝까지 잠그고 {id: (columns...)} 반환
+
+        PostgreSQL은 SELECT ... FOR UPDATE, SQLite는 BEGIN IMMEDIATE로 쓰기 잠금을 먼저 잡는다.
+        """
+        if not self.dialect.is_postgres and not self.conn.in_transaction:
+            self.execute('BEGIN IMMEDIATE')
+        lock = ' FOR UPDATE' if self.dialect.is_postgres else ''
+        found = {}
+        ids = sorted(ids)  # 항상 같은 순서로 잠가 교착 상태 방지
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            placeholders = ', '.join('?' for _ in chunk)
+            rows = self.fetchall(
+                f"SELECT id, {', '.join(columns)} FROM {table} WHERE id IN ({placeholders}) ORDER BY id{lock}",
+                chunk
+            )
+            found.update((row[0], tuple(row[1:])) for row in rows)
+        return found
+
+    def existing_ids(self, table, ids, chunk_size=500):
+        """ids 중 table에 실제 존재하는 id 집합 (SQLite 파라미터 개수 제한 때문에 나눠서 조회)"""
+        found = set()
+        ids = list(ids)
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            placeholders = ', '.join('?' for _ in chunk)
+            rows = self.fetchall(f"SELECT id FROM {table} WHERE id IN ({placeholders})", chunk)
+            found.update(row[0] for row in rows)
+        return found
+
+    @property
+    def rowcount(self):
+        return self.cursor.rowcount
+
+    def after_commit(self, callback):
+        """이 트랜잭션이 커밋되면 호출할 함수 등록 (롤백되면 버려진다)"""
+        self._after_commit.append(callback)
+
+    def commit(self):
+        self.conn.commit()
+        callbacks, self._after_commit = self._after_commit, []
+        for callback in callbacks:
+            callback()
+
+    def rollback(self):
+        self.conn.rollback()
+        self._after_commit = []
+
+    def close(self):
+        self.cursor.close()
+
+
+@contextmanager
+def session():
+    """with 블록 동안 풀 연결 하나를 Session으로 빌린다 (커밋은 호출자가 명시)"""
+    with database.connection() as conn:
+        db = Session(conn)
+        try:
+            yield db
+        finally:
+            db.close()
+
+
+# PostgreSQL SQLSTATE - 교착 상태, 직렬화 실패, NOWAIT/lock_timeout 잠금 실패
+_RETRYABLE_PGCODES = {'40P01', '40001', '55P03'}
+
+def is_contention_error(exc) -> bool:
+    """다른 트랜잭션과의 잠금 경합으로 실패했는지 (새 트랜잭션으로 재시도하면 성공할 수 있는 오류)"""
+    if getattr(exc, 'pgcode', None) in _RETRYABLE_PGCODES:
+        return True
+    if isinstance(exc, sqlite3.OperationalError):
+        message = str(exc)
+        return 'locked' in message or 'busy' in message
+    return False
+
+def run_in_transaction(fn, retries=5, backoff=0.02):
+    """fn(db)를 한 트랜잭션으로 실행하고 커밋해 결과 반환
+
+    예외가 나면 롤백하고, 잠금 경합 오류면 지수 백오프(+지터) 후 새 트랜잭션으로 최대 retries번 재시도한다.
+    fn은 재실행될 수 있으므로 트랜잭션 밖의 부수 효과(캐시 무효화 등)는 호출자가 커밋 후에 처리한다.
+    """
+    for attempt in range(retries + 1):
+        with session() as db:
+            try:
+                result = fn(db)
+                db.commit()
+                return result
+            except Exception as e:
+                db.rollback()
+                if attempt == retries or not is_contention_error(e):
+                    raise
+        time.sleep(backoff * (2 ** attempt) * (0.5 + random.random()))
+
+
+def bump_data_version(db, name: str):
+    """name 데이터(sales, products, forecasts)가 바뀌었음을 기록 - 버전 행을 잠그므로 쓰기 트랜잭션의 마지막 즈음에 호출"""
+    db.execute(f'UPDATE data_versions SET version = version + 1, updated_at = {db.dialect.utc_now} WHERE name = ?',
+               (name,))
+
+def data_versions(db) -> Dict[str, int]:
+    """{데이터 이름: 버전} - 버전이 같으면 그 데이터는 바뀌지 않았다"""
+    return {row[0]: row[1] for row in db.fetchall('SELECT name, version FROM data_versions')}
+
+
+def encode_cursor(sort_by, key, last_id) -> str:
+    """키셋 페이지네이션 커서 (정렬 기준, 마지막 행의 정렬 값, 마지막 행 id) -> URL 안전 문자열"""
+    payload = {'s': sort_by, 'id': last_id}
+    if isinstance(key, Decimal):
+        payload['d'] = str(key)
+    else:
+        payload['k'] = key if isinstance(key, (int, float, str)) or key is None else str(key)
+    raw = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, sort_by):
+    """encode_cursor의 역 - (정렬 값, 마지막 id) 반환, 형식이 틀리거나 정렬 기준이 다르면 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw.decode('utf-8'))
+        key = Decimal(payload['d']) if 'd' in payload else payload['k']
+        last_id = int(payload['id'])
+    except (ValueError, KeyError, TypeError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+    if payload.get('s') != sort_by:
+        raise ValueError("Cursor does not match sort order")
+    return key, last_id
+
+def page_size(limit, default=50, maximum=500) -> int:
+    """요청된 페이지 크기를 1 ~ maximum 범위로 제한"""
+    try:
+        limit = int(limit) if limit not in (None, '') else default
+    except (TypeError, ValueError):
+        raise ValueError("limit must be an integer")
+    return max(1, min(limit, maximum))
@@ -1,86 +1,371 @@
-import sqlite3
 from datetime import datetime, date
-from typing import List, Dict, Optional
-import database
+from typing import List, Dict, Iterator, Optional, Tuple
+import events
+import repository
+from metrics import timed
+from inventory import product_cache, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from stock_ledger import record_movements
+
+PLATFORMS = ['네이버', '쿠팡', '자사몰']
+
+# 판매에 필요한 상품 열 / 옵션 열 - 옵션의 가격/마진이 NULL이면 상품 값을 쓴다
+PRODUCT_SALE_COLUMNS = ['price', 'margin_naver', 'margin_coupang', 'margin_self', 'quantity', 'variant_count']
+VARIANT_SALE_COLUMNS = ['product_id', 'quantity', 'price', 'margin_naver', 'margin_coupang', 'margin_self']
 
 class SalesManager:
-    def __init__(self):
-        database.init_database()
+    def _apply_to_daily(self, db, sale_date, product_id: int, platform: str,
+                        sales_count: int, quantity: int, revenue, profit):
+        """일별 집계(sales_daily)에 증감분 반영 - 판매 쓰기와 같은 트랜잭션에서 호출"""
+        self._apply_to_daily_many(db, [(sale_date, product_id, platform, sales_count, quantity, revenue, profit)])
+    
+    def _apply_to_daily_many(self, db, deltas: List[tuple]):
+        """(sale_date, product_id, platform, sales_count, quantity, revenue, profit) 증감분 목록을 한 번에 반영"""
+        db.execute_batch('''
+            INSERT INTO sales_daily (sale_date, product_id, platform, sales_count, quantity, revenue, profit)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (sale_date, product_id, platform) DO UPDATE SET
+                sales_count = sales_daily.sales_count + excluded.sales_count,
+                quantity = sales_daily.quantity + excluded.quantity,
+                revenue = sales_daily.revenue + excluded.revenue,
+                profit = sales_daily.profit + excluded.profit
+        ''', deltas)
+        
+        emptied = [delta[:3] for delta in deltas if delta[3] < 0]
+        if emptied:
+            db.execute_batch('''
+                DELETE FROM sales_daily
+                WHERE sale_date = ? AND product_id = ? AND platform = ? AND sales_count <= 0
+            ''', emptied)
+        
+        repository.bump_data_version(db, 'sales')
+    
+    def _reserve_stock(self, db, product_id: int, quantity: int, variant_id: Optional[int] = None):
+        """
+        재고 차감 - 재고가 충분할 때만 줄어드는 조건부 UPDATE
+        읽고 비교한 뒤 차감하는 사이에 다른 워커가 끼어들어도 재고가 음수가 되지 않는다.
+        variant_id를 주면 옵션 재고도 같은 방식으로 차감한다 (상품 재고 = 옵션 재고 합계).
+        """
+        if variant_id is not None:
+            db.execute('UPDATE product_variants SET quantity = quantity - ? WHERE id = ? AND quantity >= ?',
+                       (quantity, variant_id, quantity))
+            if db.rowcount == 0:
+                row = db.fetchone('SELECT quantity FROM product_variants WHERE id = ?', (variant_id,))
+                if not row:
+                    raise ValueError("Variant not found")
+                raise ValueError(f"Insufficient stock. Available: {row[0]}, Requested: {quantity}")
+        db.execute('UPDATE products SET quantity = quantity - ? WHERE id = ? AND quantity >= ?',
+                   (quantity, product_id, quantity))
+        if db.rowcount == 0:
+            row = db.fetchone('SELECT quantity FROM products WHERE id = ?', (product_id,))
+            if not row:
+                raise ValueError("Product not found")
+            raise ValueError(f"Insufficient stock. Available: {row[0]}, Requested: {quantity}")
+    
+    def _restore_stock(self, db, product_id: int, quantity: int, variant_id: Optional[int] = None):
+        """판매 수정/삭제로 차감했던 재고 되돌리기"""
+        db.execute('UPDATE products SET quantity = quantity + ? WHERE id = ?', (quantity, product_id))
+        if variant_id is not None:
+            db.execute('UPDATE product_variants SET quantity = quantity + ? WHERE id = ?', (quantity, variant_id))
     
-    def record_sale(self, product_id: int, sale_date: date, quantity: int, platform: str) -> Optional[int]:
-        if platform not in ['네이버', '쿠팡', '자사몰']:
+    def _sale_variant(self, product_id: int, variant_id: Optional[int], variant_count: int,
+                      variants: Dict) -> Optional[tuple]:
+        """
+        판매할 옵션 행 (잠근 옵션 행 {id: VARIANT_SALE_COLUMNS 값}에서 찾는다) - 옵션이 없는 상품이면 None
+        옵션이 있는 상품은 옵션을 골라야 하고, 다른 상품의 옵션은 고를 수 없다.
+        """
+        if variant_id is None:
+            if variant_count:
+                raise ValueError("variant_id is required for a product with variants")
+            return None
+        variant = variants.get(variant_id)
+        if not variant or variant[0] != product_id:
+            raise ValueError("Variant not found")
+        return variant
+    
+    def _sale_amounts(self, product: tuple, variant: Optional[tuple], platform: str, quantity: int) -> tuple:
+        """(매출, 이익) - 옵션에 따로 정한 가격/마진이 있으면 그 값, 없으면 상품 값"""
+        pricing = product[:4]
+        if variant:
+            pricing = [base if override is None else override for base, override in zip(pricing, variant[2:6])]
+        revenue = pricing[0] * quantity
+        margin = pricing[1 + PLATFORMS.index(platform)]
+        return revenue, revenue * (margin / 100)
+    
+    def _lock_variants(self, db, variant_ids) -> Dict:
+        """옵션 행 잠금 (상품 행을 먼저 잠근 뒤 호출 - 옵션 수정과 같은 순서)"""
+        variant_ids = {variant_id for variant_id in variant_ids if variant_id is not None}
+        if not variant_ids:
+            return {}
+        return db.lock_rows('product_variants', variant_ids, VARIANT_SALE_COLUMNS)
+    
+    def _validate_sale(self, quantity: int, platform: str):
+        if platform not in PLATFORMS:
             raise ValueError("Platform must be 네이버, 쿠팡, or 자사몰")
-        
-        conn = database.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT price, margin_naver, margin_coupang, margin_self, quantity FROM products WHERE id = ?', (product_id,))
-        product = cursor.fetchone()
-        
-        if not product:
-            conn.close()
-            raise ValueError("Product not found")
-        
-        price, margin_naver, margin_coupang, margin_self, current_quantity = product
-        
-        if quantity > current_quantity:
-            conn.close()
-            raise ValueError(f"Insufficient stock. Available: {current_quantity}, Requested: {quantity}")
-        
-        margin_map = {'네이버': margin_naver, '쿠팡': margin_coupang, '자사몰': margin_self}
-        margin = margin_map[platform]
-        
-        revenue = price * quantity
-        profit = revenue * (margin / 100)
-        
-        cursor.execute('''
-            INSERT INTO sales (product_id, sale_date, quantity, platform, revenue, profit)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (product_id, sale_date, quantity, platform, revenue, profit))
-        
-        sale_id = cursor.lastrowid
-        
-        cursor.execute('UPDATE products SET quantity = quantity - ? WHERE id = ?', (quantity, product_id))
-        
-        conn.commit()
-        conn.close()
-        
+        if quantity <= 0:
+            raise ValueError("Quantity must be positive")
+    
+    @timed
+    def record_sale(self, product_id: int, sale_date: date, quantity: int, platform: str,
+                    variant_id: Optional[int] = None) -> Optional[int]:
+        """판매 등록 - 옵션이 있는 상품은 variant_id로 판매한 옵션을 지정한다"""
+        self._validate_sale(quantity, platform)
+        
+        def record(db):
+            # 상품 행 잠금 (PostgreSQL FOR UPDATE, SQLite BEGIN IMMEDIATE) - 동시 판매는 순서대로 처리된다
+            product = db.lock_rows('products', [product_id], PRODUCT_SALE_COLUMNS).get(product_id)
+            
+            if not product:
+                raise ValueError("Product not found")
+            
+            variant = self._sale_variant(product_id, variant_id, product[5], self._lock_variants(db, [variant_id]))
+            current_quantity = product[4]
+            available = variant[1] if variant else current_quantity
+            
+            if quantity > available:
+                raise ValueError(f"Insufficient stock. Available: {available}, Requested: {quantity}")
+            
+            revenue, profit = self._sale_amounts(product, variant, platform, quantity)
+            
+            self._reserve_stock(db, product_id, quantity, variant_id)
+            
+            sale_id = db.insert('''
+                INSERT INTO sales (product_id, sale_date, quantity, platform, revenue, profit, variant_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (product_id, sale_date, quantity, platform, revenue, profit, variant_id))
+            record_movements(db, [(product_id, 'sale', -quantity, sale_id, None)])
+            changed_events = [
+                events.sale_changed('created', id=sale_id, product_id=product_id, sale_date=sale_date,
+                                    quantity=quantity, platform=platform),
+                events.product_changed(product_id, {'quantity': current_quantity - quantity})
+            ]
+            if variant:
+                changed_events.append(events.variant_changed(variant_id, product_id, {'quantity': variant[1] - quantity}))
+            events.publish(db, changed_events)
+            
+            self._apply_to_daily(db, sale_date, product_id, platform, 1, quantity, revenue, profit)
+            return sale_id
+        
+        sale_id = repository.run_in_transaction(record)
+        
+        # 재고 수량이 바뀌었으므로 상품 캐시 무효화
+        product_cache.clear()
         return sale_id
     
+    @timed
+    def record_sales_bulk(self, lines: List[Dict]) -> Dict:
+        """
+        판매 여러 건을 한 트랜잭션으로 일괄 등록 (주문 내역 엑셀/CSV 가져오기용)
+        lines: [{'product_id': 1, 'sale_date': '2024-01-15', 'quantity': 2, 'platform': '네이버'}, ...]
+               옵션이 있는 상품은 'variant_id'도 지정한다
+        
+        상품 가격/마진/재고는 배치 전체에 대해 한 번만 조회(행 잠금)하고, 재고는 상품별로
+        누적 차감하며 확인한다. 형식 오류나 재고 부족인 줄은 건너뛰고 rejected에 줄 번호(1부터)와 사유를 담는다.
+        """
+        rejected = []
+        parsed = []  # (line_no, product_id, sale_date, quantity, platform, variant_id)
+        
+        for line_no, line in enumerate(lines, start=1):
+            try:
+                product_id = int(line.get('product_id'))
+                # 2024-01-15 / 2024.01.15 / 2024/01/15 (시각이 붙어 있으면 날짜만 사용)
+                raw_date = str(line.get('sale_date')).strip()[:10].replace('.', '-').replace('/', '-')
+                sale_date = date.fromisoformat(raw_date).isoformat()
+                quantity = int(line.get('quantity'))
+                platform = str(line.get('platform', '')).strip()
+                variant_id = line.get('variant_id')
+                variant_id = int(variant_id) if variant_id not in (None, '') else None
+            except (TypeError, ValueError):
+                rejected.append({'line': line_no, 'error': 'Invalid product_id, sale_date, quantity or variant_id'})
+                continue
+            
+            if platform not in PLATFORMS:
+                rejected.append({'line': line_no, 'error': "Platform must be 네이버, 쿠팡, or 자사몰"})
+                continue
+            if quantity <= 0:
+                rejected.append({'line': line_no, 'error': 'Quantity must be positive'})
+                continue
+            
+            parsed.append((line_no, product_id, sale_date, quantity, platform, variant_id))
+        
+        inserted = 0
+        if parsed:
+            with repository.session() as db:
+                products = db.lock_rows('products', {p[1] for p in parsed}, PRODUCT_SALE_COLUMNS)
+                variants = self._lock_variants(db, {p[5] for p in parsed})
+                remaining = {product_id: row[4] for product_id, row in products.items()}
+                variant_remaining = {variant_id: row[1] for variant_id, row in variants.items()}
+                
+                sale_rows = []
+                daily = {}
+                for line_no, product_id, sale_date, quantity, platform, variant_id in parsed:
+                    product = products.get(product_id)
+                    if not product:
+                        rejected.append({'line': line_no, 'error': 'Product not found'})
+                        continue
+                    try:
+                        variant = self._sale_variant(product_id, variant_id, product[5], variants)
+                    except ValueError as e:
+                        rejected.append({'line': line_no, 'error': str(e)})
+                        continue
+                    available = variant_remaining[variant_id] if variant else remaining[product_id]
+                    if quantity > available:
+                        rejected.append({
+                            'line': line_no,
+                            'error': f"Insufficient stock. Available: {available}, Requested: {quantity}"
+                        })
+                        continue
+                    
+                    revenue, profit = self._sale_amounts(product, variant, platform, quantity)
+                    
+                    remaining[product_id] -= quantity
+                    if variant:
+                        variant_remaining[variant_id] -= quantity
+                    sale_rows.append((product_id, sale_date, quantity, platform, revenue, profit, variant_id))
+                    
+                    bucket = daily.setdefault((sale_date, product_id, platform), [0, 0, 0, 0])
+                    bucket[0] += 1
+                    bucket[1] += quantity
+                    bucket[2] += revenue
+                    bucket[3] += profit
+                
+                inserted = db.insert_many(
+                    'sales', ['product_id', 'sale_date', 'quantity', 'platform', 'revenue', 'profit', 'variant_id'],
+                    sale_rows
+                )
+                
+                # 재고는 잠근 시점의 값에서 배치 합계만큼 뺀 값으로 상품당 한 번만 갱신
+                changed = [(product_id, remaining[product_id]) for product_id in remaining
+                           if remaining[product_id] != products[product_id][4]]
+                db.update_many('products', 'id', ['quantity'], changed)
+                changed_variants = [(variant_id, variant_remaining[variant_id]) for variant_id in variant_remaining
+                                    if variant_remaining[variant_id] != variants[variant_id][1]]
+                db.update_many('product_variants', 'id', ['quantity'], changed_variants)
+                # 일괄 등록은 판매 id를 돌려받지 않으므로 상품별 차감 합계를 한 행으로 기록
+                record_movements(db, [
+                    (product_id, 'sale', new_quantity - products[product_id][4], None, '판매 일괄 등록')
+                    for product_id, new_quantity in changed
+                ])
+                events.publish(db, [events.product_changed(product_id, {'quantity': new_quantity})
+                                    for product_id, new_quantity in changed] +
+                               [events.variant_changed(variant_id, variants[variant_id][0], {'quantity': new_quantity})
+                                for variant_id, new_quantity in changed_variants] +
+                               ([events.sale_changed('imported', count=len(sale_rows))] if sale_rows else []))
+                
+                self._apply_to_daily_many(db, [key + tuple(values) for key, values in daily.items()])
+                
+                db.commit()
+            
+            if inserted:
+                product_cache.clear()
+        
+        rejected.sort(key=lambda r: r['line'])
+        return {
+            'inserted': inserted,
+            'rejected': rejected
+        }
+    
+    @timed
     def get_sales_by_date(self, start_date: date, end_date: date) -> List[Dict]:
-        conn = database.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT s.id, s.product_id, p.name, s.sale_date, s.quantity, 
-                   s.platform, s.revenue, s.profit, s.created_at
+        with repository.session() as db:
+            rows = db.fetchall('''
+                SELECT s.id, s.product_id, p.name, s.sale_date, s.quantity,
+                       s.platform, s.revenue, s.profit, s.created_at, s.variant_id, v.options
+                FROM sales s
+                JOIN products p ON s.product_id = p.id
+                LEFT JOIN product_variants v ON v.id = s.variant_id
+                WHERE s.sale_date BETWEEN ? AND ?
+                ORDER BY s.sale_date DESC, s.created_at DESC
+            ''', (start_date, end_date))
+        
+        return [self._sale_from_row(row) for row in rows]
+    
+    @timed
+    def get_sales_page(self, start_date: date, end_date: date,
+                       limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None) -> Dict:
+        """
+        키셋(커서) 페이지네이션 판매 목록 - 최신 판매부터 (sale_date, id) 역순
+        next_cursor가 None이면 마지막 페이지
+        """
+        limit = repository.page_size(limit, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+        query, params = self._sales_page_query(start_date, end_date, limit, cursor)
+        
+        with repository.session() as db:
+            rows = db.fetchall(query, params)
+        
+        return self._sales_page(rows, limit)
+    
+    def _sales_page_query(self, start_date, end_date, limit: int, cursor: Optional[str]) -> Tuple[str, list]:
+        query = '''
+            SELECT s.id, s.product_id, p.name, s.sale_date, s.quantity,
+                   s.platform, s.revenue, s.profit, s.created_at, s.variant_id, v.options
             FROM sales s
             JOIN products p ON s.product_id = p.id
+            LEFT JOIN product_variants v ON v.id = s.variant_id
             WHERE s.sale_date BETWEEN ? AND ?
-            ORDER BY s.sale_date DESC, s.created_at DESC
-        ''', (start_date, end_date))
-        
-        sales = []
-        for row in cursor.fetchall():
-            sales.append({
-                'id': row[0],
-                'product_id': row[1],
-                'product_name': row[2],
-                'sale_date': row[3],
-                'quantity': row[4],
-                'platform': row[5],
-                'revenue': row[6],
-                'profit': row[7],
-                'created_at': row[8]
-            })
+        '''
+        params = [start_date, end_date]
+        if cursor:
+            last_date, last_id = repository.decode_cursor(cursor, 'sale_date')
+            query += " AND (s.sale_date, s.id) < (?, ?)"
+            params.extend([last_date, last_id])
+        query += " ORDER BY s.sale_date DESC, s.id DESC LIMIT ?"
+        params.append(limit + 1)
+        return query, params
+    
+    def _sales_page(self, rows, limit: int) -> Dict:
+        items = [self._sale_from_row(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = items[-1]
+            next_cursor = repository.encode_cursor('sale_date', str(last['sale_date']), last['id'])
         
-        conn.close()
-        return sales
+        return {
+            'items': items,
+            'next_cursor': next_cursor
+        }
+    
+    def iter_sales(self, start_date: Optional[date] = None, end_date: Optional[date] = None) -> Iterator[Dict]:
+        """내보내기용 판매 내역 (sale_date, id 순) - 서버 측 커서로 조금씩 읽는다"""
+        query = '''
+            SELECT s.id, s.product_id, p.name, s.sale_date, s.quantity,
+                   s.platform, s.revenue, s.profit, s.created_at, s.variant_id, v.options
+            FROM sales s
+            JOIN products p ON s.product_id = p.id
+            LEFT JOIN product_variants v ON v.id = s.variant_id
+        '''
+        conditions = []
+        params = []
+        if start_date:
+            conditions.append("s.sale_date >= ?")
+            params.append(start_date)
+        if end_date:
+            conditions.append("s.sale_date <= ?")
+            params.append(end_date)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY s.sale_date, s.id"
+        
+        with repository.session() as db:
+            for row in db.stream(query, params):
+                yield self._sale_from_row(row)
+    
+    def _sale_from_row(self, row) -> Dict:
+        return {
+            'id': row[0],
+            'product_id': row[1],
+            'product_name': row[2],
+            'sale_date': row[3],
+            'quantity': row[4],
+            'platform': row[5],
+            'revenue': row[6],
+            'profit': row[7],
+            'created_at': row[8],
+            'variant_id': row[9],
+            'variant_options': row[10]
+        }
     
+    @timed
     def get_sales_summary(self, start_date: Optional[date] = None, end_date: Optional[date] = None) -> Dict:
-        conn = database.get_connection()
-        cursor = conn.cursor()
-        
         where_clause = ""
         params = []
         
@@ -88,29 +373,39 @@ class SalesManager:
             where_clause = "WHERE sale_date BETWEEN ? AND ?"
             params = [start_date, end_date]
         
-        cursor.execute(f'''
-            SELECT 
-                COUNT(*) as total_sales,
-                SUM(quantity) as total_quantity,
-                SUM(revenue) as total_revenue,
-                SUM(profit) as total_profit
-            FROM sales {where_clause}
-        ''', params)
-        
-        summary = cursor.fetchone()
-        
-        cursor.execute(f'''
-            SELECT platform,
-                   COUNT(*) as sales_count,
-                   SUM(quantity) as quantity,
-                   SUM(revenue) as revenue,
-                   SUM(profit) as profit
-            FROM sales {where_clause}
-            GROUP BY platform
-        ''', params)
+        # 원장(sales) 대신 일별 집계(sales_daily)에서 계산 - 기간 일수 × 상품 수 만큼만 읽는다
+        with repository.session() as db:
+            summary = db.fetchone(f'''
+                SELECT
+                    SUM(sales_count) as total_sales,
+                    SUM(quantity) as total_quantity,
+                    SUM(revenue) as total_revenue,
+                    SUM(profit) as total_profit
+                FROM sales_daily {where_clause}
+            ''', params)
+            
+            platform_rows = db.fetchall(f'''
+                SELECT platform,
+                       SUM(sales_count) as sales_count,
+                       SUM(quantity) as quantity,
+                       SUM(revenue) as revenue,
+                       SUM(profit) as profit
+                FROM sales_daily {where_clause}
+                GROUP BY platform
+            ''', params)
+            
+            top_rows = db.fetchall(f'''
+                SELECT p.name, SUM(d.quantity) as total_sold, SUM(d.revenue) as total_revenue
+                FROM sales_daily d
+                JOIN products p ON d.product_id = p.id
+                {where_clause}
+                GROUP BY d.product_id, p.name
+                ORDER BY total_sold DESC
+                LIMIT 5
+            ''', params)
         
         platform_stats = {}
-        for row in cursor.fetchall():
+        for row in platform_rows:
             platform_stats[row[0]] = {
                 'sales_count': row[1],
                 'quantity': row[2],
@@ -118,26 +413,14 @@ class SalesManager:
                 'profit': row[4]
             }
         
-        cursor.execute(f'''
-            SELECT p.name, SUM(s.quantity) as total_sold, SUM(s.revenue) as total_revenue
-            FROM sales s
-            JOIN products p ON s.product_id = p.id
-            {where_clause}
-            GROUP BY s.product_id, p.name
-            ORDER BY total_sold DESC
-            LIMIT 5
-        ''', params)
-        
         top_products = []
-        for row in cursor.fetchall():
+        for row in top_rows:
             top_products.append({
                 'name': row[0],
                 'quantity_sold': row[1],
                 'revenue': row[2]
             })
         
-        conn.close()
-        
         return {
             'total_sales': summary[0] or 0,
             'total_quantity': summary[1] or 0,
@@ -147,19 +430,18 @@ class SalesManager:
             'top_products': top_products
         }
     
+    @timed
     def get_product_sales_history(self, product_id: int) -> List[Dict]:
-        conn = database.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, sale_date, quantity, platform, revenue, profit, created_at
-            FROM sales
-            WHERE product_id = ?
-            ORDER BY sale_date DESC, created_at DESC
-        ''', (product_id,))
+        with repository.session() as db:
+            rows = db.fetchall('''
+                SELECT id, sale_date, quantity, platform, revenue, profit, created_at
+                FROM sales
+                WHERE product_id = ?
+                ORDER BY sale_date DESC, created_at DESC
+            ''', (product_id,))
         
         sales = []
-        for row in cursor.fetchall():
+        for row in rows:
             sales.append({
                 'id': row[0],
                 'sale_date': row[1],
@@ -170,117 +452,142 @@ class SalesManager:
                 'created_at': row[6]
             })
         
-        conn.close()
         return sales
     
+    @timed
     def get_sale(self, sale_id: int) -> Optional[Dict]:
-        conn = database.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT s.id, s.product_id, p.name, s.sale_date, s.quantity, 
-                   s.platform, s.revenue, s.profit, s.created_at
-            FROM sales s
-            JOIN products p ON s.product_id = p.id
-            WHERE s.id = ?
-        ''', (sale_id,))
-        
-        row = cursor.fetchone()
-        conn.close()
+        with repository.session() as db:
+            row = db.fetchone('''
+                SELECT s.id, s.product_id, p.name, s.sale_date, s.quantity,
+                       s.platform, s.revenue, s.profit, s.created_at, s.variant_id, v.options
+                FROM sales s
+                JOIN products p ON s.product_id = p.id
+                LEFT JOIN product_variants v ON v.id = s.variant_id
+                WHERE s.id = ?
+            ''', (sale_id,))
         
         if row:
-            return {
-                'id': row[0],
-                'product_id': row[1],
-                'product_name': row[2],
-                'sale_date': row[3],
-                'quantity': row[4],
-                'platform': row[5],
-                'revenue': row[6],
-                'profit': row[7],
-                'created_at': row[8]
-            }
+            return self._sale_from_row(row)
         return None
     
-    def update_sale(self, sale_id: int, product_id: int, sale_date: date, 
-                   quantity: int, platform: str) -> bool:
-        if platform not in ['네이버', '쿠팡', '자사몰']:
-            raise ValueError("Platform must be 네이버, 쿠팡, or 자사몰")
-        
-        conn = database.get_connection()
-        cursor = conn.cursor()
-        
-        # Get old sale info to restore stock
-        cursor.execute('SELECT product_id, quantity FROM sales WHERE id = ?', (sale_id,))
-        old_sale = cursor.fetchone()
-        if not old_sale:
-            conn.close()
-            return False
-        
-        old_product_id, old_quantity = old_sale
-        
-        # Restore old stock
-        cursor.execute('UPDATE products SET quantity = quantity + ? WHERE id = ?', 
-                      (old_quantity, old_product_id))
-        
-        # Check new product stock
-        cursor.execute('SELECT price, margin_naver, margin_coupang, margin_self, quantity FROM products WHERE id = ?', 
-                      (product_id,))
-        product = cursor.fetchone()
-        
-        if not product:
-            conn.close()
-            raise ValueError("Product not found")
-        
-        price, margin_naver, margin_coupang, margin_self, current_quantity = product
-        
-        if quantity > current_quantity:
-            conn.close()
-            raise ValueError(f"Insufficient stock. Available: {current_quantity}, Requested: {quantity}")
-        
-        # Calculate new revenue and profit
-        margin_map = {'네이버': margin_naver, '쿠팡': margin_coupang, '자사몰': margin_self}
-        margin = margin_map[platform]
-        revenue = price * quantity
-        profit = revenue * (margin / 100)
-        
-        # Update sale
-        cursor.execute('''
-            UPDATE sales 
-            SET product_id = ?, sale_date = ?, quantity = ?, 
-                platform = ?, revenue = ?, profit = ?
-            WHERE id = ?
-        ''', (product_id, sale_date, quantity, platform, revenue, profit, sale_id))
-        
-        # Deduct new stock
-        cursor.execute('UPDATE products SET quantity = quantity - ? WHERE id = ?', 
-                      (quantity, product_id))
-        
-        conn.commit()
-        conn.close()
-        return True
+    @timed
+    def update_sale(self, sale_id: int, product_id: int, sale_date: date,
+                   quantity: int, platform: str, variant_id: Optional[int] = None) -> bool:
+        self._validate_sale(quantity, platform)
+        
+        def update(db):
+            # 판매 행을 먼저 잠가 같은 판매에 대한 동시 수정/삭제가 재고를 두 번 되돌리지 않도록 한다
+            old_sale = db.lock_rows('sales', [sale_id],
+                                    ['product_id', 'quantity', 'sale_date', 'platform', 'revenue', 'profit',
+                                     'variant_id']).get(sale_id)
+            if not old_sale:
+                return False
+            
+            old_product_id, old_quantity, old_sale_date, old_platform, old_revenue, old_profit, old_variant_id = old_sale
+            
+            # 이전/새 상품, 이전/새 옵션 모두 잠금 (lock_rows가 id 순으로 잠가 교착 상태 방지)
+            products = db.lock_rows('products', {old_product_id, product_id}, PRODUCT_SALE_COLUMNS)
+            
+            if product_id not in products:
+                raise ValueError("Product not found")
+            
+            variants = self._lock_variants(db, {old_variant_id, variant_id})
+            variant = self._sale_variant(product_id, variant_id, products[product_id][5], variants)
+            
+            current_quantity = products[product_id][4]
+            if product_id == old_product_id:
+                current_quantity += old_quantity
+            available = current_quantity
+            if variant:
+                available = variant[1] + (old_quantity if variant_id == old_variant_id else 0)
+            
+            if quantity > available:
+                raise ValueError(f"Insufficient stock. Available: {available}, Requested: {quantity}")
+            
+            # Calculate new revenue and profit
+            revenue, profit = self._sale_amounts(products[product_id], variant, platform, quantity)
+            
+            # Restore old stock, then deduct new stock
+            self._restore_stock(db, old_product_id, old_quantity, old_variant_id)
+            self._reserve_stock(db, product_id, quantity, variant_id)
+            
+            # Update sale
+            db.execute('''
+                UPDATE sales
+                SET product_id = ?, sale_date = ?, quantity = ?,
+                    platform = ?, revenue = ?, profit = ?, variant_id = ?
+                WHERE id = ?
+            ''', (product_id, sale_date, quantity, platform, revenue, profit, variant_id, sale_id))
+            
+            # 원장: 이전 판매 차감을 되돌리고 새로 차감 (상품/수량이 그대로면 재고 변동 없음)
+            changed_events = [events.sale_changed('updated', id=sale_id, product_id=product_id, sale_date=sale_date,
+                                                  quantity=quantity, platform=platform)]
+            if product_id != old_product_id or quantity != old_quantity:
+                record_movements(db, [
+                    (old_product_id, 'sale_reversal', old_quantity, sale_id, '판매 수정'),
+                    (product_id, 'sale', -quantity, sale_id, '판매 수정')
+                ])
+                changed_events.append(events.product_changed(product_id, {'quantity': current_quantity - quantity}))
+                if product_id != old_product_id and old_product_id in products:
+                    changed_events.append(events.product_changed(
+                        old_product_id, {'quantity': products[old_product_id][4] + old_quantity}))
+            if variant_id != old_variant_id or quantity != old_quantity:
+                for changed_id in {old_variant_id, variant_id} - {None}:
+                    # 이미 삭제된 옵션(상품과 함께 지워진 옵션)은 알릴 행이 없다
+                    if changed_id not in variants:
+                        continue
+                    row = db.fetchone('SELECT quantity FROM product_variants WHERE id = ?', (changed_id,))
+                    if row is None:
+                        continue
+                    changed_events.append(events.variant_changed(changed_id, variants[changed_id][0],
+                                                                 {'quantity': row[0]}))
+            events.publish(db, changed_events)
+            
+            # Move the sale between daily rollup buckets
+            self._apply_to_daily(db, old_sale_date, old_product_id, old_platform,
+                                 -1, -old_quantity, -old_revenue, -old_profit)
+            self._apply_to_daily(db, sale_date, product_id, platform, 1, quantity, revenue, profit)
+            return True
+        
+        # 오류 시 재고 복원까지 모두 롤백된다
+        updated = repository.run_in_transaction(update)
+        if updated:
+            product_cache.clear()
+        return updated
     
+    @timed
     def delete_sale(self, sale_id: int) -> bool:
-        conn = database.get_connection()
-        cursor = conn.cursor()
-        
-        # Get sale info to restore stock
-        cursor.execute('SELECT product_id, quantity FROM sales WHERE id = ?', (sale_id,))
-        sale = cursor.fetchone()
-        
-        if not sale:
-            conn.close()
-            return False
-        
-        product_id, quantity = sale
-        
-        # Restore stock
-        cursor.execute('UPDATE products SET quantity = quantity + ? WHERE id = ?', 
-                      (quantity, product_id))
-        
-        # Delete sale
-        cursor.execute('DELETE FROM sales WHERE id = ?', (sale_id,))
-        
-        conn.commit()
-        conn.close()
-        return True
\ No newline at end of file
+        def delete(db):
+            # Get sale info to restore stock (locked so a concurrent delete cannot restore twice)
+            sale = db.lock_rows('sales', [sale_id],
+                                ['product_id', 'quantity', 'sale_date', 'platform', 'revenue', 'profit',
+                                 'variant_id']).get(sale_id)
+            
+            if not sale:
+                return False
+            
+            product_id, quantity, sale_date, platform, revenue, profit, variant_id = sale
+            
+            # Restore stock
+            self._restore_stock(db, product_id, quantity, variant_id)
+            
+            # Delete sale
+            db.execute('DELETE FROM sales WHERE id = ?', (sale_id,))
+            record_movements(db, [(product_id, 'sale_reversal', quantity, sale_id, '판매 삭제')])
+            new_quantity = db.fetchone('SELECT quantity FROM products WHERE id = ?', (product_id,))
+            changed_events = [events.sale_changed('deleted', id=sale_id, product_id=product_id)]
+            if new_quantity:
+                changed_events.append(events.product_changed(product_id, {'quantity': new_quantity[0]}))
+            if variant_id is not None:
+                variant_quantity = db.fetchone('SELECT quantity FROM product_variants WHERE id = ?', (variant_id,))
+                if variant_quantity:
+                    changed_events.append(events.variant_changed(variant_id, product_id, {'quantity': variant_quantity[0]}))
+            events.publish(db, changed_events)
+            
+            self._apply_to_daily(db, sale_date, product_id, platform, -1, -quantity, -revenue, -profit)
+            return True
+        
+        deleted = repository.run_in_transaction(delete)
+        if deleted:
+            product_cache.clear()
+        return deleted
@@ -0,0 +1,121 @@
+"""상품 검색 (상품명 + 옵션)
+
+- SQLite: FTS5 trigram 외부 콘텐츠 테이블 products_fts (products 트리거로 동기화)
+- PostgreSQL: pg_trgm GIN 인덱스 (name || ' ' || options 식 인덱스, 별도 동기화 불필요)
+- 두 방언 공통: bigram 색인 product_search_bigrams (products 트리거로 동기화)
+
+trigram은 글자 3개 단위 n-gram이므로 한글도 형태소 분석 없이 부분 일치(접두 포함)로 찾는다.
+검색어는 공백으로 나눠 모든 단어가 포함된 상품만 반환한다. trigram으로 찾을 수 없는 2글자 단어
+(양말, 가방 같은 두 음절 한글 단어)는 bigram 색인에서 정확히 그 조각을 가진 상품만 찾고,
+1글자 단어만 LIKE 조건으로 처리한다. 인덱스가 없는 환경(FTS5 trigram 미지원 SQLite,
+pg_trgm 확장 설치 권한 없음)에서는 해당 단어를 LIKE 검색으로 처리한다.
+"""
+from typing import Dict, List, Tuple
+
+# 검색 대상 문서 - migrations의 pg_trgm 식 인덱스와 정확히 같은 식이어야 인덱스를 사용한다
+SEARCH_DOCUMENT = "(name || ' ' || COALESCE(options, ''))"
+
+MAX_TERMS = 8
+MIN_INDEXED_TERM = 3
+BIGRAM_TERM = 2
+
+# 방언별 인덱스 사용 가능 여부 (마이그레이션 이후 바뀌지 않으므로 프로세스당 한 번 확인)
+_index_available: Dict[str, bool] = {}
+_bigrams_available: Dict[str, bool] = {}
+
+
+def terms(query: str) -> List[str]:
+    return query.split()[:MAX_TERMS]
+
+def _escape_like(term: str) -> str:
+    # 사용자가 입력한 %, _ 는 와일드카드가 아닌 문자로 취급 (ESCAPE '\')
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def _like_pattern(term: str) -> str:
+    return f'%{_escape_like(term)}%'
+
+def prefix_pattern(term: str) -> str:
+    """term으로 시작하는지 비교하는 LIKE 패턴 (백슬래시 이스케이프)"""
+    return f'{_escape_like(term)}%'
+
+def _fts_phrase(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+def has_index(db) -> bool:
+    name = db.dialect.name
+    if name not in _index_available:
+        if db.dialect.is_postgres:
+            row = db.fetchone("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        else:
+            row = db.fetchone("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'products_fts'")
+        _index_available[name] = row is not None
+    return _index_available[name]
+
+def has_bigrams(db) -> bool:
+    name = db.dialect.name
+    if name not in _bigrams_available:
+        if db.dialect.is_postgres:
+            row = db.fetchone("SELECT to_regclass('product_search_bigrams')")
+            _bigrams_available[name] = row[0] is not None
+        else:
+            row = db.fetchone("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'product_search_bigrams'")
+            _bigrams_available[name] = row is not None
+    return _bigrams_available[name]
+
+def _like_conditions(db, words: List[str], document: str = SEARCH_DOCUMENT,
+                     id_column: str = 'id') -> Tuple[List[str], list]:
+    """단어별 조건 - 2글자 단어는 bigram 색인 조회, 나머지는 LIKE"""
+    conditions, params = [], []
+    use_bigrams = has_bigrams(db)
+    for word in words:
+        if use_bigrams and len(word) == BIGRAM_TERM:
+            # 색인과 같은 lower()로 비교 (SQLite lower는 ASCII만 바꾸므로 파이썬 쪽에서 바꾸지 않는다)
+            conditions.append(f"{id_column} IN (SELECT product_id FROM product_search_bigrams WHERE bigram = lower(?))")
+            params.append(word)
+        else:
+            conditions.append(f"{document} {db.dialect.like} ? ESCAPE '\\'")
+            params.append(_like_pattern(word))
+    return conditions, params
+
+def _fts_terms(db, words: List[str]) -> Tuple[List[str], List[str]]:
+    """(FTS5 MATCH로 찾을 단어, 나머지 단어 - _like_conditions)"""
+    if db.dialect.is_postgres or not has_index(db):
+        return [], words
+    indexed = [w for w in words if len(w) >= MIN_INDEXED_TERM]
+    return indexed, [w for w in words if len(w) < MIN_INDEXED_TERM]
+
+def filter_clause(db, query: str) -> Tuple[str, list]:
+    """products 목록 WHERE 절에 붙일 검색 조건 (sql, params) - 검색어가 비었으면 ('', [])"""
+    words = terms(query)
+    if not words:
+        return '', []
+    indexed, rest = _fts_terms(db, words)
+    conditions, params = _like_conditions(db, rest)
+    if indexed:
+        conditions.insert(0, "id IN (SELECT rowid FROM products_fts WHERE products_fts MATCH ?)")
+        params.insert(0, ' '.join(_fts_phrase(w) for w in indexed))
+    return ' AND '.join(conditions), params
+
+def hits_query(db, query: str) -> Tuple[str, list]:
+    """검색 결과 (id, rank) 서브쿼리 - rank가 클수록 관련도가 높다"""
+    words = terms(query)
+    indexed, rest = _fts_terms(db, words)
+
+    if indexed:
+        # bm25는 작을수록 관련도가 높으므로 부호를 바꾼다 (상품명 일치에 옵션보다 큰 가중치)
+        conditions, params = _like_conditions(
+            db, rest, "(products_fts.name || ' ' || COALESCE(products_fts.options, ''))", id_column='rowid'
+        )
+        sql = ("SELECT rowid AS id, -bm25(products_fts, 10.0, 1.0) AS rank FROM products_fts "
+               "WHERE products_fts MATCH ?")
+        params.insert(0, ' '.join(_fts_phrase(w) for w in indexed))
+    else:
+        conditions, params = _like_conditions(db, words)
+        if db.dialect.is_postgres and has_index(db):
+            sql = f"SELECT id, similarity({SEARCH_DOCUMENT}, ?) AS rank FROM products WHERE 1 = 1"
+            params.insert(0, ' '.join(words))
+        else:
+            sql = "SELECT id, 0 AS rank FROM products WHERE 1 = 1"
+    for condition in conditions:
+        sql += f" AND {condition}"
+    return sql, params
@@ -0,0 +1,194 @@
+"""재고 변동 원장 / 시점 재고
+
+products.quantity는 현재 값만 덮어쓰므로, 수량을 바꾸는 모든 쓰기(상품 등록·입고·수정·삭제, 판매 등록·수정·삭제,
+일괄 수정/등록)가 같은 트랜잭션에서 증감분을 stock_movements에 추가한다 (수정/삭제하지 않는 추가 전용 원장).
+상품별 SUM(quantity_change)는 항상 products.quantity와 같다 (manage.py check-stock으로 확인).
+
+    receipt        입고 (상품 등록 시 초기 재고 포함)
+    sale           판매 차감
+    sale_reversal  판매 수정/삭제로 되돌린 재고
+    adjust         수동 조정 (상품 수정/일괄 수정/삭제, 마이그레이션 시점의 기초 재고)
+
+"날짜 X의 재고"를 전체 이력을 다시 더하지 않고 구하도록 주기적으로 상품별 스냅샷을 남긴다.
+
+    python manage.py snapshot-stock   # 하루 한 번 (cron 등) - 오늘 0시 기준
+
+시점 재고 = 그 시점 이전 마지막 스냅샷 + 스냅샷 이후 변동(짧은 꼬리)의 합.
+moved_at/snapshot_at은 애플리케이션 현지 시각이다 (판매일과 같은 기준으로 날짜를 비교하도록 DB 기본값을 쓰지 않는다).
+"""
+from datetime import date, datetime, time
+from typing import Dict, List, Optional, Union
+import repository
+from metrics import timed
+
+MOVEMENT_TYPES = ('receipt', 'sale', 'sale_reversal', 'adjust')
+MOVEMENT_COLUMNS = ['product_id', 'movement_type', 'quantity_change', 'sale_id', 'note', 'moved_at']
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+END_OF_DAY = time(23, 59, 59)
+
+_LOCK_ID = 0x736e70  # 스냅샷 작업이 동시에 두 번 실행되지 않도록 (PostgreSQL advisory lock)
+
+
+def _timestamp(value: datetime) -> str:
+    return value.isoformat(sep=' ', timespec='seconds')
+
+def record_movements(db, movements: List[tuple]):
+    """
+    (product_id, movement_type, quantity_change, sale_id, note) 목록을 원장에 추가
+    재고를 바꾸는 쓰기와 같은 트랜잭션에서 호출한다 (증감 0인 항목은 건너뜀).
+    """
+    moved_at = _timestamp(datetime.now())
+    rows = [tuple(movement) + (moved_at,) for movement in movements if movement[2]]
+    db.insert_many('stock_movements', MOVEMENT_COLUMNS, rows)
+
+def _as_of(at: Union[date, datetime, str]) -> datetime:
+    """시점 인자 -> 그 시각(초 단위)까지의 변동을 포함하는 경계 (날짜만 주면 그날 23:59:59)"""
+    if isinstance(at, datetime):
+        return at
+    if isinstance(at, date):
+        return datetime.combine(at, END_OF_DAY)
+    text = str(at).strip()
+    try:
+        if len(text) <= 10:
+            return datetime.combine(date.fromisoformat(text), END_OF_DAY)
+        return datetime.fromisoformat(text)
+    except ValueError:
+        raise ValueError("at must be YYYY-MM-DD or YYYY-MM-DD HH:MM:SS")
+
+
+class StockLedger:
+    @timed
+    def snapshot_stock(self, cutoff: Optional[datetime] = None) -> Dict:
+        """
+        cutoff(기본 오늘 0시) 이전 변동까지의 상품별 재고를 stock_snapshots에 추가하고 요약 반환
+        직전 스냅샷 이후 변동이 있는 상품만 (직전 스냅샷 + 그 사이 변동 합계)로 새 행을 만든다.
+        이미 같거나 더 늦은 시점의 스냅샷이 있으면 아무것도 하지 않는다.
+        """
+        cutoff = cutoff or datetime.combine(date.today(), time())
+        with repository.session() as db:
+            if db.dialect.is_postgres:
+                db.execute('SELECT pg_advisory_xact_lock(?)', (_LOCK_ID,))
+            else:
+                db.execute('BEGIN IMMEDIATE')
+
+            previous = db.fetchone('SELECT MAX(snapshot_at) FROM stock_snapshots')[0]
+            if previous is not None and str(previous)[:19] >= _timestamp(cutoff):
+                db.rollback()
+                return {'snapshot_at': _timestamp(cutoff), 'previous': str(previous)[:19], 'products': 0}
+
+            query = '''
+                SELECT m.product_id,
+                       COALESCE((SELECT s.quantity FROM stock_snapshots s
+                                 WHERE s.product_id = m.product_id
+                                 ORDER BY s.snapshot_at DESC LIMIT 1), 0) + SUM(m.quantity_change)
+                FROM stock_movements m
+                WHERE m.moved_at < ?
+            '''
+            params = [_timestamp(cutoff)]
+            if previous is not None:
+                query += ' AND m.moved_at >= ?'
+                params.append(previous)
+            rows = db.fetchall(query + ' GROUP BY m.product_id', params)
+
+            db.insert_many('stock_snapshots', ['product_id', 'snapshot_at', 'quantity'],
+                           [(row[0], _timestamp(cutoff), row[1]) for row in rows])
+            db.commit()
+
+        return {
+            'snapshot_at': _timestamp(cutoff),
+            'previous': str(previous)[:19] if previous is not None else None,
+            'products': len(rows)
+        }
+
+    @timed
+    def get_stock_at(self, product_id: int, at: Union[date, datetime, str]) -> Optional[Dict]:
+        """
+        product_id의 at 시점 재고 (날짜만 주면 그날 마감 시점)
+        at 이전 마지막 스냅샷 + 스냅샷 이후 at까지의 변동 합계 - 원장 기록이 전혀 없는 상품이면 None
+        """
+        boundary = _timestamp(_as_of(at))
+        with repository.session() as db:
+            snapshot = db.fetchone('''
+                SELECT snapshot_at, quantity FROM stock_snapshots
+                WHERE product_id = ? AND snapshot_at <= ?
+                ORDER BY snapshot_at DESC
+                LIMIT 1
+            ''', (product_id, boundary))
+
+            query = '''
+                SELECT COALESCE(SUM(quantity_change), 0), COUNT(*)
+                FROM stock_movements
+                WHERE product_id = ? AND moved_at <= ?
+            '''
+            params = [product_id, boundary]
+            if snapshot:
+                query += ' AND moved_at >= ?'
+                params.append(snapshot[0])
+            tail = db.fetchone(query, params)
+
+            if not snapshot and not tail[1]:
+                if not db.fetchone('SELECT 1 FROM stock_movements WHERE product_id = ? LIMIT 1', (product_id,)):
+                    return None
+
+        return {
+            'product_id': product_id,
+            'at': boundary,
+            'quantity': (snapshot[1] if snapshot else 0) + tail[0],
+            'snapshot_at': str(snapshot[0])[:19] if snapshot else None,
+            'movements_applied': tail[1]
+        }
+
+    @timed
+    def get_movements_page(self, product_id: int, limit: int = DEFAULT_PAGE_SIZE,
+                           cursor: Optional[str] = None) -> Dict:
+        """상품 재고 변동 내역 최신순 키셋 페이지 {'items', 'next_cursor'}"""
+        limit = repository.page_size(limit, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+        query = '''
+            SELECT id, movement_type, quantity_change, sale_id, note, moved_at
+            FROM stock_movements
+            WHERE product_id = ?
+        '''
+        params = [product_id]
+        if cursor:
+            _, last_id = repository.decode_cursor(cursor, '-id')
+            query += ' AND id < ?'
+            params.append(last_id)
+        query += ' ORDER BY id DESC LIMIT ?'
+        params.append(limit + 1)
+
+        with repository.session() as db:
+            rows = db.fetchall(query, params)
+
+        items = [
+            {
+                'id': row[0],
+                'movement_type': row[1],
+                'quantity_change': row[2],
+                'sale_id': row[3],
+                'note': row[4],
+                'moved_at': str(row[5])[:19]
+            }
+            for row in rows[:limit]
+        ]
+        next_cursor = repository.encode_cursor('-id', None, items[-1]['id']) if len(rows) > limit else None
+        return {'items': items, 'next_cursor': next_cursor}
+
+    @timed
+    def check(self) -> List[Dict]:
+        """원장 합계와 products.quantity가 다른 상품 목록 (정상이면 빈 목록)"""
+        with repository.session() as db:
+            rows = db.fetchall('''
+                SELECT p.id, p.quantity, COALESCE(m.total, 0)
+                FROM products p
+                LEFT JOIN (
+                    SELECT product_id, SUM(quantity_change) AS total
+                    FROM stock_movements
+                    GROUP BY product_id
+                ) m ON m.product_id = p.id
+                WHERE p.quantity <> COALESCE(m.total, 0)
+                ORDER BY p.id
+            ''')
+        return [{'product_id': row[0], 'quantity': row[1], 'ledger_quantity': row[2]} for row in rows]